@@ -1,10 +1,34 @@
 import streamlit as st
 import hashlib
+import hmac
 import time
 import re
-from datetime import datetime, timedelta
+import unicodedata
+import atexit
+import base64
+import csv
+import html
+import io
+import json
+import os
+import logging
+import queue
+import statistics
+import sys
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from streamlit.runtime.scriptrunner import RerunException, StopException
 import psycopg2
-from psycopg2.extras import RealDictCursor
+import psycopg2.extensions
+from psycopg2.extras import RealDictCursor, execute_values
+from migrations import migrate, maintain_partitions, OfflineMigrationsPending, PERMISSIONS_LOCK_KEY
+from metrics import refresh_metrics
+from videos import extract_youtube_id, video_metadata_provider, store_video_metadata
+
+logger = logging.getLogger(__name__)
 
 st.set_page_config(
     layout="wide", 
@@ -61,61 +85,1332 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-DB_CONFIG = {
-    'dbname': st.secrets["DB_NAME"],
-    'user': st.secrets["DB_USER"],
-    'password': st.secrets["DB_PASSWORD"],
-    'host': st.secrets["DB_HOST"],
-    'port': st.secrets["DB_PORT"],
-    'sslmode': 'require'
+def get_db_config():
+    return {
+        'dbname': st.secrets["DB_NAME"],
+        'user': st.secrets["DB_USER"],
+        'password': st.secrets["DB_PASSWORD"],
+        'host': st.secrets["DB_HOST"],
+        'port': st.secrets["DB_PORT"],
+        'sslmode': 'require'
+    }
+
+def get_pool_config():
+    return {
+        'minconn': int(st.secrets.get("DB_POOL_MIN", 1)),
+        'maxconn': int(st.secrets.get("DB_POOL_MAX", 10)),
+        'timeout': float(st.secrets.get("DB_POOL_TIMEOUT", 10)),
+        'max_age': float(st.secrets.get("DB_POOL_MAX_AGE", 1800)),
+        'max_idle': float(st.secrets.get("DB_POOL_MAX_IDLE", 300)),
+        'check_after': float(st.secrets.get("DB_POOL_CHECK_AFTER", 30)),
+    }
+
+class PoolTimeout(Exception):
+    pass
+
+class ConnectionPool:
+    def __init__(self, connect, minconn=1, maxconn=10, timeout=10.0,
+                 max_age=1800.0, max_idle=300.0, check_after=30.0):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("minconn/maxconn inválidos para o pool de conexões")
+        self._connect = connect
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.max_age = max_age
+        self.max_idle = max_idle
+        self.check_after = check_after
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._created = {}
+        self._open = 0
+        self._closed = False
+        self.counters = {
+            'hits': 0,
+            'misses': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'recycled': 0,
+            'broken': 0,
+        }
+        for _ in range(minconn):
+            conn = self._new_connection()
+            self._idle.append((conn, time.monotonic()))
+
+    def _new_connection(self):
+        conn = self._connect()
+        with self._cond:
+            self._open += 1
+            self._created[id(conn)] = time.monotonic()
+        return conn
+
+    def _discard(self, conn):
+        with self._cond:
+            self._created.pop(id(conn), None)
+            self._open -= 1
+            self._cond.notify()
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_stale(self, conn, last_used, now):
+        created = self._created.get(id(conn), now)
+        return now - created > self.max_age or now - last_used > self.max_idle
+
+    def _is_healthy(self, conn, last_used):
+        if conn.closed:
+            return False
+        status = conn.get_transaction_status()
+        if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if time.monotonic() - last_used < self.check_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def getconn(self):
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise PoolTimeout("Pool de conexões encerrado")
+                candidate = None
+                if self._idle:
+                    candidate = self._idle.pop()
+                elif self._open < self.maxconn:
+                    self._open += 1
+                    self.counters['misses'] += 1
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.counters['timeouts'] += 1
+                        raise PoolTimeout(
+                            f"Nenhuma conexão livre após {self.timeout:.1f}s "
+                            f"({self.maxconn} em uso)"
+                        )
+                    if not waited:
+                        self.counters['waits'] += 1
+                        waited = True
+                    self._cond.wait(remaining)
+                    continue
+
+            if candidate is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._open -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._created[id(conn)] = time.monotonic()
+                return conn
+
+            conn, last_used = candidate
+            if self._is_stale(conn, last_used, time.monotonic()):
+                with self._cond:
+                    self.counters['recycled'] += 1
+                self._discard(conn)
+                continue
+            if not self._is_healthy(conn, last_used):
+                with self._cond:
+                    self.counters['broken'] += 1
+                self._discard(conn)
+                continue
+            with self._cond:
+                self.counters['hits'] += 1
+            return conn
+
+    def putconn(self, conn, discard=False):
+        if not discard and not conn.closed:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                discard = True
+        if discard or conn.closed:
+            self._discard(conn)
+            return
+        with self._cond:
+            if self._closed:
+                discard = True
+            else:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+        if discard:
+            self._discard(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        try:
+            yield conn
+        except Exception:
+            broken = conn.closed != 0
+            if not broken:
+                try:
+                    conn.rollback()
+                except Exception:
+                    broken = True
+            self.putconn(conn, discard=broken)
+            raise
+        else:
+            self.putconn(conn)
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self.counters)
+            stats['open'] = self._open
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self._open - len(self._idle)
+            stats['maxconn'] = self.maxconn
+            return stats
+
+QUERY_LITERALS = re.compile(r"'(?:[^']|'')*'|%\(\w+\)s|%s|\b\d+(?:\.\d+)?\b")
+QUERY_ARRAYS = re.compile(r"ARRAY\[[^\]]*\]")
+QUERY_VALUES = re.compile(r"\bVALUES\s*\(", re.I)
+QUERY_WRITES = re.compile(r"\b(INSERT|UPDATE|DELETE|TRUNCATE|ALTER|CREATE|DROP|pg_advisory_lock|nextval|setval)\b", re.I)
+QUERY_INFRA_FUNCTIONS = frozenset({
+    'execute', 'execute_values', 'connection', 'get_db_connection',
+    'record', 'query_callers', '__exit__', '__enter__',
+})
+QUERY_HISTOGRAM_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+def collapse_values(sql):
+    match = QUERY_VALUES.search(sql)
+    while match:
+        position, depth, groups = match.end() - 1, 0, 0
+        while position < len(sql):
+            char = sql[position]
+            if char == '(':
+                depth += 1
+            elif char == ')':
+                depth -= 1
+                if depth == 0:
+                    groups += 1
+                    rest = sql[position + 1:]
+                    following = rest.lstrip()
+                    if following.startswith(',') and following[1:].lstrip().startswith('('):
+                        position += len(rest) - len(following[1:].lstrip()) + 1
+                        continue
+                    break
+            position += 1
+        if groups:
+            sql = sql[:match.end() - 1] + '(...)' + sql[position + 1:]
+        match = QUERY_VALUES.search(sql, match.end())
+    return sql
+
+def query_fingerprint(query):
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    sql = QUERY_LITERALS.sub('?', ' '.join(str(query).split()))
+    return collapse_values(QUERY_ARRAYS.sub('ARRAY[?]', sql))
+
+_query_sources = {}
+
+def is_profiled_source(filename):
+    source = _query_sources.get(filename)
+    if source is None:
+        source = _query_sources[filename] = os.path.abspath(filename) == os.path.abspath(__file__)
+    return source
+
+def query_callers():
+    frame = sys._getframe(2)
+    function = page = None
+    while frame is not None:
+        if is_profiled_source(frame.f_code.co_filename):
+            name = frame.f_code.co_name
+            if function is None and name not in QUERY_INFRA_FUNCTIONS and not name.startswith('<'):
+                function = name
+            if page is None and name.startswith(('show_', 'manage_')):
+                page = name
+        frame = frame.f_back
+    return function or '-', page or '-'
+
+class QueryProfiler:
+    def __init__(self, window=300.0, slow_threshold=0.2, max_samples=20000, max_slow=50):
+        self.window = window
+        self.slow_threshold = slow_threshold
+        self._samples = deque(maxlen=max_samples)
+        self._slow = deque(maxlen=max_slow)
+        self._reruns = deque(maxlen=200)
+        self._totals = {}
+        self._statements = {}
+        self._fingerprints = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def record(self, query, params, duration, rows):
+        cached = self._fingerprints.get(query) if isinstance(query, str) else None
+        if cached is None:
+            fingerprint = query_fingerprint(query)
+            cached = (fingerprint, hashlib.md5(fingerprint.encode()).hexdigest()[:12])
+            if isinstance(query, str) and len(self._fingerprints) < 1000:
+                self._fingerprints[query] = cached
+        fingerprint, query_id = cached
+        function, page = query_callers()
+        key = (query_id, function, page)
+        rows = max(rows or 0, 0)
+        run = getattr(self._local, 'run', None)
+        if run is not None:
+            run.append({'query': query_id, 'function': function, 'page': page,
+                        'ms': duration * 1000, 'rows': rows})
+        with self._lock:
+            self._statements[query_id] = fingerprint
+            totals = self._totals.get(key)
+            if totals is None:
+                totals = self._totals[key] = [0, 0.0, 0, [0] * len(QUERY_HISTOGRAM_BUCKETS)]
+            totals[0] += 1
+            totals[1] += duration
+            totals[2] += rows
+            for position, bound in enumerate(QUERY_HISTOGRAM_BUCKETS):
+                if duration <= bound:
+                    totals[3][position] += 1
+            self._samples.append((time.monotonic(), key, duration, rows))
+        if duration >= self.slow_threshold:
+            if isinstance(query, bytes):
+                query = query.decode('utf-8', 'replace')
+            read_only = not QUERY_WRITES.search(str(query))
+            logger.warning("Consulta lenta (%.0f ms) em %s/%s: %s", duration * 1000, page, function, fingerprint[:300])
+            with self._lock:
+                self._slow.append({
+                    'at': datetime.now(timezone.utc),
+                    'query': query_id,
+                    'function': function,
+                    'page': page,
+                    'ms': duration * 1000,
+                    'rows': rows,
+                    'sql': str(query),
+                    'params': params if read_only else None,
+                    'explainable': read_only,
+                })
+
+    def begin_rerun(self):
+        self._local.run = []
+        self._local.started = time.perf_counter()
+
+    def end_rerun(self, label=None):
+        run = getattr(self._local, 'run', None)
+        if run is None:
+            return None
+        self._local.run = None
+        summary = {
+            'at': datetime.now(timezone.utc),
+            'label': label or next((entry['page'] for entry in reversed(run) if entry['page'] != '-'), '-'),
+            'statements': len(run),
+            'db_ms': sum(entry['ms'] for entry in run),
+            'elapsed_ms': (time.perf_counter() - self._local.started) * 1000,
+            'entries': run,
+        }
+        with self._lock:
+            self._reruns.append({k: v for k, v in summary.items() if k != 'entries'})
+        return summary
+
+    def register_gauges(self, prefix, stats):
+        with self._lock:
+            self._gauges[prefix] = stats
+
+    def window_stats(self):
+        cutoff = time.monotonic() - self.window
+        grouped = {}
+        with self._lock:
+            samples = [sample for sample in self._samples if sample[0] >= cutoff]
+            statements = dict(self._statements)
+        for _, key, duration, rows in samples:
+            grouped.setdefault(key, []).append((duration, rows))
+        stats = []
+        for (query_id, function, page), values in grouped.items():
+            durations = sorted(duration for duration, _ in values)
+            stats.append({
+                'query': query_id,
+                'function': function,
+                'page': page,
+                'count': len(values),
+                'total_ms': sum(durations) * 1000,
+                'avg_ms': statistics.fmean(durations) * 1000,
+                'p95_ms': durations[min(len(durations) - 1, int(0.95 * len(durations)))] * 1000,
+                'max_ms': durations[-1] * 1000,
+                'avg_rows': statistics.fmean(rows for _, rows in values),
+                'sql': statements.get(query_id, ''),
+            })
+        return sorted(stats, key=lambda row: row['total_ms'], reverse=True)
+
+    def slow_queries(self):
+        with self._lock:
+            return list(reversed(self._slow))
+
+    def recent_reruns(self):
+        with self._lock:
+            return list(reversed(self._reruns))
+
+    def metrics_text(self):
+        with self._lock:
+            totals = {key: (count, seconds, rows, list(buckets)) for key, (count, seconds, rows, buckets) in self._totals.items()}
+            statements = dict(self._statements)
+            gauges = dict(self._gauges)
+        lines = []
+        for query_id in sorted({key[0] for key in totals}):
+            lines.append(f"# query {query_id}: {statements[query_id][:200]}")
+        lines += [
+            "# HELP plt_db_query_seconds Duração dos statements por consulta, função e página",
+            "# TYPE plt_db_query_seconds histogram",
+        ]
+        for (query_id, function, page), (count, seconds, rows, buckets) in sorted(totals.items()):
+            labels = f'query="{query_id}",function="{function}",page="{page}"'
+            for bound, bucket in zip(QUERY_HISTOGRAM_BUCKETS, buckets):
+                lines.append(f'plt_db_query_seconds_bucket{{{labels},le="{bound}"}} {bucket}')
+            lines.append(f'plt_db_query_seconds_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f'plt_db_query_seconds_sum{{{labels}}} {seconds:.6f}')
+            lines.append(f'plt_db_query_seconds_count{{{labels}}} {count}')
+        lines += [
+            "# HELP plt_db_query_rows_total Linhas retornadas ou afetadas",
+            "# TYPE plt_db_query_rows_total counter",
+        ]
+        for (query_id, function, page), (count, seconds, rows, buckets) in sorted(totals.items()):
+            lines.append(f'plt_db_query_rows_total{{query="{query_id}",function="{function}",page="{page}"}} {rows}')
+        for prefix, stats in sorted(gauges.items()):
+            try:
+                values = stats()
+            except Exception:
+                continue
+            for name, value in sorted(values.items()):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f"# TYPE {prefix}_{name} gauge")
+                    lines.append(f"{prefix}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path):
+        temporary = f"{path}.tmp"
+        with open(temporary, 'w') as output:
+            output.write(self.metrics_text())
+        os.replace(temporary, path)
+
+    def start_textfile(self, path, interval=15.0):
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.write_textfile(path)
+                except Exception:
+                    logger.exception("Falha ao gravar métricas em %s", path)
+        self._thread = threading.Thread(target=run, name="query-metrics", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._stop.set()
+
+@st.cache_resource
+def get_query_profiler():
+    profiler = QueryProfiler(
+        window=float(st.secrets.get("QUERY_PROFILE_WINDOW", 300)),
+        slow_threshold=float(st.secrets.get("SLOW_QUERY_MS", 200)) / 1000,
+        max_samples=int(st.secrets.get("QUERY_PROFILE_MAX_SAMPLES", 20000))
+    )
+    path = st.secrets.get("QUERY_METRICS_FILE")
+    if path:
+        profiler.start_textfile(path, float(st.secrets.get("QUERY_METRICS_INTERVAL", 15)))
+    atexit.register(profiler.close)
+    return profiler
+
+_profiled_cursors = {}
+
+def profiled_cursor(base):
+    if base not in _profiled_cursors:
+        def execute(self, query, vars=None):
+            started = time.perf_counter()
+            try:
+                return base.execute(self, query, vars)
+            finally:
+                self.connection.profiler.record(query, vars, time.perf_counter() - started, self.rowcount)
+        _profiled_cursors[base] = type(f'Profiled{base.__name__}', (base,), {'execute': execute})
+    return _profiled_cursors[base]
+
+class ProfiledConnection(psycopg2.extensions.connection):
+    profiler = None
+
+    def cursor(self, *args, **kwargs):
+        base = kwargs.pop('cursor_factory', None) or psycopg2.extensions.cursor
+        if self.profiler is None:
+            return super().cursor(*args, cursor_factory=base, **kwargs)
+        return super().cursor(*args, cursor_factory=profiled_cursor(base), **kwargs)
+
+def connect_profiled(db_config, profiler):
+    conn = psycopg2.connect(connection_factory=ProfiledConnection, **db_config)
+    conn.profiler = profiler
+    return conn
+
+def explain_analyze(sql, params=None):
+    with get_db_connection() as conn, conn.cursor() as cur:
+        try:
+            cur.execute("EXPLAIN (ANALYZE, BUFFERS) " + sql, params)
+            plan = "\n".join(row[0] for row in cur.fetchall())
+        finally:
+            conn.rollback()
+    logger.warning("EXPLAIN ANALYZE de consulta lenta:\n%s\n%s", sql.strip(), plan)
+    return plan
+
+@st.cache_resource
+def get_pool():
+    db_config = get_db_config()
+    profiler = get_query_profiler()
+    pool = ConnectionPool(lambda: connect_profiled(db_config, profiler), **get_pool_config())
+    profiler.register_gauges('plt_db_pool', pool.stats)
+    atexit.register(pool.closeall)
+    return pool
+
+@contextmanager
+def get_db_connection():
+    with get_pool().connection() as conn:
+        yield conn
+
+WRITE_BEHIND_STATEMENTS = {
+    'video_views': """
+        INSERT INTO video_views (email, course_id, lesson_number, view_time)
+        VALUES %s
+    """,
+    'quiz_attempts': """
+        WITH attempts AS (
+            INSERT INTO quiz_attempts (email, course_id, lesson_number, question_numbers,
+                                       results, correct_count, passed, attempted_at)
+            VALUES %s
+            RETURNING course_id, lesson_number, question_numbers, results
+        )
+        INSERT INTO quiz_question_stats (course_id, lesson_number, question_number, attempts, correct)
+        SELECT a.course_id, a.lesson_number, q.question_number,
+               COUNT(*), COUNT(*) FILTER (WHERE q.correct)
+        FROM attempts a, unnest(a.question_numbers, a.results) AS q(question_number, correct)
+        GROUP BY a.course_id, a.lesson_number, q.question_number
+        ON CONFLICT (course_id, lesson_number, question_number) DO UPDATE
+        SET attempts = quiz_question_stats.attempts + EXCLUDED.attempts,
+            correct = quiz_question_stats.correct + EXCLUDED.correct
+    """,
 }
 
-def check_active_sessions(email):
-    try:
-        conn = get_db_connection()
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+def get_write_behind_config():
+    return {
+        'max_pending': int(st.secrets.get("WRITE_BEHIND_MAX_PENDING", 10000)),
+        'batch_size': int(st.secrets.get("WRITE_BEHIND_BATCH_SIZE", 500)),
+        'flush_interval': float(st.secrets.get("WRITE_BEHIND_FLUSH_INTERVAL", 2)),
+        'put_timeout': float(st.secrets.get("WRITE_BEHIND_PUT_TIMEOUT", 0.05)),
+        'dedupe_window': float(st.secrets.get("VIDEO_VIEW_DEDUPE_WINDOW", 300)),
+        'max_attempts': int(st.secrets.get("WRITE_BEHIND_MAX_ATTEMPTS", 5)),
+    }
+
+class WriteBehindWriter:
+    def __init__(self, connection, statements, max_pending=10000, batch_size=500,
+                 flush_interval=2.0, put_timeout=0.05, dedupe_window=300.0, max_attempts=5):
+        self._connection = connection
+        self._statements = statements
+        self._queue = queue.Queue(maxsize=max_pending)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.dedupe_window = dedupe_window
+        self.max_attempts = max_attempts
+        self._dedupe = {}
+        self._dropped = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self.counters = {
+            'enqueued': 0,
+            'written': 0,
+            'deduplicated': 0,
+            'dropped': 0,
+            'retried': 0,
+            'batches': 0,
+            'errors': 0,
+        }
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def _is_duplicate(self, key):
+        now = time.monotonic()
+        with self._lock:
+            last = self._dedupe.get(key)
+            if last is not None and now - last < self.dedupe_window:
+                self.counters['deduplicated'] += 1
+                return True
+            self._dedupe[key] = now
+            return False
+
+    def _prune_dedupe(self):
+        cutoff = time.monotonic() - self.dedupe_window
+        with self._lock:
+            expired = [key for key, seen in self._dedupe.items() if seen < cutoff]
+            for key in expired:
+                del self._dedupe[key]
+
+    def submit(self, table, row, dedupe_key=None):
+        if table not in self._statements:
+            raise ValueError(f"Tabela sem escrita assíncrona: {table}")
+        if self._stop.is_set():
+            return False
+        if dedupe_key is not None and self._is_duplicate((table,) + tuple(dedupe_key)):
+            return False
+        try:
+            self._queue.put((table, row, 0), timeout=self.put_timeout)
+        except queue.Full:
+            self._drop(table, 1)
+            return False
+        with self._lock:
+            self.counters['enqueued'] += 1
+        if self._queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def _take_batch(self):
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _drop(self, table, count):
+        with self._lock:
+            self.counters['dropped'] += count
+            self._dropped[table] = self._dropped.get(table, 0) + count
+
+    def _write(self, batch):
+        by_table = {}
+        for table, row, attempts in batch:
+            by_table.setdefault(table, []).append((row, attempts))
+        failed = []
+        for table, events in by_table.items():
+            try:
+                with self._connection() as conn, conn.cursor() as cur:
+                    execute_values(cur, self._statements[table], [row for row, _ in events],
+                                   page_size=self.batch_size)
+                    conn.commit()
+            except Exception:
+                logger.exception("Falha ao gravar %d eventos em %s", len(events), table)
+                with self._lock:
+                    self.counters['errors'] += 1
+                failed.extend((table, row, attempts + 1) for row, attempts in events)
+                continue
+            with self._lock:
+                self.counters['batches'] += 1
+                self.counters['written'] += len(events)
+        return failed
+
+    def _requeue(self, failed):
+        dropped = {}
+        for table, row, attempts in failed:
+            if attempts < self.max_attempts:
+                try:
+                    self._queue.put_nowait((table, row, attempts))
+                except queue.Full:
+                    pass
+                else:
+                    with self._lock:
+                        self.counters['retried'] += 1
+                    continue
+            dropped[table] = dropped.get(table, 0) + 1
+        for table, count in dropped.items():
+            logger.error("Descartando %d eventos de %s após falhas de gravação", count, table)
+            self._drop(table, count)
+
+    def flush(self):
+        with self._flush_lock:
+            failed = []
+            while True:
+                batch = self._take_batch()
+                if not batch:
+                    break
+                failed.extend(self._write(batch))
+            self._requeue(failed)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+            self._prune_dedupe()
+
+    def close(self, timeout=10.0):
+        self._stop.set()
+        self._wakeup.set()
+        self._thread.join(timeout)
+        for _ in range(self.max_attempts):
+            self.flush()
+            if self._queue.empty():
+                return
+        dropped = {}
+        batch = self._take_batch()
+        while batch:
+            for table, _, _ in batch:
+                dropped[table] = dropped.get(table, 0) + 1
+            batch = self._take_batch()
+        for table, count in dropped.items():
+            logger.error("Descartando %d eventos de %s ao encerrar", count, table)
+            self._drop(table, count)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['dropped_by_table'] = dict(self._dropped)
+            stats['pending'] = self._queue.qsize()
+            stats['dedupe_keys'] = len(self._dedupe)
+            return stats
+
+@st.cache_resource
+def get_event_writer():
+    writer = WriteBehindWriter(get_pool().connection, WRITE_BEHIND_STATEMENTS, **get_write_behind_config())
+    atexit.register(writer.close)
+    return writer
+
+class CatalogCache:
+    def __init__(self, ttl=3600.0, maxsize=2048):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.counters = {
+            'hits': 0,
+            'misses': 0,
+            'expired': 0,
+            'evictions': 0,
+            'invalidations': 0,
+        }
+
+    def get(self, key, loader):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > now:
+                    self._data.move_to_end(key)
+                    self.counters['hits'] += 1
+                    return value
+                del self._data[key]
+                self.counters['expired'] += 1
+            self.counters['misses'] += 1
+            generation = self._generation
+
+        value = loader()
+
+        with self._lock:
+            if generation == self._generation:
+                self._data[key] = (time.monotonic() + self.ttl, value)
+                self._data.move_to_end(key)
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+                    self.counters['evictions'] += 1
+        return value
+
+    def invalidate(self, *prefix):
+        with self._lock:
+            self._generation += 1
+            stale = [key for key in self._data if key[:len(prefix)] == prefix]
+            for key in stale:
+                del self._data[key]
+            self.counters['invalidations'] += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['size'] = len(self._data)
+            lookups = stats['hits'] + stats['misses']
+            stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+            return stats
+
+@st.cache_resource
+def get_catalog_cache():
+    return CatalogCache(
+        ttl=float(st.secrets.get("CATALOG_CACHE_TTL", 3600)),
+        maxsize=int(st.secrets.get("CATALOG_CACHE_MAXSIZE", 2048))
+    )
+
+class CatalogSync:
+    def __init__(self, connection, cache, poll_interval=5.0):
+        self._connection = connection
+        self._cache = cache
+        self.poll_interval = poll_interval
+        self._version = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.counters = {
+            'polls': 0,
+            'bumps': 0,
+            'changes': 0,
+            'poll_errors': 0,
+            'bump_errors': 0,
+        }
+        self._thread = None
+
+    def start(self):
+        try:
+            self.poll()
+        except Exception:
+            logger.exception("Falha ao carregar a versão do catálogo")
+        self._thread = threading.Thread(target=self._run, name="catalog-sync", daemon=True)
+        self._thread.start()
+        return self
+
+    def poll(self):
+        with self._connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT version FROM catalog_version WHERE id = 1")
+            row = cur.fetchone()
+        version = row[0] if row else 0
+        with self._lock:
+            changed = self._version is not None and version != self._version
+            self._version = version
+            self.counters['polls'] += 1
+            if changed:
+                self.counters['changes'] += 1
+        if changed:
+            self._cache.clear()
+
+    def bump(self):
+        try:
+            with self._connection() as conn, conn.cursor() as cur:
+                cur.execute("""
+                    UPDATE catalog_version
+                    SET version = version + 1
+                    WHERE id = 1
+                    RETURNING version
+                """)
+                version = cur.fetchone()[0]
+                conn.commit()
+        except Exception:
+            logger.exception("Falha ao publicar a versão do catálogo")
+            with self._lock:
+                self.counters['bump_errors'] += 1
+            return
+        with self._lock:
+            self.counters['bumps'] += 1
+            if self._version is not None and version == self._version + 1:
+                self._version = version
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Falha ao consultar a versão do catálogo")
+                with self._lock:
+                    self.counters['poll_errors'] += 1
+
+    def close(self):
+        self._stop.set()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['version'] = self._version
+            return stats
+
+@st.cache_resource
+def get_catalog_sync():
+    sync = CatalogSync(
+        get_pool().connection,
+        get_catalog_cache(),
+        poll_interval=float(st.secrets.get("CATALOG_POLL_INTERVAL", 5))
+    )
+    atexit.register(sync.close)
+    return sync.start()
+
+def invalidate_course(course_id=None):
+    cache = get_catalog_cache()
+    cache.invalidate('courses')
+    cache.invalidate('lesson_index')
+    if course_id is not None:
+        cache.invalidate('lessons', course_id)
+        cache.invalidate('quiz', course_id)
+    get_catalog_sync().bump()
+
+def invalidate_lesson(course_id, lesson_number=None):
+    cache = get_catalog_cache()
+    cache.invalidate('lesson_index')
+    cache.invalidate('lessons', course_id)
+    if lesson_number is not None:
+        cache.invalidate('quiz', course_id, lesson_number)
+    get_catalog_sync().bump()
+
+def get_courses():
+    def load():
+        with get_db_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("SELECT id, name, topics FROM courses ORDER BY name")
+            return cur.fetchall()
+    return get_catalog_cache().get(('courses',), load)
+
+def get_lesson_index():
+    def load():
+        with get_db_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute("""
-                SELECT COUNT(*) as active_sessions
-                FROM active_sessions
-                WHERE email = %s AND last_activity > NOW() - INTERVAL '30 minutes'
-            """, (email,))
-            result = cur.fetchone()
-            return result['active_sessions'] if result else 0
-    except Exception:
-        return 0
+                SELECT c.id, c.name, l.lesson_number
+                FROM courses c
+                JOIN lessons l ON c.id = l.course_id
+                ORDER BY c.name, l.lesson_number
+            """)
+            return cur.fetchall()
+    return get_catalog_cache().get(('lesson_index',), load)
 
-def log_login_attempt(email, success, ip_address='unknown'):
-    try:
-        conn = get_db_connection()
-        with conn.cursor() as cur:
+def get_course_lessons(course_id):
+    def load():
+        with get_db_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute("""
-                INSERT INTO login_logs (email, success, ip_address)
-                VALUES (%s, %s, %s)
-            """, (email, success, ip_address))
-            conn.commit()
-    except Exception:
-        pass
+                SELECT l.lesson_number, l.video_url, l.video_id, l.pdf_url,
+                       m.title AS video_title, m.duration_seconds AS video_duration,
+                       COALESCE(q.quiz_count, 0) AS quiz_count
+                FROM lessons l
+                LEFT JOIN video_metadata m ON m.video_id = l.video_id
+                LEFT JOIN (
+                    SELECT lesson_number, COUNT(*) AS quiz_count
+                    FROM quiz
+                    WHERE course_id = %s
+                    GROUP BY lesson_number
+                ) q ON q.lesson_number = l.lesson_number
+                WHERE l.course_id = %s
+                ORDER BY l.lesson_number
+            """, (course_id, course_id))
+            return cur.fetchall()
+    return get_catalog_cache().get(('lessons', course_id), load)
 
-def check_login_attempts(email, ip_address='unknown'):
-    try:
-        conn = get_db_connection()
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+class LoginRateLimiter:
+    def __init__(self, connection, max_attempts=5, window=900.0, reconcile_interval=30.0):
+        self._connection = connection
+        self.max_attempts = max_attempts
+        self.window = window
+        self.reconcile_interval = reconcile_interval
+        self._failures = {}
+        self._recent = deque(maxlen=100000)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.counters = {
+            'checks': 0,
+            'blocked': 0,
+            'failures': 0,
+            'reconciles': 0,
+            'reconcile_errors': 0,
+        }
+        self._thread = None
+
+    def start(self):
+        try:
+            self.reconcile()
+        except Exception:
+            logger.exception("Falha ao carregar tentativas de login do banco")
+        self._thread = threading.Thread(target=self._run, name="login-rate-limiter", daemon=True)
+        self._thread.start()
+        return self
+
+    @staticmethod
+    def _keys(email, ip_address):
+        keys = [('email', (email or '').strip().lower())]
+        if ip_address and ip_address != 'unknown':
+            keys.append(('ip', ip_address))
+        return keys
+
+    def _count(self, key, now):
+        attempts = self._failures.get(key)
+        if not attempts:
+            return 0
+        cutoff = now - self.window
+        while attempts and attempts[0] <= cutoff:
+            attempts.popleft()
+        if not attempts:
+            del self._failures[key]
+            return 0
+        return len(attempts)
+
+    def _add(self, key, timestamp):
+        attempts = self._failures.get(key)
+        if attempts is None:
+            attempts = self._failures[key] = deque(maxlen=self.max_attempts)
+        attempts.append(timestamp)
+
+    def failures(self, email, ip_address='unknown'):
+        now = time.time()
+        with self._lock:
+            return max(self._count(key, now) for key in self._keys(email, ip_address))
+
+    def is_blocked(self, email, ip_address='unknown'):
+        blocked = self.failures(email, ip_address) >= self.max_attempts
+        with self._lock:
+            self.counters['checks'] += 1
+            if blocked:
+                self.counters['blocked'] += 1
+        return blocked
+
+    def record_failure(self, email, ip_address='unknown', timestamp=None):
+        timestamp = timestamp or time.time()
+        with self._lock:
+            self.counters['failures'] += 1
+            for key in self._keys(email, ip_address):
+                self._add(key, timestamp)
+            self._recent.append((timestamp, email, ip_address))
+            cutoff = time.time() - self.window
+            while self._recent and self._recent[0][0] <= cutoff:
+                self._recent.popleft()
+
+    def reconcile(self):
+        cutoff = time.time()
+        with self._connection() as conn, conn.cursor() as cur:
             cur.execute("""
-                SELECT COUNT(*) as failed_attempts
+                SELECT email, ip_address, EXTRACT(EPOCH FROM attempt_time)
                 FROM login_logs
-                WHERE (email = %s OR ip_address = %s)
-                AND success = false
-                AND attempt_time > NOW() - INTERVAL '15 minutes'
-            """, (email, ip_address))
-            result = cur.fetchone()
-            return result['failed_attempts'] if result else 0
-    except Exception:
-        return 0
+                WHERE success = false
+                AND attempt_time > to_timestamp(%s) - make_interval(secs => %s)
+                AND attempt_time <= to_timestamp(%s)
+                ORDER BY attempt_time
+            """, (cutoff, self.window, cutoff))
+            rows = cur.fetchall()
+
+        failures = {}
+        with self._lock:
+            previous, self._failures = self._failures, failures
+            try:
+                for email, ip_address, timestamp in rows:
+                    for key in self._keys(email, ip_address):
+                        self._add(key, float(timestamp))
+                for timestamp, email, ip_address in self._recent:
+                    if timestamp > cutoff:
+                        for key in self._keys(email, ip_address):
+                            self._add(key, timestamp)
+            except Exception:
+                self._failures = previous
+                raise
+            self.counters['reconciles'] += 1
+
+    def _run(self):
+        while not self._stop.wait(self.reconcile_interval):
+            try:
+                self.reconcile()
+            except Exception:
+                logger.exception("Falha ao reconciliar tentativas de login")
+                with self._lock:
+                    self.counters['reconcile_errors'] += 1
+
+    def close(self):
+        self._stop.set()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['tracked_keys'] = len(self._failures)
+            return stats
+
+@st.cache_resource
+def get_login_rate_limiter():
+    limiter = LoginRateLimiter(
+        get_pool().connection,
+        max_attempts=int(st.secrets.get("LOGIN_MAX_ATTEMPTS", 5)),
+        window=float(st.secrets.get("LOGIN_ATTEMPT_WINDOW", 900)),
+        reconcile_interval=float(st.secrets.get("LOGIN_LIMIT_RECONCILE_INTERVAL", 30))
+    )
+    atexit.register(limiter.close)
+    return limiter.start()
+
+class SessionTracker:
+    def __init__(self, connection, heartbeat_interval=60.0, session_timeout=1800.0, sweep_interval=60.0):
+        self._connection = connection
+        self.heartbeat_interval = heartbeat_interval
+        self.session_timeout = session_timeout
+        self.sweep_interval = sweep_interval
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._last_sweep = 0.0
+        self.counters = {
+            'heartbeats': 0,
+            'writes': 0,
+            'sessions_written': 0,
+            'swept': 0,
+            'errors': 0,
+        }
+        self._thread = threading.Thread(target=self._run, name="session-tracker", daemon=True)
+        self._thread.start()
+
+    def touch(self, session_id):
+        if session_id is None:
+            return
+        with self._lock:
+            self._pending[session_id] = time.time()
+            self.counters['heartbeats'] += 1
+
+    def forget(self, session_id):
+        with self._lock:
+            self._pending.pop(session_id, None)
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            try:
+                with self._connection() as conn, conn.cursor() as cur:
+                    execute_values(cur, """
+                        UPDATE active_sessions s
+                        SET last_activity = GREATEST(s.last_activity, v.last_activity)
+                        FROM (VALUES %s) AS v(session_id, last_activity)
+                        WHERE s.session_id = v.session_id
+                    """, list(pending.items()), template="(%s, to_timestamp(%s))", page_size=1000)
+                    conn.commit()
+            except Exception:
+                logger.exception("Falha ao gravar heartbeat de %d sessões", len(pending))
+                with self._lock:
+                    for session_id, seen in pending.items():
+                        self._pending[session_id] = max(seen, self._pending.get(session_id, 0))
+                    self.counters['errors'] += 1
+                return
+            with self._lock:
+                self.counters['writes'] += 1
+                self.counters['sessions_written'] += len(pending)
+
+    def sweep(self):
+        with self._connection() as conn, conn.cursor() as cur:
+            cur.execute("""
+                DELETE FROM active_sessions
+                WHERE last_activity < NOW() - make_interval(secs => %s)
+            """, (self.session_timeout,))
+            swept = cur.rowcount
+            conn.commit()
+        with self._lock:
+            self.counters['swept'] += max(swept, 0)
+        return swept
+
+    def _run(self):
+        while not self._stop.wait(self.heartbeat_interval):
+            self.flush()
+            if time.monotonic() - self._last_sweep >= self.sweep_interval:
+                self._last_sweep = time.monotonic()
+                try:
+                    self.sweep()
+                except Exception:
+                    logger.exception("Falha ao expirar sessões inativas")
+                    with self._lock:
+                        self.counters['errors'] += 1
+
+    def close(self):
+        self._stop.set()
+        self.flush()
 
-def manage_session(email, action='create'):
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['pending'] = len(self._pending)
+            return stats
+
+@st.cache_resource
+def get_session_tracker():
+    tracker = SessionTracker(
+        get_pool().connection,
+        heartbeat_interval=float(st.secrets.get("SESSION_HEARTBEAT_INTERVAL", 60)),
+        session_timeout=float(st.secrets.get("SESSION_TIMEOUT", 1800)),
+        sweep_interval=float(st.secrets.get("SESSION_SWEEP_INTERVAL", 60))
+    )
+    atexit.register(tracker.close)
+    return tracker
+
+class MetricsRefresher:
+    def __init__(self, connection, interval=60.0, settle_delay=300.0, session_timeout=1800.0,
+                 max_window=timedelta(days=1)):
+        self._connection = connection
+        self.interval = interval
+        self.settle_delay = settle_delay
+        self.session_timeout = session_timeout
+        self.max_window = max_window
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.last_report = None
+        self.counters = {
+            'runs': 0,
+            'skipped': 0,
+            'errors': 0,
+        }
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="metrics-refresher", daemon=True)
+        self._thread.start()
+        return self
+
+    def refresh(self):
+        while not self._stop.is_set():
+            with self._connection() as conn:
+                report = refresh_metrics(conn, self.settle_delay, self.max_window, self.session_timeout)
+            with self._lock:
+                if report is None:
+                    self.counters['skipped'] += 1
+                    return None
+                self.counters['runs'] += 1
+                self.last_report = report
+            if report['caught_up']:
+                return report
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Falha ao agregar métricas do monitoramento")
+                with self._lock:
+                    self.counters['errors'] += 1
+            if self._stop.wait(self.interval):
+                return
+
+    def close(self):
+        self._stop.set()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['last_report'] = self.last_report
+            return stats
+
+@st.cache_resource
+def get_metrics_refresher():
+    refresher = MetricsRefresher(
+        get_pool().connection,
+        interval=float(st.secrets.get("METRICS_REFRESH_INTERVAL", 60)),
+        settle_delay=float(st.secrets.get("METRICS_SETTLE_DELAY", 300)),
+        session_timeout=float(st.secrets.get("SESSION_TIMEOUT", 1800))
+    )
+    atexit.register(refresher.close)
+    return refresher.start()
+
+class AccessRegistry:
+    def __init__(self, connection, poll_interval=30.0):
+        self._connection = connection
+        self.poll_interval = poll_interval
+        self._versions = {}
+        self._watermark = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.counters = {
+            'polls': 0,
+            'changes': 0,
+            'poll_errors': 0,
+        }
+        self._thread = None
+
+    def start(self):
+        try:
+            self.poll()
+        except Exception:
+            logger.exception("Falha ao carregar versões de permissões")
+        self._thread = threading.Thread(target=self._run, name="access-registry", daemon=True)
+        self._thread.start()
+        return self
+
+    def bump(self, versions):
+        with self._lock:
+            for email, version in versions.items():
+                if version > self._versions.get(email, 0):
+                    self._versions[email] = version
+                    self.counters['changes'] += 1
+
+    def version(self, email):
+        with self._lock:
+            return self._versions.get(email, 0)
+
+    def poll(self):
+        with self._connection() as conn, conn.cursor() as cur:
+            if self._watermark is None:
+                cur.execute("SELECT COALESCE(MAX(permissions_version), 0) FROM users")
+                rows = []
+                watermark = cur.fetchone()[0]
+            else:
+                cur.execute("""
+                    SELECT email, permissions_version
+                    FROM users
+                    WHERE permissions_version > %s
+                """, (self._watermark,))
+                rows = cur.fetchall()
+                watermark = max([self._watermark] + [version for _, version in rows])
+        self.bump(dict(rows))
+        with self._lock:
+            self._watermark = watermark
+            self.counters['polls'] += 1
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Falha ao consultar mudanças de permissões")
+                with self._lock:
+                    self.counters['poll_errors'] += 1
+
+    def close(self):
+        self._stop.set()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['tracked_users'] = len(self._versions)
+            stats['watermark'] = self._watermark
+            return stats
+
+@st.cache_resource
+def get_access_registry():
+    registry = AccessRegistry(
+        get_pool().connection,
+        poll_interval=float(st.secrets.get("ENTITLEMENTS_POLL_INTERVAL", 30))
+    )
+    atexit.register(registry.close)
+    return registry.start()
+
+def make_entitlements(email, permissions, version):
+    return {'email': email, 'courses': frozenset(permissions or []), 'version': version or 0}
+
+def load_entitlements(email):
+    with get_db_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("""
+            SELECT permissions, permissions_version
+            FROM users
+            WHERE email = %s
+        """, (email,))
+        user = cur.fetchone() or {'permissions': None, 'permissions_version': 0}
+    return make_entitlements(email, user['permissions'], user['permissions_version'])
+
+def get_entitlements():
+    email = st.session_state.get('user_email')
+    if not email:
+        return frozenset()
+    entitlements = st.session_state.get('entitlements')
+    if (entitlements is None or entitlements['email'] != email
+            or get_access_registry().version(email) > entitlements['version']):
+        entitlements = st.session_state.entitlements = load_entitlements(email)
+    return entitlements['courses']
+
+def manage_session(email, action='create', session_id=None):
     try:
-        conn = get_db_connection()
-        with conn.cursor() as cur:
+        if action == 'update':
+            get_session_tracker().touch(session_id)
+            return session_id
+        with get_db_connection() as conn, conn.cursor() as cur:
             if action == 'create':
                 cur.execute("""
                     INSERT INTO active_sessions (email, last_activity)
@@ -125,249 +1420,600 @@ def manage_session(email, action='create'):
                 session_id = cur.fetchone()[0]
                 conn.commit()
                 return session_id
-            elif action == 'update':
-                cur.execute("""
-                    UPDATE active_sessions
-                    SET last_activity = NOW()
-                    WHERE email = %s
-                """, (email,))
-                conn.commit()
             elif action == 'delete':
-                cur.execute("""
-                    DELETE FROM active_sessions
-                    WHERE email = %s
-                """, (email,))
+                if session_id is not None:
+                    get_session_tracker().forget(session_id)
+                    cur.execute("""
+                        DELETE FROM active_sessions
+                        WHERE session_id = %s
+                    """, (session_id,))
+                else:
+                    cur.execute("""
+                        DELETE FROM active_sessions
+                        WHERE email = %s
+                    """, (email,))
                 conn.commit()
     except Exception:
         return None
 
-def get_db_connection():
-    try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        return conn
-    except Exception as e:
-        st.error(f"Erro ao conectar ao banco de dados: {str(e)}")
-        return None
+PASSWORD_HASH_DEFAULT_COST = {
+    'scrypt': 14,
+    'pbkdf2_sha256': 600000,
+}
 
-def execute_query(query, params=None, fetch=False):
-    conn = None
-    try:
-        conn = get_db_connection()
-        if not conn:
-            st.error("Não foi possível estabelecer conexão com o banco de dados")
-            return None
-        
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(query, params)
-            if fetch:
-                result = cur.fetchall()
-            else:
-                result = None
-            conn.commit()
-            return result
-    except Exception as e:
-        st.error(f"Erro na execução da query: {str(e)}")
-        if conn:
-            try:
-                conn.rollback()
-            except:
-                pass
-        return None
-    finally:
-        if conn:
-            try:
-                conn.close()
-            except:
-                pass
+def get_password_hash_config():
+    scheme = st.secrets.get("PASSWORD_HASH_SCHEME", "scrypt")
+    if scheme not in PASSWORD_HASH_DEFAULT_COST:
+        raise ValueError(f"PASSWORD_HASH_SCHEME inválido: {scheme}")
+    return {
+        'scheme': scheme,
+        'cost': int(st.secrets.get("PASSWORD_HASH_COST", PASSWORD_HASH_DEFAULT_COST[scheme])),
+    }
+
+def _b64encode(raw):
+    return base64.b64encode(raw).decode('ascii').rstrip('=')
+
+def _b64decode(text):
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+def _scrypt(password, salt, log2_n, r=8, p=1):
+    n = 1 << log2_n
+    return hashlib.scrypt(
+        password.encode(), salt=salt, n=n, r=r, p=p,
+        maxmem=256 * n * r * p, dklen=32
+    )
+
+def _pbkdf2(password, salt, iterations):
+    return hashlib.pbkdf2_hmac('sha256', password.encode(), salt, iterations, dklen=32)
+
+def hash_password(password, scheme='scrypt', cost=None):
+    cost = cost or PASSWORD_HASH_DEFAULT_COST[scheme]
+    salt = os.urandom(16)
+    if scheme == 'scrypt':
+        digest = _scrypt(password, salt, cost)
+        return f"scrypt${cost}$8$1${_b64encode(salt)}${_b64encode(digest)}"
+    if scheme == 'pbkdf2_sha256':
+        digest = _pbkdf2(password, salt, cost)
+        return f"pbkdf2_sha256${cost}${_b64encode(salt)}${_b64encode(digest)}"
+    raise ValueError(f"Esquema de hash desconhecido: {scheme}")
+
+def parse_password_hash(stored):
+    if not stored:
+        return None, None
+    if '$' not in stored:
+        if re.fullmatch(r'[0-9a-f]{64}', stored):
+            return 'sha256', 0
+        return None, None
+    parts = stored.split('$')
+    if parts[0] == 'scrypt' and len(parts) == 6:
+        return 'scrypt', int(parts[1])
+    if parts[0] == 'pbkdf2_sha256' and len(parts) == 4:
+        return 'pbkdf2_sha256', int(parts[1])
+    return None, None
+
+def verify_password(password, stored):
+    scheme, _ = parse_password_hash(stored)
+    if scheme == 'sha256':
+        candidate = hashlib.sha256(password.encode()).hexdigest()
+        return hmac.compare_digest(candidate, stored)
+    if scheme == 'scrypt':
+        _, log2_n, r, p, salt, digest = stored.split('$')
+        candidate = _scrypt(password, _b64decode(salt), int(log2_n), int(r), int(p))
+        return hmac.compare_digest(candidate, _b64decode(digest))
+    if scheme == 'pbkdf2_sha256':
+        _, iterations, salt, digest = stored.split('$')
+        candidate = _pbkdf2(password, _b64decode(salt), int(iterations))
+        return hmac.compare_digest(candidate, _b64decode(digest))
+    return False
+
+def password_needs_rehash(stored, scheme, cost):
+    return parse_password_hash(stored) != (scheme, cost)
+
+_dummy_hashes = {}
 
-def verify_login(email, password):
-    if check_login_attempts(email) >= 5:
-        st.error("Muitas tentativas de login. Tente novamente mais tarde.")
+def dummy_password_hash(scheme, cost):
+    if (scheme, cost) not in _dummy_hashes:
+        _dummy_hashes[(scheme, cost)] = hash_password(os.urandom(8).hex(), scheme, cost)
+    return _dummy_hashes[(scheme, cost)]
+
+class HashingBusy(Exception):
+    pass
+
+class BoundedExecutor:
+    def __init__(self, max_workers=2, max_pending=32, timeout=5.0):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password-hash")
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self.timeout = timeout
+
+    def run(self, fn, *args):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise HashingBusy("Fila de verificação de senhas cheia")
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+@st.cache_resource
+def get_hash_executor():
+    executor = BoundedExecutor(
+        max_workers=int(st.secrets.get("PASSWORD_HASH_WORKERS", 2)),
+        max_pending=int(st.secrets.get("PASSWORD_HASH_MAX_PENDING", 32)),
+        timeout=float(st.secrets.get("PASSWORD_HASH_TIMEOUT", 5))
+    )
+    atexit.register(executor.shutdown)
+    return executor
+
+def check_password(password, stored, scheme, cost):
+    if not stored:
+        verify_password(password, dummy_password_hash(scheme, cost))
+        return False, None
+    if not verify_password(password, stored):
         return False, None
+    if password_needs_rehash(stored, scheme, cost):
+        return True, hash_password(password, scheme, cost)
+    return True, None
 
-    hashed_password = hashlib.sha256(password.encode()).hexdigest()
+def client_ip(headers, header):
+    addresses = [part.strip() for part in (headers.get(header) or '').split(',') if part.strip()]
+    return addresses[-1] if addresses else 'unknown'
+
+def get_client_ip():
+    header = st.secrets.get("CLIENT_IP_HEADER", "X-Forwarded-For")
+    if not header:
+        return 'unknown'
     try:
-        conn = get_db_connection()
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("""
-                SELECT * FROM users 
-                WHERE email = %s AND password = %s
-            """, (email, hashed_password))
-            user = cur.fetchone()
-            
-            if user:
-                if check_active_sessions(email) >= 2:
-                    st.error("Número máximo de sessões ativas atingido")
-                    log_login_attempt(email, False)
-                    return False, None
-                
-                cur.execute("""
-                    UPDATE users 
-                    SET last_login = CURRENT_TIMESTAMP 
-                    WHERE email = %s
-                """, (email,))
-                conn.commit()
-                
-                manage_session(email, 'create')
-                log_login_attempt(email, True)
-                return True, user['permissions']
-            
-            log_login_attempt(email, False)
-            return False, None
-    except Exception as e:
-        st.error(f"Erro ao verificar login: {str(e)}")
-        return False, None
-    finally:
-        if conn:
-            conn.close()
+        return client_ip(st.context.headers, header)
+    except Exception:
+        return 'unknown'
 
-def verify_video_access(email, course_id, lesson_number):
+def verify_login(email, password, ip_address='unknown'):
     try:
-        conn = get_db_connection()
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        limiter = get_login_rate_limiter()
+        if limiter.is_blocked(email, ip_address):
+            st.error("Muitas tentativas de login. Tente novamente mais tarde.")
+            return False, None, None
+
+        with get_db_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute("""
-                SELECT permissions 
-                FROM users 
+                SELECT password, permissions, permissions_version
+                FROM users
                 WHERE email = %s
             """, (email,))
-            user = cur.fetchone()
-            
-            if not user or course_id not in user['permissions']:
-                return False
-            
+            account = cur.fetchone() or {'password': None, 'permissions': None, 'permissions_version': 0}
+
+        policy = get_password_hash_config()
+        valid, new_hash = get_hash_executor().run(
+            check_password, password, account['password'], policy['scheme'], policy['cost']
+        )
+        attempted_at = time.time()
+
+        with get_db_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute("""
-                SELECT current_lesson, completed_lessons
-                FROM student_progress
-                WHERE email = %s AND course_id = %s
-            """, (email, course_id))
-            progress = cur.fetchone()
-            
-            if not progress:
-                return lesson_number == 1
-            
-            return lesson_number <= progress['current_lesson']
-    except Exception:
+                WITH accepted AS (
+                    SELECT %(email)s::text AS email
+                    WHERE %(valid)s
+                    AND (
+                        SELECT COUNT(*) FROM active_sessions
+                        WHERE email = %(email)s
+                        AND last_activity > NOW() - make_interval(secs => %(session_timeout)s)
+                    ) < %(max_sessions)s
+                ), touched AS (
+                    UPDATE users
+                    SET last_login = CURRENT_TIMESTAMP,
+                        password = CASE
+                            WHEN %(new_hash)s::text IS NOT NULL AND password = %(old_hash)s
+                            THEN %(new_hash)s
+                            ELSE password
+                        END
+                    WHERE email IN (SELECT email FROM accepted)
+                ), session AS (
+                    INSERT INTO active_sessions (email, last_activity)
+                    SELECT email, NOW() FROM accepted
+                    RETURNING session_id
+                ), logged AS (
+                    INSERT INTO login_logs (email, success, ip_address, attempt_time)
+                    VALUES (%(email)s, EXISTS (SELECT 1 FROM accepted), %(ip_address)s,
+                            to_timestamp(%(attempted_at)s))
+                )
+                SELECT (SELECT session_id FROM session) AS session_id
+            """, {
+                'email': email,
+                'valid': valid,
+                'max_sessions': 2,
+                'session_timeout': get_session_tracker().session_timeout,
+                'new_hash': new_hash,
+                'old_hash': account['password'],
+                'ip_address': ip_address,
+                'attempted_at': attempted_at,
+            })
+            session_id = cur.fetchone()['session_id']
+            conn.commit()
+
+        if session_id is None:
+            limiter.record_failure(email, ip_address, attempted_at)
+        if valid and session_id is None:
+            st.error("Número máximo de sessões ativas atingido")
+            return False, None, None
+        if session_id is not None:
+            return True, make_entitlements(email, account['permissions'], account['permissions_version']), session_id
+        return False, None, None
+    except HashingBusy:
+        st.error("Servidor ocupado. Tente entrar novamente em alguns segundos.")
+        return False, None, None
+    except Exception as e:
+        st.error(f"Erro ao verificar login: {str(e)}")
+        return False, None, None
+
+def verify_video_access(course_id, lesson_number, current_lesson=None, entitlements=None):
+    entitlements = get_entitlements() if entitlements is None else entitlements
+    if course_id not in entitlements:
         return False
+    if current_lesson is None:
+        return lesson_number == 1
+    return lesson_number <= current_lesson
 
 def log_video_view(email, course_id, lesson_number):
     try:
-        conn = get_db_connection()
-        with conn.cursor() as cur:
-            cur.execute("""
-                INSERT INTO video_views (email, course_id, lesson_number, view_time)
-                VALUES (%s, %s, %s, NOW())
-            """, (email, course_id, lesson_number))
-            conn.commit()
+        get_event_writer().submit(
+            'video_views',
+            (email, course_id, lesson_number, datetime.now(timezone.utc)),
+            dedupe_key=(email, course_id, lesson_number)
+        )
     except Exception:
         pass
 
+def email_pattern(text, prefix=False):
+    pattern = text.strip().lower().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    pattern = pattern.replace('*', '%')
+    return pattern + '%' if prefix and not pattern.endswith('%') else pattern
+
+def parse_email_list(filename, data):
+    if isinstance(data, bytes):
+        data = data.decode('utf-8-sig')
+    rows = list(csv.reader(io.StringIO(data)))
+    if rows and any(cell.strip().lower() == 'email' for cell in rows[0]):
+        column = [cell.strip().lower() for cell in rows[0]].index('email')
+        values = [row[column] for row in rows[1:] if len(row) > column]
+    else:
+        values = [cell for row in rows for cell in row]
+    emails = [value.strip().lower() for value in values if value.strip()]
+    invalid = [email for email in emails if not re.fullmatch(r'[^@\s]+@[^@\s]+', email)]
+    if invalid:
+        raise ValueError(f"Emails inválidos: {', '.join(invalid[:10])}")
+    return list(dict.fromkeys(emails))
+
+COURSE_ACCESS_CHANGES = {
+    'grant': (
+        "ARRAY(SELECT DISTINCT p FROM unnest(u.permissions || %(courses)s::text[]) p ORDER BY p)",
+        "NOT u.permissions @> %(courses)s::text[]",
+    ),
+    'revoke': (
+        "ARRAY(SELECT p FROM unnest(u.permissions) p WHERE p <> ALL(%(courses)s::text[]))",
+        "u.permissions && %(courses)s::text[]",
+    ),
+}
+
+def update_course_access(course_ids, action='grant', emails=None, pattern=None):
+    if not course_ids:
+        raise ValueError("Selecione ao menos um curso")
+    if emails is None and not pattern:
+        raise ValueError("Informe os emails ou um padrão")
+    value, condition = COURSE_ACCESS_CHANGES[action]
+    selector = (
+        'lower(u.email) COLLATE "C" = ANY(%(emails)s)' if emails is not None
+        else 'lower(u.email) COLLATE "C" LIKE %(pattern)s'
+    )
+    with get_db_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (PERMISSIONS_LOCK_KEY,))
+        cur.execute(f"""
+            WITH targets AS (
+                SELECT u.email
+                FROM users u
+                WHERE {selector}
+                AND NOT 'admin' = ANY(u.permissions)
+            ),
+            updated AS (
+                UPDATE users u
+                SET permissions = {value},
+                    permissions_version = nextval('users_permissions_version_seq')
+                FROM targets t
+                WHERE u.email = t.email
+                AND {condition}
+                RETURNING u.email, u.permissions_version
+            )
+            SELECT (SELECT COUNT(*) FROM targets) AS matched,
+                   (SELECT COUNT(*) FROM updated) AS updated,
+                   (SELECT json_object_agg(email, permissions_version) FROM updated) AS versions,
+                   ARRAY(
+                       SELECT e FROM unnest(%(emails)s::text[]) e
+                       WHERE NOT EXISTS (SELECT 1 FROM users u WHERE lower(u.email) COLLATE "C" = e)
+                       ORDER BY e
+                   ) AS unknown
+        """, {
+            'courses': list(course_ids),
+            'emails': list(emails or []),
+            'pattern': email_pattern(pattern or ''),
+        })
+        result = cur.fetchone()
+        conn.commit()
+    get_access_registry().bump(result.pop('versions') or {})
+    return result
+
+def set_student_courses(email, course_ids):
+    with get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (PERMISSIONS_LOCK_KEY,))
+        cur.execute("""
+            UPDATE users
+            SET permissions = %s,
+                permissions_version = nextval('users_permissions_version_seq')
+            WHERE email = %s
+            AND NOT 'admin' = ANY(permissions)
+            AND permissions IS DISTINCT FROM %s
+            RETURNING permissions_version
+        """, (list(course_ids), email, list(course_ids)))
+        changed = cur.fetchone()
+        conn.commit()
+    if changed:
+        get_access_registry().bump({email: changed[0]})
+    return changed is not None
+
+def search_students(term='', after=None, limit=20):
+    with get_db_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("""
+            SELECT email, permissions
+            FROM users
+            WHERE lower(email) COLLATE "C" LIKE %(pattern)s
+            AND lower(email) COLLATE "C" > COALESCE(%(after)s, '')
+            AND NOT 'admin' = ANY(permissions)
+            ORDER BY lower(email) COLLATE "C"
+            LIMIT %(limit)s
+        """, {'pattern': email_pattern(term, prefix=True), 'after': after, 'limit': limit + 1})
+        rows = cur.fetchall()
+    next_cursor = rows[limit - 1]['email'].lower() if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+def count_students(pattern):
+    with get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT COUNT(*)
+            FROM users
+            WHERE lower(email) COLLATE "C" LIKE %s
+            AND NOT 'admin' = ANY(permissions)
+        """, (email_pattern(pattern),))
+        return cur.fetchone()[0]
+
+def get_student_page_size():
+    return int(st.secrets.get("STUDENT_PAGE_SIZE", 20))
+
+def show_student_picker(courses):
+    page_size = get_student_page_size()
+    term = st.text_input("🔍 Buscar estudante (início do email, * como curinga)", key="access_student_search")
+    state = st.session_state.get("access_student_pages")
+    if state is None or state['term'] != term:
+        state = st.session_state["access_student_pages"] = {'term': term, 'cursors': [None]}
+    
+    students, next_cursor = search_students(term, state['cursors'][-1], page_size)
+    if not students:
+        st.info("ℹ️ Nenhum estudante encontrado.")
+        return
+    
+    course_names = {course['id']: course['name'] for course in courses}
+    st.dataframe(
+        [{
+            'Email': student['email'],
+            'Cursos': ', '.join(course_names.get(course_id, course_id) for course_id in student['permissions']),
+        } for student in students],
+        hide_index=True,
+        use_container_width=True
+    )
+    
+    col1, col2, col3 = st.columns([1, 1, 2])
+    with col1:
+        if len(state['cursors']) > 1 and st.button("⬅️ Anteriores", key="access_students_prev"):
+            state['cursors'].pop()
+            st.rerun()
+    with col2:
+        if next_cursor and st.button("➡️ Próximos", key="access_students_next"):
+            state['cursors'].append(next_cursor)
+            st.rerun()
+    with col3:
+        st.caption(f"Página {len(state['cursors'])}")
+    
+    selected_student = st.selectbox(
+        "👤 Selecione o Estudante",
+        options=[student['email'] for student in students],
+        key="access_student"
+    )
+    current_permissions = next(s['permissions'] for s in students if s['email'] == selected_student)
+    course_options = {course['name']: course['id'] for course in courses}
+    selected_courses = st.multiselect(
+        "📚 Selecione os Cursos",
+        options=list(course_options.keys()),
+        default=[c['name'] for c in courses if c['id'] in current_permissions],
+        key=f"access_courses_{selected_student}"
+    )
+    
+    if st.button("💾 Atualizar Acesso"):
+        try:
+            other_permissions = [p for p in current_permissions if p not in course_options.values()]
+            set_student_courses(selected_student, other_permissions + [course_options[name] for name in selected_courses])
+            st.success(f"✅ Acesso atualizado para {selected_student}")
+            st.rerun()
+        except (RerunException, StopException):
+            raise
+        except Exception as e:
+            st.error(f"Erro ao atualizar acesso: {str(e)}")
+
+def show_bulk_course_access(courses):
+    st.subheader("📦 Acesso em Lote")
+    source = st.radio("Selecionar estudantes por", ["Arquivo CSV", "Padrão de email"], horizontal=True, key="bulk_access_source")
+    emails, pattern = None, None
+    if source == "Arquivo CSV":
+        uploaded = st.file_uploader(
+            "Arquivo com uma coluna `email` (ou um email por linha)",
+            type=['csv', 'txt'],
+            key="bulk_access_file"
+        )
+        if uploaded is not None:
+            try:
+                emails = parse_email_list(uploaded.name, uploaded.getvalue())
+                st.caption(f"{len(emails)} emails no arquivo")
+            except Exception as e:
+                st.error(f"Erro ao ler arquivo: {str(e)}")
+    else:
+        pattern = st.text_input("Padrão (use * como curinga)", placeholder="estudante*@email.com", key="bulk_access_pattern")
+        if pattern.strip():
+            try:
+                st.caption(f"{count_students(pattern)} estudantes correspondem ao padrão")
+            except Exception as e:
+                st.error(f"Erro ao contar estudantes: {str(e)}")
+    
+    course_options = {course['name']: course['id'] for course in courses}
+    selected_courses = st.multiselect("📚 Cursos", options=list(course_options.keys()), key="bulk_access_courses")
+    action = st.radio("Ação", ["Conceder", "Revogar"], horizontal=True, key="bulk_access_action")
+    
+    if st.button("✅ Aplicar em Lote"):
+        try:
+            result = update_course_access(
+                [course_options[name] for name in selected_courses],
+                'grant' if action == "Conceder" else 'revoke',
+                emails=emails,
+                pattern=pattern
+            )
+            st.success(
+                f"✅ {result['updated']} de {result['matched']} estudantes atualizados "
+                f"({result['matched'] - result['updated']} já estavam assim)."
+            )
+            if result['unknown']:
+                st.warning(f"⚠️ Emails não cadastrados: {', '.join(result['unknown'][:20])}")
+        except Exception as e:
+            st.error(f"Erro ao atualizar acesso: {str(e)}")
+
 def manage_course_access():
     st.markdown('<div class="course-container">', unsafe_allow_html=True)
     st.subheader("🔐 Gerenciar Acesso aos Cursos")
     
     try:
-        conn = get_db_connection()
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("""
-                SELECT email, permissions 
-                FROM users 
-                WHERE email LIKE 'estudante%@email.com'
-                ORDER BY email
-            """)
-            students = cur.fetchall()
-            
-            cur.execute("SELECT id, name FROM courses ORDER BY name")
-            courses = cur.fetchall()
-            
-            if students and courses:
-                student_emails = [student['email'] for student in students]
-                selected_student = st.selectbox(
-                    "👤 Selecione o Estudante",
-                    options=student_emails
-                )
-                
-                current_student = next(s for s in students if s['email'] == selected_student)
-                current_permissions = current_student['permissions'] if current_student['permissions'] else []
-                
-                course_options = {course['name']: course['id'] for course in courses}
-                selected_courses = st.multiselect(
-                    "📚 Selecione os Cursos",
-                    options=list(course_options.keys()),
-                    default=[c['name'] for c in courses if c['id'] in current_permissions]
-                )
-                
-                if st.button("💾 Atualizar Acesso"):
-                    try:
-                        new_permissions = [course_options[name] for name in selected_courses]
-                        cur.execute("""
-                            UPDATE users 
-                            SET permissions = %s 
-                            WHERE email = %s
-                        """, (new_permissions, selected_student))
-                        conn.commit()
-                        
-                        st.success(f"✅ Acesso atualizado para {selected_student}")
-                        st.rerun()
-                    except Exception as e:
-                        st.error(f"Erro ao atualizar acesso: {str(e)}")
-            else:
-                st.warning("⚠️ Não há estudantes ou cursos cadastrados")
+        courses = get_courses()
+        if courses:
+            show_student_picker(courses)
+            st.markdown("---")
+            show_bulk_course_access(courses)
+        else:
+            st.warning("⚠️ Não há cursos cadastrados")
+    except (RerunException, StopException):
+        raise
     except Exception as e:
         st.error(f"Erro ao carregar dados: {str(e)}")
     st.markdown('</div>', unsafe_allow_html=True)
 
-def get_student_progress(email, course_id):
-    try:
-        conn = get_db_connection()
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("""
-                SELECT current_lesson, completed_lessons 
-                FROM student_progress 
-                WHERE email = %s AND course_id = %s
-            """, (email, course_id))
-            return cur.fetchone()
-    except Exception as e:
-        st.error(f"Erro ao buscar progresso: {str(e)}")
-        return None
-
 def update_student_progress(email, course_id, lesson_number):
     try:
-        conn = get_db_connection()
-        with conn.cursor() as cur:
+        with get_db_connection() as conn, conn.cursor() as cur:
             cur.execute("""
-                INSERT INTO student_progress (email, course_id, completed_lessons, current_lesson)
-                VALUES (%s, %s, ARRAY[%s], %s)
+                WITH completed AS (
+                    INSERT INTO lesson_completions (email, course_id, lesson_number)
+                    VALUES (%(email)s, %(course_id)s, %(lesson_number)s)
+                    ON CONFLICT DO NOTHING
+                    RETURNING 1
+                )
+                INSERT INTO student_progress (email, course_id, current_lesson, completed_count, last_activity)
+                VALUES (%(email)s, %(course_id)s, %(lesson_number)s + 1, (SELECT COUNT(*) FROM completed), NOW())
                 ON CONFLICT (email, course_id) DO UPDATE
-                SET completed_lessons = array_append(student_progress.completed_lessons, %s),
-                    current_lesson = %s + 1
-            """, (email, course_id, lesson_number, lesson_number + 1, lesson_number, lesson_number))
+                SET current_lesson = GREATEST(student_progress.current_lesson, EXCLUDED.current_lesson),
+                    completed_count = student_progress.completed_count + EXCLUDED.completed_count,
+                    last_activity = EXCLUDED.last_activity
+            """, {'email': email, 'course_id': course_id, 'lesson_number': lesson_number})
             conn.commit()
-            manage_session(email, 'update')
             return True
     except Exception as e:
         st.error(f"Erro ao atualizar progresso: {str(e)}")
         return False
 
-def extract_youtube_id(url):
-    if not url:
-        return None
-    pattern = r'(?:https?:\/\/)?(?:www\.)?(?:youtube\.com\/(?:[^\/\n\s]+\/\S+\/|(?:v|e(?:mbed)?)\/|\S*?[?&]v=)|youtu\.be\/)([a-zA-Z0-9_-]{11})'
-    match = re.search(pattern, url)
-    return match.group(1) if match else None
+def load_course_page(email, course_id, entitlements=None):
+    entitlements = get_entitlements() if entitlements is None else entitlements
+    has_access = course_id in entitlements
+    rows = get_course_lessons(course_id)
+    with get_db_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("""
+            SELECT (
+                       SELECT current_lesson FROM student_progress
+                       WHERE email = %s AND course_id = %s
+                   ) AS current_lesson,
+                   ARRAY(
+                       SELECT lesson_number FROM lesson_completions
+                       WHERE email = %s AND course_id = %s
+                   ) AS completed_lessons,
+                   COALESCE((
+                       SELECT json_object_agg(lesson_number, total_likes)
+                       FROM lesson_like_counts
+                       WHERE course_id = %s AND total_likes > 0
+                   ), '{}'::json) AS like_counts,
+                   ARRAY(
+                       SELECT lesson_number FROM lesson_likes
+                       WHERE course_id = %s AND email = %s
+                   ) AS liked_lessons
+        """, (email, course_id, email, course_id, course_id, course_id, email))
+        user = cur.fetchone()
+
+    like_counts = user['like_counts']
+    liked_lessons = set(user['liked_lessons'])
+    has_progress = user['current_lesson'] is not None
+    current_lesson = user['current_lesson'] if has_progress else 1
+    completed_lessons = set(user['completed_lessons'] or []) if has_progress else set()
+
+    lessons = []
+    for row in rows:
+        lesson_number = row['lesson_number']
+        total_likes = like_counts.get(str(lesson_number), 0)
+        user_liked = lesson_number in liked_lessons
+        is_available = verify_video_access(course_id, lesson_number, user['current_lesson'], entitlements)
+        lessons.append({
+            'lesson_number': lesson_number,
+            'video_url': row['video_url'],
+            'video_id': row['video_id'],
+            'video_title': row['video_title'],
+            'video_duration': row['video_duration'],
+            'pdf_url': row['pdf_url'],
+            'quiz_count': row['quiz_count'],
+            'total_likes': total_likes,
+            'user_liked': user_liked,
+            'is_available': is_available,
+            'is_completed': lesson_number in completed_lessons,
+        })
+
+    return {
+        'course_id': course_id,
+        'has_access': has_access,
+        'current_lesson': current_lesson,
+        'completed_lessons': completed_lessons,
+        'lessons': lessons,
+    }
 
 def manage_quiz(course_id, lesson_number):
     st.markdown('<div class="quiz-container">', unsafe_allow_html=True)
     st.subheader("📝 Gerenciar Quiz")
     
     current_quiz = get_quiz(course_id, lesson_number)
-    if not current_quiz:
-        current_quiz = [{"question": "", "answer": "", "question_number": i+1} for i in range(5)]
+    total_questions = st.number_input(
+        "Número de questões",
+        min_value=1,
+        max_value=100,
+        value=max(len(current_quiz), 5) if current_quiz else 5,
+        key=f"quiz_size_{course_id}_{lesson_number}"
+    )
     
     with st.form(key=f"quiz_form_{course_id}_{lesson_number}"):
         questions = []
         st.write("### Preencha as perguntas e respostas do quiz")
         
-        for i in range(5):
+        for i in range(total_questions):
             st.write(f"**Questão {i+1}**")
             question = st.text_area(
                 "Pergunta:",
@@ -378,7 +2024,8 @@ def manage_quiz(course_id, lesson_number):
             answer = st.text_input(
                 "Resposta:",
                 value=current_quiz[i]['answer'] if i < len(current_quiz) else "",
-                key=f"a_{course_id}_{lesson_number}_{i}"
+                key=f"a_{course_id}_{lesson_number}_{i}",
+                help="Separe respostas alternativas com |. Respostas numéricas aceitam tolerância, ex.: 3,14 ~ 0,01"
             )
             st.markdown("---")
             
@@ -391,54 +2038,330 @@ def manage_quiz(course_id, lesson_number):
         
         submitted = st.form_submit_button("💾 Salvar Quiz")
         if submitted:
-            if len(questions) == 5:
-                if save_quiz(course_id, lesson_number, questions):
-                    st.success("✅ Quiz salvo com sucesso!")
+            if len(questions) == total_questions:
+                result = save_quiz(course_id, lesson_number, questions)
+                if result:
+                    st.success(
+                        f"✅ Quiz salvo com sucesso! {result['inserted']} novas, "
+                        f"{result['updated']} alteradas, {result['deleted']} removidas."
+                    )
                     st.rerun()
             else:
-                st.error("❌ Todas as 5 perguntas e respostas devem ser preenchidas!")
+                st.error(f"❌ Todas as {total_questions} perguntas e respostas devem ser preenchidas!")
     st.markdown('</div>', unsafe_allow_html=True)
 
-def get_quiz(course_id, lesson_number):
+def get_quiz(course_id, lesson_number):
+    def load():
+        with get_db_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                SELECT course_id, lesson_number, question_number, question, answer
+                FROM quiz
+                WHERE course_id = %s AND lesson_number = %s
+                ORDER BY question_number
+            """, (course_id, lesson_number))
+            return cur.fetchall()
+    try:
+        return get_catalog_cache().get(('quiz', course_id, lesson_number), load)
+    except Exception as e:
+        st.error(f"Erro ao buscar quiz: {str(e)}")
+        return []
+
+NUMERIC_ANSWER = re.compile(r'^([-+]?\d+(?:[.,]\d+)?)(?:\s*(?:~|±|\+/-)\s*(\d+(?:[.,]\d+)?))?$')
+
+def normalize_answer(text):
+    text = unicodedata.normalize('NFKD', str(text or ''))
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return ' '.join(text.casefold().split())
+
+def parse_numeric_answer(text):
+    match = NUMERIC_ANSWER.match(text)
+    if not match:
+        return None
+    value = float(match.group(1).replace(',', '.'))
+    tolerance = float(match.group(2).replace(',', '.')) if match.group(2) else 0.0
+    return value, tolerance
+
+def compile_answer(answer):
+    texts, numbers = set(), []
+    for alternative in str(answer or '').split('|'):
+        normalized = normalize_answer(alternative)
+        if not normalized:
+            continue
+        texts.add(normalized)
+        numeric = parse_numeric_answer(normalized)
+        if numeric:
+            numbers.append(numeric)
+    display = str(answer or '').split('|')[0].strip()
+    return frozenset(texts), tuple(numbers), display
+
+class AnswerKey:
+    def __init__(self, questions):
+        self.questions = [
+            (q['question_number'],) + compile_answer(q['answer'])
+            for q in questions
+        ]
+
+    def __len__(self):
+        return len(self.questions)
+
+    def display(self, index):
+        return self.questions[index][3]
+
+    @staticmethod
+    def _matches(texts, numbers, normalized):
+        if normalized in texts:
+            return True
+        if numbers:
+            numeric = parse_numeric_answer(normalized)
+            if numeric and not numeric[1]:
+                return any(abs(numeric[0] - value) <= tolerance + 1e-9 for value, tolerance in numbers)
+        return False
+
+    def grade(self, responses):
+        return [
+            self._matches(texts, numbers, normalize_answer(response))
+            for (_, texts, numbers, _), response in zip(self.questions, responses)
+        ]
+
+def record_quiz_attempt(email, course_id, lesson_number, answer_key, results):
+    try:
+        get_event_writer().submit('quiz_attempts', (
+            email, course_id, lesson_number,
+            [question[0] for question in answer_key.questions],
+            list(results), sum(results), all(results),
+            datetime.now(timezone.utc)
+        ))
+    except Exception:
+        pass
+
+def get_question_stats(course_id, lesson_number):
     try:
-        conn = get_db_connection()
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        with get_db_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
             cur.execute("""
-                SELECT * FROM quiz 
-                WHERE course_id = %s AND lesson_number = %s 
+                SELECT question_number, attempts, correct,
+                       ROUND(100.0 * correct / NULLIF(attempts, 0), 1)::float AS correct_pct
+                FROM quiz_question_stats
+                WHERE course_id = %s AND lesson_number = %s
                 ORDER BY question_number
             """, (course_id, lesson_number))
             return cur.fetchall()
     except Exception as e:
-        st.error(f"Erro ao buscar quiz: {str(e)}")
+        st.error(f"Erro ao buscar estatísticas do quiz: {str(e)}")
         return []
 
+def get_answer_key(course_id, lesson_number, quiz_questions=None):
+    def load():
+        return AnswerKey(quiz_questions if quiz_questions is not None else get_quiz(course_id, lesson_number))
+    return get_catalog_cache().get(('quiz', course_id, lesson_number, 'answer_key'), load)
+
+def save_quizzes(quizzes):
+    rows, keep = [], []
+    for (course_id, lesson_number), questions in quizzes.items():
+        numbers = []
+        for position, question in enumerate(questions, 1):
+            number = int(question.get('question_number') or position)
+            numbers.append(number)
+            rows.append((course_id, int(lesson_number), number,
+                         question['question'].strip(), question['answer'].strip()))
+        keep.append((course_id, int(lesson_number), numbers))
+    if len({row[:3] for row in rows}) != len(rows):
+        raise ValueError("Número de questão repetido na mesma aula")
+
+    with get_db_connection() as conn, conn.cursor() as cur:
+        changed = execute_values(cur, """
+            INSERT INTO quiz (course_id, lesson_number, question_number, question, answer)
+            VALUES %s
+            ON CONFLICT (course_id, lesson_number, question_number) DO UPDATE
+            SET question = EXCLUDED.question, answer = EXCLUDED.answer
+            WHERE (quiz.question, quiz.answer) IS DISTINCT FROM (EXCLUDED.question, EXCLUDED.answer)
+            RETURNING course_id, lesson_number, question_number, (xmax = 0) AS inserted
+        """, rows, page_size=max(1, len(rows)), fetch=True) if rows else []
+        removed = execute_values(cur, """
+            DELETE FROM quiz q
+            USING (VALUES %s) AS k(course_id, lesson_number, question_numbers)
+            WHERE q.course_id = k.course_id
+            AND q.lesson_number = k.lesson_number
+            AND NOT (q.question_number = ANY(k.question_numbers))
+            RETURNING q.course_id, q.lesson_number, q.question_number
+        """, keep, template="(%s, %s, %s::int[])", page_size=max(1, len(keep)), fetch=True) if keep else []
+        stale = [row[:3] for row in changed if not row[3]] + list(removed)
+        if stale:
+            execute_values(cur, """
+                DELETE FROM quiz_question_stats s
+                USING (VALUES %s) AS k(course_id, lesson_number, question_number)
+                WHERE s.course_id = k.course_id
+                AND s.lesson_number = k.lesson_number
+                AND s.question_number = k.question_number
+            """, stale, page_size=max(1, len(stale)))
+        conn.commit()
+
+    for course_id, lesson_number in quizzes:
+        invalidate_lesson(course_id, int(lesson_number))
+    inserted = sum(1 for row in changed if row[3])
+    return {
+        'inserted': inserted,
+        'updated': len(changed) - inserted,
+        'unchanged': len(rows) - len(changed),
+        'deleted': len(removed),
+    }
+
 def save_quiz(course_id, lesson_number, questions):
     try:
-        conn = get_db_connection()
-        with conn.cursor() as cur:
+        return save_quizzes({(course_id, lesson_number): questions})
+    except Exception as e:
+        st.error(f"Erro ao salvar quiz: {str(e)}")
+        return None
+
+def parse_quiz_file(filename, data):
+    if isinstance(data, bytes):
+        data = data.decode('utf-8-sig')
+    if filename.lower().endswith('.json'):
+        records = json.loads(data)
+    else:
+        records = list(csv.DictReader(io.StringIO(data)))
+    quizzes = {}
+    for line, record in enumerate(records, 1):
+        try:
+            key = (str(record['course_id']).strip(), int(record['lesson_number']))
+            question = {
+                'question': str(record['question']),
+                'answer': str(record['answer']),
+                'question_number': int(record['question_number']) if record.get('question_number') else None,
+            }
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"Registro {line} inválido: informe course_id, lesson_number, question e answer")
+        if not question['question'].strip() or not question['answer'].strip():
+            raise ValueError(f"Registro {line} sem pergunta ou resposta")
+        quizzes.setdefault(key, []).append(question)
+    return quizzes
+
+def import_quizzes(filename, data):
+    quizzes = parse_quiz_file(filename, data)
+    if not quizzes:
+        raise ValueError("Arquivo sem questões")
+    with get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT k.course_id, k.lesson_number
+            FROM unnest(%s::text[], %s::int[]) AS k(course_id, lesson_number)
+            WHERE NOT EXISTS (
+                SELECT 1 FROM lessons l
+                WHERE l.course_id = k.course_id AND l.lesson_number = k.lesson_number
+            )
+        """, ([key[0] for key in quizzes], [key[1] for key in quizzes]))
+        missing = cur.fetchall()
+    if missing:
+        listed = ', '.join(f"{course_id}/aula {lesson_number}" for course_id, lesson_number in missing[:10])
+        raise ValueError(f"Aulas inexistentes: {listed}")
+    return save_quizzes(quizzes)
+
+def get_video_metadata_provider():
+    name = st.secrets.get("VIDEO_METADATA_PROVIDER", "oembed")
+    if name == "none":
+        return name, None
+    return name, video_metadata_provider(
+        name,
+        api_key=st.secrets.get("YOUTUBE_API_KEY"),
+        timeout=float(st.secrets.get("VIDEO_METADATA_TIMEOUT", 5))
+    )
+
+def fetch_video_metadata(video_id):
+    name, fetch = get_video_metadata_provider()
+    if fetch is None:
+        return 0
+    with get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT 1 FROM video_metadata WHERE video_id = %s", (video_id,))
+        if cur.fetchone():
+            return 0
+    metadata = fetch([video_id])
+    if not metadata:
+        return 0
+    with get_db_connection() as conn, conn.cursor() as cur:
+        stored = store_video_metadata(cur, name, metadata)
+        conn.commit()
+    return stored
+
+def save_lesson(course_id, lesson_number, video_url, pdf_url):
+    video_id = extract_youtube_id(video_url)
+    if video_url and not video_id:
+        st.error("❌ Link do YouTube inválido. Use um link de vídeo como https://youtu.be/... ou https://www.youtube.com/watch?v=...")
+        return False
+    try:
+        with get_db_connection() as conn, conn.cursor() as cur:
             cur.execute("""
-                DELETE FROM quiz 
-                WHERE course_id = %s AND lesson_number = %s
-            """, (course_id, lesson_number))
-            
-            for i, question in enumerate(questions, 1):
-                cur.execute("""
-                    INSERT INTO quiz (course_id, lesson_number, question_number, question, answer)
-                    VALUES (%s, %s, %s, %s, %s)
-                """, (course_id, lesson_number, i, question['question'], question['answer']))
+                WITH saved AS (
+                    INSERT INTO lessons (course_id, lesson_number, video_url, video_id, pdf_url)
+                    VALUES (%(course_id)s, %(lesson_number)s, %(video_url)s, %(video_id)s, %(pdf_url)s)
+                    ON CONFLICT (course_id, lesson_number)
+                    DO UPDATE SET video_url = EXCLUDED.video_url, video_id = EXCLUDED.video_id,
+                                  pdf_url = EXCLUDED.pdf_url
+                    RETURNING (xmax = 0) AS inserted
+                )
+                INSERT INTO course_stats (course_id, total_lessons)
+                SELECT %(course_id)s, 1 FROM saved WHERE inserted
+                ON CONFLICT (course_id) DO UPDATE
+                SET total_lessons = course_stats.total_lessons + 1,
+                    updated_at = NOW()
+            """, {'course_id': course_id, 'lesson_number': lesson_number,
+                  'video_url': video_url, 'video_id': video_id, 'pdf_url': pdf_url})
             conn.commit()
-            return True
+        invalidate_lesson(course_id, lesson_number)
     except Exception as e:
-        st.error(f"Erro ao salvar quiz: {str(e)}")
+        st.error(f"Erro ao salvar aula: {str(e)}")
+        return False
+    if video_id:
+        try:
+            if fetch_video_metadata(video_id):
+                invalidate_lesson(course_id, lesson_number)
+        except Exception as e:
+            logger.warning("Metadados do vídeo %s não obtidos: %s", video_id, e)
+    return True
+
+def delete_lesson(course_id, lesson_number):
+    try:
+        with get_db_connection() as conn, conn.cursor() as cur:
+            cur.execute("""
+                WITH removed AS (
+                    DELETE FROM lessons
+                    WHERE course_id = %(course_id)s AND lesson_number = %(lesson_number)s
+                    RETURNING 1
+                ),
+                questions AS (
+                    DELETE FROM quiz
+                    WHERE course_id = %(course_id)s AND lesson_number = %(lesson_number)s
+                    AND EXISTS (SELECT 1 FROM removed)
+                ),
+                completions AS (
+                    DELETE FROM lesson_completions
+                    WHERE course_id = %(course_id)s AND lesson_number = %(lesson_number)s
+                    AND EXISTS (SELECT 1 FROM removed)
+                    RETURNING email
+                ),
+                progress AS (
+                    UPDATE student_progress sp
+                    SET completed_count = GREATEST(sp.completed_count - 1, 0)
+                    FROM completions c
+                    WHERE sp.email = c.email AND sp.course_id = %(course_id)s
+                )
+                UPDATE course_stats
+                SET total_lessons = GREATEST(total_lessons - 1, 0),
+                    updated_at = NOW()
+                WHERE course_id = %(course_id)s
+                AND EXISTS (SELECT 1 FROM removed)
+            """, {'course_id': course_id, 'lesson_number': lesson_number})
+            conn.commit()
+        invalidate_lesson(course_id, lesson_number)
+        return True
+    except Exception as e:
+        st.error(f"Erro ao remover aula: {str(e)}")
         return False
 
-def show_quiz(course_id, lesson_number):
+def show_quiz(course_id, lesson_number, quiz_questions=None):
     st.markdown('<div class="quiz-container">', unsafe_allow_html=True)
     st.subheader("📝 Quiz da Aula")
     st.write("⚠️ Você precisa acertar todas as questões para avançar para a próxima aula")
     
-    quiz_questions = get_quiz(course_id, lesson_number)
+    if quiz_questions is None:
+        quiz_questions = get_quiz(course_id, lesson_number)
     
     if not quiz_questions:
         st.info("ℹ️ Nenhum quiz disponível para esta aula.")
@@ -452,21 +2375,24 @@ def show_quiz(course_id, lesson_number):
                 "Sua resposta:",
                 key=f"quiz_answer_{course_id}_{lesson_number}_{q['question_number']}"
             )
-            responses.append((answer.strip().lower(), q['answer'].lower()))
+            responses.append(answer)
         
         submitted = st.form_submit_button("📋 Enviar Respostas")
         if submitted:
-            if all(resp[0] for resp in responses):
-                correct_answers = sum(1 for resp, ans in responses if resp == ans)
-                total_questions = len(quiz_questions)
+            if all(resp.strip() for resp in responses):
+                answer_key = get_answer_key(course_id, lesson_number, quiz_questions)
+                results = answer_key.grade(responses)
+                record_quiz_attempt(st.session_state.user_email, course_id, lesson_number, answer_key, results)
+                correct_answers = sum(results)
+                total_questions = len(answer_key)
                 
                 st.write(f"Resultado: {correct_answers}/{total_questions} questões corretas")
                 
-                for i, (response, question) in enumerate(zip(responses, quiz_questions)):
-                    if response[0] == response[1]:
+                for i, is_correct in enumerate(results):
+                    if is_correct:
                         st.success(f"✅ Questão {i+1}: Correta!")
                     else:
-                        st.error(f"❌ Questão {i+1}: Incorreta - A resposta correta é '{question['answer']}'")
+                        st.error(f"❌ Questão {i+1}: Incorreta - A resposta correta é '{answer_key.display(i)}'")
                 
                 if correct_answers == total_questions:
                     st.balloons()
@@ -479,106 +2405,518 @@ def show_quiz(course_id, lesson_number):
                 st.warning("⚠️ Por favor, responda todas as questões!")
     st.markdown('</div>', unsafe_allow_html=True)
 
-def get_lesson_likes(course_id, lesson_number):
-    try:
-        conn = get_db_connection()
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("""
-                SELECT COUNT(*) as total_likes
-                FROM lesson_likes
-                WHERE course_id = %s AND lesson_number = %s
-            """, (course_id, lesson_number))
-            total_likes = cur.fetchone()['total_likes']
-            
-            cur.execute("""
-                SELECT EXISTS(
-                    SELECT 1 FROM lesson_likes
-                    WHERE course_id = %s 
-                    AND lesson_number = %s 
-                    AND email = %s
-                ) as has_liked
-            """, (course_id, lesson_number, st.session_state.user_email))
-            has_liked = cur.fetchone()['has_liked']
-            
-            return total_likes, has_liked
-    except Exception as e:
-        st.error(f"Erro ao buscar likes: {str(e)}")
-        return 0, False
+@st.cache_resource
+def ensure_schema():
+    with get_db_connection() as conn:
+        applied = migrate(conn, max_online_rows=int(st.secrets.get("ONLINE_MIGRATION_MAX_ROWS", 10000)))
+        maintain_partitions(conn, {
+            'login_logs': int(st.secrets.get("LOGIN_LOGS_RETENTION_MONTHS", 12)),
+            'video_views': int(st.secrets.get("VIDEO_VIEWS_RETENTION_MONTHS", 24))
+        })
+    return applied
 
 def toggle_like(course_id, lesson_number, email):
     try:
-        conn = get_db_connection()
-        with conn.cursor() as cur:
+        with get_db_connection() as conn, conn.cursor() as cur:
             cur.execute("""
-                SELECT EXISTS(
-                    SELECT 1 FROM lesson_likes
-                    WHERE course_id = %s 
-                    AND lesson_number = %s 
-                    AND email = %s
-                )
-            """, (course_id, lesson_number, email))
-            exists = cur.fetchone()[0]
-            
-            if exists:
-                cur.execute("""
+                WITH removed AS (
                     DELETE FROM lesson_likes
-                    WHERE course_id = %s 
-                    AND lesson_number = %s 
-                    AND email = %s
-                """, (course_id, lesson_number, email))
-            else:
-                cur.execute("""
+                    WHERE course_id = %(course_id)s
+                    AND lesson_number = %(lesson_number)s
+                    AND email = %(email)s
+                    RETURNING 1
+                ), added AS (
                     INSERT INTO lesson_likes (course_id, lesson_number, email)
-                    VALUES (%s, %s, %s)
-                """, (course_id, lesson_number, email))
+                    SELECT %(course_id)s, %(lesson_number)s, %(email)s
+                    WHERE NOT EXISTS (SELECT 1 FROM removed)
+                    ON CONFLICT (course_id, lesson_number, email) DO NOTHING
+                    RETURNING 1
+                ), counter AS (
+                    INSERT INTO lesson_like_counts AS c (course_id, lesson_number, total_likes)
+                    VALUES (
+                        %(course_id)s, %(lesson_number)s,
+                        (SELECT COUNT(*) FROM added) - (SELECT COUNT(*) FROM removed)
+                    )
+                    ON CONFLICT (course_id, lesson_number) DO UPDATE
+                    SET total_likes = c.total_likes + EXCLUDED.total_likes
+                    RETURNING total_likes
+                )
+                SELECT NOT EXISTS (SELECT 1 FROM removed) AS liked,
+                       (SELECT total_likes FROM counter) AS total_likes
+            """, {'course_id': course_id, 'lesson_number': lesson_number, 'email': email})
+            liked, total_likes = cur.fetchone()
             conn.commit()
-            return not exists
+            return liked, total_likes
     except Exception as e:
         st.error(f"Erro ao processar like: {str(e)}")
-        return False
+        return None
+
+def get_feedback_page_size():
+    return int(st.secrets.get("FEEDBACK_PAGE_SIZE", 20))
 
-def get_course_feedback(course_id):
+def get_course_feedback(course_ids, cursor=None, limit=20):
+    if isinstance(course_ids, str):
+        course_ids = [course_ids]
+    params = {'course_ids': list(course_ids), 'limit': limit + 1}
+    after = ""
+    if cursor is not None:
+        after = "AND (created_at, id) < (%(created_at)s, %(id)s)"
+        params['created_at'], params['id'] = cursor
     try:
-        conn = get_db_connection()
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("""
-                SELECT f.*, u.email as user_email,
-                       TO_CHAR(f.created_at, 'DD/MM/YYYY HH24:MI') as formatted_date
-                FROM lesson_feedback f
-                JOIN users u ON f.email = u.email
-                WHERE f.course_id = %s AND f.lesson_number = 0
-                ORDER BY f.created_at DESC
-            """, (course_id,))
-            return cur.fetchall()
+        with get_db_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(f"""
+                SELECT id, course_id, email, feedback_text, created_at
+                FROM lesson_feedback
+                WHERE course_id = ANY(%(course_ids)s) AND lesson_number = 0
+                {after}
+                ORDER BY created_at DESC, id DESC
+                LIMIT %(limit)s
+            """, params)
+            rows = cur.fetchall()
     except Exception as e:
         st.error(f"Erro ao buscar feedbacks: {str(e)}")
+        return [], None
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = (rows[-1]['created_at'], rows[-1]['id'])
+    return rows, next_cursor
+
+def reset_feedback_feeds():
+    for key in [key for key in st.session_state if str(key).startswith('feedback_feed_')]:
+        del st.session_state[key]
+
+SEARCH_STOPWORDS = frozenset(
+    "a o e é de da do das dos em na no nas nos um uma uns umas para por com sem que se ao aos as os "
+    "ou mais muito como mas".split()
+)
+
+def search_terms(text):
+    terms = []
+    for term in re.findall(r'\w+', normalize_answer(text)):
+        if len(term) < 2 or term in SEARCH_STOPWORDS:
+            continue
+        if len(term) > 3 and term.endswith('s'):
+            term = term[:-1]
+        terms.append(term)
+    return terms
+
+class InvertedIndex:
+    def __init__(self):
+        self._postings = {}
+        self._documents = {}
+        self._lock = threading.Lock()
+
+    def add(self, doc_id, fields, document=None):
+        weights = {}
+        for text, weight in fields:
+            for term in search_terms(text):
+                weights[term] = weights.get(term, 0.0) + weight
+        with self._lock:
+            self._remove(doc_id)
+            self._documents[doc_id] = (document, weights)
+            for term, weight in weights.items():
+                self._postings.setdefault(term, {})[doc_id] = weight
+
+    def _remove(self, doc_id):
+        previous = self._documents.pop(doc_id, None)
+        if previous:
+            for term in previous[1]:
+                postings = self._postings.get(term)
+                if postings is not None:
+                    postings.pop(doc_id, None)
+                    if not postings:
+                        del self._postings[term]
+
+    def remove(self, doc_id):
+        with self._lock:
+            self._remove(doc_id)
+
+    def __len__(self):
+        return len(self._documents)
+
+    def search(self, query, limit=20, offset=0):
+        terms = list(dict.fromkeys(search_terms(query)))
+        if not terms:
+            return []
+        with self._lock:
+            postings = [self._postings.get(term, {}) for term in terms]
+            if not all(postings):
+                return []
+            postings.sort(key=len)
+            total = len(self._documents)
+            scores = {doc_id: 0.0 for doc_id in postings[0]}
+            for posting in postings[1:]:
+                scores = {doc_id: score for doc_id, score in scores.items() if doc_id in posting}
+            for posting in postings:
+                idf = 1.0 + (total / len(posting))
+                for doc_id in scores:
+                    scores[doc_id] += posting[doc_id] * idf
+            ranked = sorted(scores.items(), key=lambda item: (-item[1], str(item[0])))
+            return [
+                dict(self._documents[doc_id][0] or {}, rank=score)
+                for doc_id, score in ranked[offset:offset + limit]
+            ]
+
+def get_search_fallback_index():
+    def load():
+        index = InvertedIndex()
+        for course in get_courses():
+            index.add(
+                ('course', course['id']),
+                [(course['name'], 1.0), (course['topics'] or '', 0.4)],
+                {'kind': 'course', 'course_id': course['id'], 'course_name': course['name'],
+                 'lesson_number': None, 'snippet': course['topics'], 'email': None, 'created_at': None}
+            )
+        return index
+    return get_catalog_cache().get(('courses', 'search_index'), load)
+
+SEARCH_BRANCHES = {
+    'course': """
+        SELECT 'course' AS kind, c.id AS course_id, NULL::int AS lesson_number, NULL::int AS item_id,
+               ts_rank(c.search_vector, q.query, 32) * 2 AS rank
+        FROM courses c, q
+        WHERE c.search_vector @@ q.query {scope}
+    """,
+    'lesson': """
+        SELECT 'lesson' AS kind, z.course_id, z.lesson_number, NULL::int AS item_id,
+               MAX(ts_rank(z.search_vector, q.query, 32)) * 1.5 AS rank
+        FROM quiz z, q
+        WHERE z.search_vector @@ q.query {scope}
+        GROUP BY z.course_id, z.lesson_number
+    """,
+    'feedback': """
+        SELECT 'feedback' AS kind, f.course_id, NULL::int AS lesson_number, f.id AS item_id,
+               ts_rank(f.search_vector, q.query, 32) AS rank
+        FROM lesson_feedback f, q
+        WHERE f.search_vector @@ q.query AND f.lesson_number = 0 {scope}
+    """,
+}
+
+SEARCH_SCOPE_COLUMNS = {'course': 'c.id', 'lesson': 'z.course_id', 'feedback': 'f.course_id'}
+
+def search(query, kinds=('course', 'lesson', 'feedback'), course_ids=None, limit=20, offset=0):
+    if not query or not query.strip():
         return []
+    branches = []
+    for kind in kinds:
+        scope = f"AND {SEARCH_SCOPE_COLUMNS[kind]} = ANY(%(course_ids)s)" if course_ids is not None else ""
+        branches.append(SEARCH_BRANCHES[kind].format(scope=scope))
+    params = {
+        'query': query,
+        'course_ids': list(course_ids or []),
+        'limit': limit,
+        'offset': offset,
+    }
+    try:
+        with get_db_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(f"""
+                WITH q AS (
+                    SELECT websearch_to_tsquery('portuguese', %(query)s) AS query
+                ),
+                hits AS (
+                    {' UNION ALL '.join(branches)}
+                ),
+                page AS (
+                    SELECT * FROM hits
+                    ORDER BY rank DESC, kind, course_id, lesson_number, item_id
+                    LIMIT %(limit)s OFFSET %(offset)s
+                )
+                SELECT p.kind, p.course_id, c.name AS course_name, p.lesson_number, p.rank,
+                       CASE p.kind
+                           WHEN 'feedback' THEN ts_headline('portuguese', f.feedback_text, q.query,
+                                                            'MaxWords=30, MinWords=10')
+                           WHEN 'course' THEN c.topics
+                       END AS snippet,
+                       f.email, f.created_at
+                FROM page p
+                CROSS JOIN q
+                JOIN courses c ON c.id = p.course_id
+                LEFT JOIN lesson_feedback f ON p.kind = 'feedback' AND f.id = p.item_id
+                ORDER BY p.rank DESC, p.kind, p.course_id, p.lesson_number, p.item_id
+            """, params)
+            return cur.fetchall()
+    except psycopg2.Error:
+        logger.exception("Busca textual indisponível; usando índice em memória")
+        results = get_search_fallback_index().search(query, limit=len(get_courses()) or limit)
+        if course_ids is not None:
+            results = [r for r in results if r['course_id'] in course_ids]
+        return [r for r in results if r['kind'] in kinds][offset:offset + limit]
+
+def search_course_ids(query, course_ids=None):
+    results = search(query, kinds=('course', 'lesson'), course_ids=course_ids, limit=200)
+    return list(dict.fromkeys(result['course_id'] for result in results))
 
 def add_course_feedback(course_id, email, feedback_text):
     try:
-        conn = get_db_connection()
-        with conn.cursor() as cur:
+        with get_db_connection() as conn, conn.cursor() as cur:
             cur.execute("""
                 INSERT INTO lesson_feedback (course_id, lesson_number, email, feedback_text)
                 VALUES (%s, 0, %s, %s)
             """, (course_id, email, feedback_text))
             conn.commit()
+            reset_feedback_feeds()
             return True
     except Exception as e:
         st.error(f"Erro ao adicionar feedback: {str(e)}")
         return False
 
+def get_metrics_freshness():
+    try:
+        with get_db_connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT MIN(processed_until) FROM metrics_watermarks")
+            return cur.fetchone()[0]
+    except Exception:
+        return None
+
+def get_session_metrics(hours):
+    try:
+        with get_db_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                SELECT bucket, peak_sessions, peak_users, last_sessions, last_users,
+                       ROUND(total_sessions::numeric / NULLIF(samples, 0), 1)::float AS avg_sessions
+                FROM metrics_sessions_hourly
+                WHERE bucket >= date_trunc('hour', NOW()) - make_interval(hours => %s)
+                ORDER BY bucket
+            """, (hours,))
+            return cur.fetchall()
+    except Exception as e:
+        st.error(f"Erro ao buscar métricas de sessões: {str(e)}")
+        return []
+
+def get_login_metrics(hours):
+    try:
+        with get_db_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                SELECT bucket, successes, failures
+                FROM metrics_login_hourly
+                WHERE bucket >= date_trunc('hour', NOW()) - make_interval(hours => %s)
+                ORDER BY bucket
+            """, (hours,))
+            return cur.fetchall()
+    except Exception as e:
+        st.error(f"Erro ao buscar métricas de login: {str(e)}")
+        return []
+
+def get_lesson_view_metrics(course_id, hours):
+    try:
+        with get_db_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                SELECT lesson_number, SUM(views)::bigint AS views
+                FROM metrics_video_views_hourly
+                WHERE course_id = %s
+                AND bucket >= date_trunc('hour', NOW()) - make_interval(hours => %s)
+                GROUP BY lesson_number
+                ORDER BY lesson_number
+            """, (course_id, hours))
+            return cur.fetchall()
+    except Exception as e:
+        st.error(f"Erro ao buscar visualizações: {str(e)}")
+        return []
+
+def get_course_dropoff(course_id, hours):
+    try:
+        with get_db_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("""
+                SELECT lesson_number, viewers,
+                       ROUND(100.0 * viewers / NULLIF(FIRST_VALUE(viewers) OVER (ORDER BY lesson_number), 0), 1)::float
+                           AS reach_pct
+                FROM metrics_lesson_reach
+                WHERE course_id = %s
+                ORDER BY lesson_number
+            """, (course_id,))
+            reach = cur.fetchall()
+            cur.execute("""
+                SELECT bucket, lesson_number, viewers
+                FROM metrics_lesson_reach_daily
+                WHERE course_id = %s
+                AND bucket >= date_trunc('day', NOW()) - make_interval(hours => %s)
+                ORDER BY bucket, lesson_number
+            """, (course_id, hours))
+            return reach, cur.fetchall()
+    except Exception as e:
+        st.error(f"Erro ao buscar evasão do curso: {str(e)}")
+        return [], []
+
+def show_monitoring():
+    periods = {"Últimas 24 horas": 24, "Últimos 7 dias": 24 * 7, "Últimos 30 dias": 24 * 30}
+    hours = periods[st.selectbox("Período", options=list(periods.keys()), key="monitoring_period")]
+    freshness = get_metrics_freshness()
+    if freshness:
+        st.caption(f"Logins e visualizações agregados até {freshness.strftime('%d/%m/%Y %H:%M')}")
+    
+    st.subheader("👥 Sessões Simultâneas")
+    sessions = get_session_metrics(hours)
+    if sessions:
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Sessões agora", sessions[-1]['last_sessions'])
+        with col2:
+            st.metric("Pico no período", max(row['peak_sessions'] for row in sessions))
+        with col3:
+            st.metric("Alunos no pico", max(row['peak_users'] for row in sessions))
+        st.line_chart(
+            [{'Hora': row['bucket'], 'Pico': row['peak_sessions'], 'Média': row['avg_sessions']} for row in sessions],
+            x='Hora', y=['Pico', 'Média']
+        )
+    else:
+        st.info("ℹ️ Ainda não há amostras de sessões no período.")
+    
+    st.subheader("🔐 Logins")
+    logins = get_login_metrics(hours)
+    if logins:
+        successes = sum(row['successes'] for row in logins)
+        failures = sum(row['failures'] for row in logins)
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Sucesso", successes)
+        with col2:
+            st.metric("Falha", failures)
+        with col3:
+            st.metric("Taxa de sucesso", f"{100.0 * successes / max(successes + failures, 1):.1f}%")
+        st.bar_chart(
+            [{'Hora': row['bucket'], 'Sucesso': row['successes'], 'Falha': row['failures']} for row in logins],
+            x='Hora', y=['Sucesso', 'Falha']
+        )
+    else:
+        st.info("ℹ️ Nenhum login registrado no período.")
+    
+    st.subheader("🎬 Visualizações e Evasão por Curso")
+    courses = get_courses()
+    if not courses:
+        st.info("ℹ️ Nenhum curso cadastrado.")
+        return
+    course_options = {course['name']: course['id'] for course in courses}
+    course_id = course_options[st.selectbox("Curso", options=list(course_options.keys()), key="monitoring_course")]
+    
+    views = get_lesson_view_metrics(course_id, hours)
+    if views:
+        st.bar_chart(
+            [{'Aula': row['lesson_number'], 'Visualizações': row['views']} for row in views],
+            x='Aula', y='Visualizações'
+        )
+    else:
+        st.info("ℹ️ Nenhuma visualização no período.")
+    
+    reach, daily = get_course_dropoff(course_id, hours)
+    if reach:
+        st.dataframe(
+            [{
+                'Aula': row['lesson_number'],
+                'Alunos que assistiram': row['viewers'],
+                'Em relação à 1ª aula (%)': row['reach_pct'],
+            } for row in reach],
+            hide_index=True,
+            use_container_width=True
+        )
+    if daily:
+        by_day = {}
+        for row in daily:
+            by_day.setdefault(row['bucket'], {'Dia': row['bucket']})[f"Aula {row['lesson_number']}"] = row['viewers']
+        lessons = [f"Aula {n}" for n in sorted({row['lesson_number'] for row in daily})]
+        st.caption("Novos alunos por aula e por dia")
+        st.line_chart(
+            [{lesson: day.get(lesson, 0) for lesson in lessons} | {'Dia': day['Dia']} for day in by_day.values()],
+            x='Dia', y=lessons
+        )
+
+def show_query_diagnostics():
+    profiler = get_query_profiler()
+    
+    st.subheader("🔁 Última Execução da Página")
+    last = st.session_state.get('rerun_profile')
+    if last:
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Consultas", last['statements'])
+        with col2:
+            st.metric("Tempo no banco", f"{last['db_ms']:.1f} ms")
+        with col3:
+            st.metric("Tempo total", f"{last['elapsed_ms']:.1f} ms")
+        st.dataframe(
+            [{
+                'Consulta': entry['query'],
+                'Função': entry['function'],
+                'Página': entry['page'],
+                'Tempo (ms)': round(entry['ms'], 2),
+                'Linhas': entry['rows'],
+            } for entry in last['entries']],
+            hide_index=True,
+            use_container_width=True
+        )
+    else:
+        st.info("ℹ️ Nenhuma execução anterior registrada nesta sessão.")
+    
+    reruns = profiler.recent_reruns()
+    if reruns:
+        st.caption("Execuções mais lentas recentes (todas as sessões)")
+        st.dataframe(
+            [{
+                'Quando': rerun['at'].strftime('%d/%m/%Y %H:%M:%S'),
+                'Página': rerun['label'],
+                'Consultas': rerun['statements'],
+                'Banco (ms)': round(rerun['db_ms'], 1),
+                'Total (ms)': round(rerun['elapsed_ms'], 1),
+            } for rerun in sorted(reruns, key=lambda rerun: rerun['elapsed_ms'], reverse=True)[:20]],
+            hide_index=True,
+            use_container_width=True
+        )
+    
+    st.subheader(f"📊 Consultas nos Últimos {profiler.window / 60:.0f} Minutos")
+    stats = profiler.window_stats()
+    if stats:
+        st.dataframe(
+            [{
+                'Consulta': row['query'],
+                'Função': row['function'],
+                'Página': row['page'],
+                'Execuções': row['count'],
+                'Total (ms)': round(row['total_ms'], 1),
+                'Média (ms)': round(row['avg_ms'], 2),
+                'p95 (ms)': round(row['p95_ms'], 2),
+                'Máx (ms)': round(row['max_ms'], 2),
+                'Linhas (média)': round(row['avg_rows'], 1),
+                'SQL': row['sql'][:200],
+            } for row in stats],
+            hide_index=True,
+            use_container_width=True
+        )
+    else:
+        st.info("ℹ️ Nenhuma consulta registrada na janela.")
+    
+    st.subheader(f"🐢 Consultas Lentas (≥ {profiler.slow_threshold * 1000:.0f} ms)")
+    slow = profiler.slow_queries()
+    if not slow:
+        st.info("ℹ️ Nenhuma consulta lenta registrada.")
+    for position, entry in enumerate(slow):
+        with st.expander(f"{entry['at'].strftime('%H:%M:%S')} · {entry['ms']:.0f} ms · {entry['page']} / {entry['function']}"):
+            st.code(entry['sql'].strip(), language="sql")
+            if entry['explainable']:
+                if st.button("🔍 EXPLAIN ANALYZE", key=f"explain_{position}_{entry['query']}"):
+                    try:
+                        st.code(explain_analyze(entry['sql'], entry['params']))
+                    except Exception as e:
+                        st.error(f"Erro ao analisar consulta: {str(e)}")
+            else:
+                st.caption("Comandos de escrita não são reexecutados com EXPLAIN ANALYZE.")
+    
+    st.subheader("📤 Métricas (Prometheus)")
+    metrics = profiler.metrics_text()
+    st.download_button("⬇️ Baixar métricas", data=metrics, file_name="plt_metrics.prom", mime="text/plain")
+    with st.expander("Ver métricas"):
+        st.code(metrics)
+
 def show_admin_dashboard():
     st.title("🎓 Painel do Administrador")
     
     if st.sidebar.button("🚪 Sair do Sistema"):
-        manage_session(st.session_state.user_email, 'delete')
+        manage_session(st.session_state.user_email, 'delete', st.session_state.get('session_id'))
         st.session_state.clear()
         st.rerun()
     
     menu = st.sidebar.radio(
         "Menu Principal",
-        ["Cursos", "Adicionar Aula", "Gerenciar Quiz", "Gerenciar Acesso", "Ver Avaliações", "Monitoramento"]
+        ["Cursos", "Adicionar Aula", "Gerenciar Quiz", "Gerenciar Acesso", "Ver Avaliações", "Monitoramento", "Diagnóstico"]
     )
     
     if menu == "Cursos":
@@ -592,8 +2930,7 @@ def show_admin_dashboard():
             if st.button("💾 Salvar Curso"):
                 if course_id and course_name:
                     try:
-                        conn = get_db_connection()
-                        with conn.cursor() as cur:
+                        with get_db_connection() as conn, conn.cursor() as cur:
                             cur.execute("""
                                 INSERT INTO courses (id, name, topics)
                                 VALUES (%s, %s, %s)
@@ -601,8 +2938,11 @@ def show_admin_dashboard():
                                 SET name = %s, topics = %s
                             """, (course_id, course_name, course_topics, course_name, course_topics))
                             conn.commit()
-                            st.success("✅ Curso salvo com sucesso!")
-                            st.rerun()
+                        invalidate_course(course_id)
+                        st.success("✅ Curso salvo com sucesso!")
+                        st.rerun()
+                    except (RerunException, StopException):
+                        raise
                     except Exception as e:
                         st.error(f"Erro ao salvar curso: {str(e)}")
                 else:
@@ -610,27 +2950,39 @@ def show_admin_dashboard():
         
         st.markdown('<div class="course-container">', unsafe_allow_html=True)
         try:
-            conn = get_db_connection()
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("SELECT * FROM courses ORDER BY name")
-                courses = cur.fetchall()
-                
-                if courses:
-                    for course in courses:
-                        st.subheader(f"{course['name']} ({course['id']})")
-                        st.write(f"**Tópicos:** {course['topics']}")
-                        
-                        if st.button("🗑️ Deletar", key=f"del_course_{course['id']}"):
-                            try:
+            courses = get_courses()
+            query = st.text_input("🔍 Buscar cursos", key="admin_course_search")
+            if query.strip():
+                matches = search_course_ids(query)
+                courses = sorted(
+                    [c for c in courses if c['id'] in matches],
+                    key=lambda c: matches.index(c['id'])
+                )
+            
+            if courses:
+                for course in courses:
+                    st.subheader(f"{course['name']} ({course['id']})")
+                    st.write(f"**Tópicos:** {course['topics']}")
+                    
+                    if st.button("🗑️ Deletar", key=f"del_course_{course['id']}"):
+                        try:
+                            with get_db_connection() as conn, conn.cursor() as cur:
                                 cur.execute("DELETE FROM courses WHERE id = %s", (course['id'],))
                                 conn.commit()
-                                st.success("✅ Curso deletado com sucesso!")
-                                st.rerun()
-                            except Exception as e:
-                                st.error(f"Erro ao deletar curso: {str(e)}")
-                        st.markdown("---")
-                else:
-                    st.info("ℹ️ Nenhum curso cadastrado.")
+                            invalidate_course(course['id'])
+                            st.success("✅ Curso deletado com sucesso!")
+                            st.rerun()
+                        except (RerunException, StopException):
+                            raise
+                        except Exception as e:
+                            st.error(f"Erro ao deletar curso: {str(e)}")
+                    st.markdown("---")
+            elif query.strip():
+                st.info("ℹ️ Nenhum curso encontrado para essa busca.")
+            else:
+                st.info("ℹ️ Nenhum curso cadastrado.")
+        except (RerunException, StopException):
+            raise
         except Exception as e:
             st.error(f"Erro ao carregar cursos: {str(e)}")
         st.markdown('</div>', unsafe_allow_html=True)
@@ -640,44 +2992,33 @@ def show_admin_dashboard():
         st.markdown('<div class="course-container">', unsafe_allow_html=True)
         
         try:
-            conn = get_db_connection()
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("SELECT id, name FROM courses ORDER BY name")
-                courses = cur.fetchall()
+            courses = get_courses()
+            
+            if courses:
+                course_options = {course['name']: course['id'] for course in courses}
+                selected_course = st.selectbox(
+                    "Selecione o Curso",
+                    options=list(course_options.keys())
+                )
                 
-                if courses:
-                    course_options = {course['name']: course['id'] for course in courses}
-                    selected_course = st.selectbox(
-                        "Selecione o Curso",
-                        options=list(course_options.keys())
-                    )
-                    
-                    lesson_number = st.number_input("Número da Aula", min_value=1, value=1)
-                    video_url = st.text_input("🎥 Link do YouTube")
-                    pdf_url = st.text_input("📄 Link do PDF (Google Drive)")
-                    
-                    if st.button("💾 Salvar Aula"):
-                        if video_url or pdf_url:
-                            course_id = course_options[selected_course]
-                            try:
-                                cur.execute("""
-                                    INSERT INTO lessons (course_id, lesson_number, video_url, pdf_url)
-                                    VALUES (%s, %s, %s, %s)
-                                    ON CONFLICT (course_id, lesson_number) 
-                                    DO UPDATE SET video_url = %s, pdf_url = %s
-                                """, (course_id, lesson_number, video_url, pdf_url, video_url, pdf_url))
-                                conn.commit()
-                                st.success("✅ Aula salva com sucesso!")
-                                
-                                st.subheader("Adicionar Quiz")
-                                manage_quiz(course_id, lesson_number)
-                                
-                            except Exception as e:
-                                st.error(f"Erro ao salvar aula: {str(e)}")
-                        else:
-                            st.warning("⚠️ Adicione pelo menos um vídeo ou PDF")
-                else:
-                    st.warning("⚠️ Cadastre um curso primeiro")
+                lesson_number = st.number_input("Número da Aula", min_value=1, value=1)
+                video_url = st.text_input("🎥 Link do YouTube")
+                pdf_url = st.text_input("📄 Link do PDF (Google Drive)")
+                
+                if st.button("💾 Salvar Aula"):
+                    if video_url or pdf_url:
+                        course_id = course_options[selected_course]
+                        if save_lesson(course_id, lesson_number, video_url, pdf_url):
+                            st.success("✅ Aula salva com sucesso!")
+                            
+                            st.subheader("Adicionar Quiz")
+                            manage_quiz(course_id, lesson_number)
+                    else:
+                        st.warning("⚠️ Adicione pelo menos um vídeo ou PDF")
+            else:
+                st.warning("⚠️ Cadastre um curso primeiro")
+        except (RerunException, StopException):
+            raise
         except Exception as e:
             st.error(f"Erro ao carregar cursos: {str(e)}")
         st.markdown('</div>', unsafe_allow_html=True)
@@ -687,34 +3028,100 @@ def show_admin_dashboard():
         st.markdown('<div class="quiz-container">', unsafe_allow_html=True)
         
         try:
-            conn = get_db_connection()
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("""
-                    SELECT c.id, c.name, l.lesson_number
-                    FROM courses c
-                    JOIN lessons l ON c.id = l.course_id
-                    ORDER BY c.name, l.lesson_number
-                """)
-                lessons = cur.fetchall()
+            lessons = get_lesson_index()
+            
+            if lessons:
+                course_options = {
+                    f"{lesson['name']} - Aula {lesson['lesson_number']}": 
+                    (lesson['id'], lesson['lesson_number']) 
+                    for lesson in lessons
+                }
+                selected_lesson = st.selectbox(
+                    "Selecione a Aula",
+                    options=list(course_options.keys())
+                )
                 
-                if lessons:
-                    course_options = {
-                        f"{lesson['name']} - Aula {lesson['lesson_number']}": 
-                        (lesson['id'], lesson['lesson_number']) 
-                        for lesson in lessons
-                    }
-                    selected_lesson = st.selectbox(
-                        "Selecione a Aula",
-                        options=list(course_options.keys())
+                course_id, lesson_number = course_options[selected_lesson]
+                manage_quiz(course_id, lesson_number)
+                
+                with st.expander("📥 Importar quizzes (CSV/JSON)"):
+                    st.write(
+                        "Colunas: `course_id`, `lesson_number`, `question_number` (opcional), "
+                        "`question`, `answer`. Cada aula do arquivo tem o quiz inteiro substituído."
                     )
-                    
-                    course_id, lesson_number = course_options[selected_lesson]
-                    manage_quiz(course_id, lesson_number)
-                else:
-                    st.warning("⚠️ Adicione aulas primeiro")
+                    uploaded = st.file_uploader("Arquivo", type=['csv', 'json'], key="quiz_import_file")
+                    if uploaded is not None and st.button("📥 Importar", key="quiz_import_button"):
+                        try:
+                            started = time.perf_counter()
+                            result = import_quizzes(uploaded.name, uploaded.getvalue())
+                            st.success(
+                                f"✅ Importação concluída em {time.perf_counter() - started:.2f}s: "
+                                f"{result['inserted']} novas, {result['updated']} alteradas, "
+                                f"{result['unchanged']} sem mudança, {result['deleted']} removidas."
+                            )
+                        except Exception as e:
+                            st.error(f"Erro ao importar quizzes: {str(e)}")
+                
+                stats = get_question_stats(course_id, lesson_number)
+                if stats:
+                    st.subheader("📊 Dificuldade das Questões")
+                    st.dataframe(
+                        [{
+                            'Questão': row['question_number'],
+                            'Tentativas': row['attempts'],
+                            'Acertos': row['correct'],
+                            'Acerto (%)': row['correct_pct'],
+                        } for row in stats],
+                        hide_index=True,
+                        use_container_width=True
+                    )
+                
+                st.markdown("---")
+                if st.button("🗑️ Remover Aula", key=f"del_lesson_{course_id}_{lesson_number}"):
+                    if delete_lesson(course_id, lesson_number):
+                        st.success("✅ Aula removida com sucesso!")
+                        st.rerun()
+            else:
+                st.warning("⚠️ Adicione aulas primeiro")
+        except (RerunException, StopException):
+            raise
         except Exception as e:
             st.error(f"Erro ao carregar aulas: {str(e)}")
         st.markdown('</div>', unsafe_allow_html=True)
+    
+    elif menu == "Gerenciar Acesso":
+        manage_course_access()
+    
+    elif menu == "Monitoramento":
+        st.header("📈 Monitoramento")
+        show_monitoring()
+    
+    elif menu == "Diagnóstico":
+        st.header("🩺 Diagnóstico de Consultas")
+        show_query_diagnostics()
+    
+    elif menu == "Ver Avaliações":
+        st.header("💬 Avaliações dos Cursos")
+        try:
+            courses = get_courses()
+            if courses:
+                course_options = {"Todos os cursos": None}
+                course_options.update({course['name']: course['id'] for course in courses})
+                selected_course = st.selectbox("Curso", options=list(course_options.keys()))
+                course_id = course_options[selected_course]
+                query = st.text_input("🔍 Buscar nas avaliações", key="admin_feedback_search")
+                if query.strip():
+                    show_feedback_search(query, None if course_id is None else [course_id])
+                elif course_id is None:
+                    show_feedback_feed("admin", [course['id'] for course in courses], show_course=True)
+                else:
+                    show_course_feedbacks(course_id)
+            else:
+                st.info("ℹ️ Nenhum curso cadastrado.")
+        except (RerunException, StopException):
+            raise
+        except Exception as e:
+            st.error(f"Erro ao carregar avaliações: {str(e)}")
 
 def show_course_feedback_form(course_id):
     st.markdown('<div class="feedback-container">', unsafe_allow_html=True)
@@ -733,23 +3140,183 @@ def show_course_feedback_form(course_id):
             st.warning("⚠️ Por favor, escreva sua avaliação antes de enviar.")
     st.markdown('</div>', unsafe_allow_html=True)
 
+def show_feedback_feed(feed_key, course_ids, show_course=False):
+    state_key = f"feedback_feed_{feed_key}"
+    page_size = get_feedback_page_size()
+    course_ids = list(course_ids)
+    feed = st.session_state.get(state_key)
+    if feed is None or feed['course_ids'] != course_ids:
+        rows, cursor = get_course_feedback(course_ids, limit=page_size)
+        feed = {'course_ids': course_ids, 'rows': rows, 'cursor': cursor}
+        st.session_state[state_key] = feed
+    
+    if not feed['rows']:
+        st.info("ℹ️ Nenhuma avaliação disponível ainda.")
+        return
+    
+    course_names = {course['id']: course['name'] for course in get_courses()} if show_course else {}
+    items = []
+    for feedback in feed['rows']:
+        title = f"<strong>{html.escape(course_names.get(feedback['course_id'], feedback['course_id']))}</strong><br>" if show_course else ""
+        items.append(f"""
+        <div class="feedback-text">
+            {title}<em>{html.escape(feedback['email'])}</em> • {feedback['created_at'].strftime('%d/%m/%Y %H:%M')}<br>
+            {html.escape(feedback['feedback_text'])}
+        </div>
+        """)
+    st.markdown(''.join(items), unsafe_allow_html=True)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if feed['cursor'] is not None and st.button("⬇️ Carregar mais", key=f"{state_key}_more"):
+            rows, cursor = get_course_feedback(course_ids, feed['cursor'], page_size)
+            feed['rows'].extend(rows)
+            feed['cursor'] = cursor
+            st.rerun()
+    with col2:
+        if st.button("🔄 Atualizar", key=f"{state_key}_refresh"):
+            del st.session_state[state_key]
+            st.rerun()
+
+def show_feedback_search(query, course_ids=None):
+    page_size = get_feedback_page_size()
+    state_key = "feedback_search_page"
+    if st.session_state.get(f"{state_key}_query") != (query, course_ids):
+        st.session_state[f"{state_key}_query"] = (query, course_ids)
+        st.session_state[state_key] = 0
+    page = st.session_state[state_key]
+    
+    results = search(query, kinds=('feedback',), course_ids=course_ids, limit=page_size + 1, offset=page * page_size)
+    has_next = len(results) > page_size
+    results = results[:page_size]
+    if not results:
+        st.info("ℹ️ Nenhuma avaliação encontrada.")
+        return
+    
+    items = []
+    for result in results:
+        snippet = html.escape(result['snippet'] or '').replace('&lt;b&gt;', '<b>').replace('&lt;/b&gt;', '</b>')
+        items.append(f"""
+        <div class="feedback-text">
+            <strong>{html.escape(result['course_name'])}</strong><br>
+            <em>{html.escape(result['email'])}</em> • {result['created_at'].strftime('%d/%m/%Y %H:%M')}<br>
+            {snippet}
+        </div>
+        """)
+    st.markdown(''.join(items), unsafe_allow_html=True)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if page > 0 and st.button("⬅️ Anteriores", key=f"{state_key}_prev"):
+            st.session_state[state_key] = page - 1
+            st.rerun()
+    with col2:
+        if has_next and st.button("➡️ Próximos", key=f"{state_key}_next"):
+            st.session_state[state_key] = page + 1
+            st.rerun()
+
 def show_course_feedbacks(course_id):
     st.markdown('<div class="feedback-container">', unsafe_allow_html=True)
-    feedbacks = get_course_feedback(course_id)
-    if feedbacks:
-        for feedback in feedbacks:
-            st.markdown(f"""
-            <div class="feedback-text">
-                <strong>{feedback['user_email']}</strong>
-                <br>
-                {feedback['formatted_date']}
-                <p>{feedback['feedback_text']}</p>
-            </div>
-            """, unsafe_allow_html=True)
+    show_feedback_feed(f"course_{course_id}", [course_id])
+    st.markdown('</div>', unsafe_allow_html=True)
+
+def toggle_lesson_like(course_id, lesson):
+    result = toggle_like(course_id, lesson['lesson_number'], st.session_state.user_email)
+    if result:
+        lesson['user_liked'], lesson['total_likes'] = result
+
+@st.fragment
+def show_lesson(course_id, lesson):
+    lesson_number = lesson['lesson_number']
+    is_available = lesson['is_available']
+    
+    st.markdown('<div class="lesson-container">', unsafe_allow_html=True)
+    col1, col2, col3 = st.columns([3, 1, 1])
+    with col1:
+        st.markdown(f'<p class="lesson-title">📖 Aula {lesson_number}</p>', unsafe_allow_html=True)
+    with col2:
+        if lesson['is_completed']:
+            st.success("✅ Concluída")
+        elif not is_available:
+            st.warning("🔒 Bloqueada")
+        else:
+            st.info("📝 Em andamento")
+    with col3:
+        st.button(
+            f"{'❤️' if lesson['user_liked'] else '🤍'} {lesson['total_likes']}",
+            key=f"like_{course_id}_{lesson_number}",
+            on_click=toggle_lesson_like,
+            args=(course_id, lesson)
+        )
+    
+    if is_available:
+        if lesson['video_id']:
+            st.markdown('<div class="video-container">', unsafe_allow_html=True)
+            st.video(f"https://youtu.be/{lesson['video_id']}")
+            if lesson['video_title'] or lesson['video_duration']:
+                st.caption(" · ".join(filter(None, [
+                    lesson['video_title'],
+                    f"{lesson['video_duration'] // 60}:{lesson['video_duration'] % 60:02d}" if lesson['video_duration'] else None,
+                ])))
+            log_video_view(st.session_state.user_email, course_id, lesson_number)
+            st.markdown('</div>', unsafe_allow_html=True)
+        
+        if lesson['pdf_url']:
+            st.markdown(f"[📄 Material Complementar]({lesson['pdf_url']})")
+        
+        if not lesson['is_completed']:
+            show_quiz(course_id, lesson_number)
     else:
-        st.info("ℹ️ Nenhuma avaliação disponível ainda.")
+        st.info("ℹ️ Complete a aula anterior para desbloquear esta aula.")
     st.markdown('</div>', unsafe_allow_html=True)
 
+def lesson_status(lesson):
+    if lesson['is_completed']:
+        return "✅"
+    if not lesson['is_available']:
+        return "🔒"
+    return "📝"
+
+def step_lesson(key, numbers, step):
+    position = numbers.index(st.session_state[key]) + step
+    st.session_state[key] = numbers[max(0, min(position, len(numbers) - 1))]
+
+def show_lesson_navigator(course_id, lessons):
+    key = f"lesson_nav_{course_id}"
+    numbers = [lesson['lesson_number'] for lesson in lessons]
+    by_number = {lesson['lesson_number']: lesson for lesson in lessons}
+    if st.session_state.get(key) not in by_number:
+        st.session_state[key] = next(
+            (lesson['lesson_number'] for lesson in lessons if lesson['is_available'] and not lesson['is_completed']),
+            numbers[-1] if all(lesson['is_completed'] for lesson in lessons) else numbers[0]
+        )
+    
+    completed = sum(1 for lesson in lessons if lesson['is_completed'])
+    st.progress(completed / len(lessons), text=f"{completed}/{len(lessons)} aulas concluídas")
+    position = numbers.index(st.session_state[key])
+    col1, col2, col3 = st.columns([1, 4, 1])
+    with col1:
+        st.button("⬅️ Anterior", key=f"{key}_prev", disabled=position == 0,
+                  on_click=step_lesson, args=(key, numbers, -1), use_container_width=True)
+    with col2:
+        st.selectbox(
+            "Aula",
+            options=numbers,
+            key=key,
+            format_func=lambda n: f"{lesson_status(by_number[n])} Aula {n}",
+            label_visibility="collapsed"
+        )
+    with col3:
+        st.button("Próxima ➡️", key=f"{key}_next", disabled=position == len(numbers) - 1,
+                  on_click=step_lesson, args=(key, numbers, 1), use_container_width=True)
+    
+    show_lesson(course_id, by_number[st.session_state[key]])
+    
+    if position + 1 < len(numbers):
+        following = by_number[numbers[position + 1]]
+        if following['quiz_count'] and not following['is_completed']:
+            get_quiz(course_id, following['lesson_number'])
+
 def show_student_dashboard():
     st.title("👨‍🎓 Área do Estudante")
     
@@ -758,124 +3325,82 @@ def show_student_dashboard():
         ["Meus Cursos", "Meu Progresso", "Avaliações", "Sair"]
     )
     
-    manage_session(st.session_state.user_email, 'update')
+    manage_session(st.session_state.user_email, 'update', st.session_state.session_id)
     
     if menu == "Meus Cursos":
         st.header("📚 Meus Cursos")
         try:
-            conn = get_db_connection()
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("""
-                    SELECT * FROM courses 
-                    WHERE id = ANY(%s)
-                    ORDER BY name
-                """, (st.session_state.permissions,))
-                courses = cur.fetchall()
+            entitlements = get_entitlements()
+            courses = [c for c in get_courses() if c['id'] in entitlements]
+            query = st.text_input("🔍 Buscar nos meus cursos", key="student_course_search")
+            if query.strip() and courses:
+                matches = search_course_ids(query, sorted(entitlements))
+                courses = sorted(
+                    [c for c in courses if c['id'] in matches],
+                    key=lambda c: matches.index(c['id'])
+                )
+                if not courses:
+                    st.info("ℹ️ Nenhum curso encontrado para essa busca.")
+            
+            if courses:
+                course_names = [course['name'] for course in courses]
+                selected_course = st.selectbox("Selecione um curso", course_names)
+                course = next(c for c in courses if c['name'] == selected_course)
                 
-                if courses:
-                    course_names = [course['name'] for course in courses]
-                    selected_course = st.selectbox("Selecione um curso", course_names)
-                    course = next(c for c in courses if c['name'] == selected_course)
-                    
-                    st.markdown('<div class="course-container">', unsafe_allow_html=True)
-                    st.write(f"**Tópicos:** {course['topics']}")
-                    
-                    progress = get_student_progress(st.session_state.user_email, course['id'])
-                    current_lesson = progress['current_lesson'] if progress else 1
-                    completed_lessons = progress['completed_lessons'] if progress else []
-                    
-                    cur.execute("""
-                        SELECT l.*, 
-                               (SELECT COUNT(*) FROM quiz q 
-                                WHERE q.course_id = l.course_id 
-                                AND q.lesson_number = l.lesson_number) as quiz_count
-                        FROM lessons l
-                        WHERE l.course_id = %s 
-                        ORDER BY l.lesson_number
-                    """, (course['id'],))
-                    lessons = cur.fetchall()
+                st.markdown('<div class="course-container">', unsafe_allow_html=True)
+                st.write(f"**Tópicos:** {course['topics']}")
+                
+                page = load_course_page(st.session_state.user_email, course['id'], entitlements)
+                lessons = page['lessons']
+                
+                if lessons:
+                    if all(lesson['is_completed'] for lesson in lessons):
+                        st.markdown("---")
+                        st.subheader("📝 Avaliação do Curso")
+                        show_course_feedback_form(course['id'])
                     
-                    if lessons:
-                        total_lessons = len(lessons)
-                        
-                        if completed_lessons and len(completed_lessons) == total_lessons:
-                            st.markdown("---")
-                            st.subheader("📝 Avaliação do Curso")
-                            show_course_feedback_form(course['id'])
-                        
-                        for lesson in lessons:
-                            lesson_number = lesson['lesson_number']
-                            is_available = verify_video_access(st.session_state.user_email, course['id'], lesson_number)
-                            
-                            st.markdown('<div class="lesson-container">', unsafe_allow_html=True)
-                            col1, col2, col3 = st.columns([3, 1, 1])
-                            with col1:
-                                st.markdown(f'<p class="lesson-title">📖 Aula {lesson_number}</p>', unsafe_allow_html=True)
-                            with col2:
-                                if lesson_number in completed_lessons:
-                                    st.success("✅ Concluída")
-                                elif not is_available:
-                                    st.warning("🔒 Bloqueada")
-                                else:
-                                    st.info("📝 Em andamento")
-                            with col3:
-                                total_likes, user_liked = get_lesson_likes(course['id'], lesson_number)
-                                if st.button(
-                                    f"{'❤️' if user_liked else '🤍'} {total_likes}",
-                                    key=f"like_{course['id']}_{lesson_number}"
-                                ):
-                                    toggle_like(course['id'], lesson_number, st.session_state.user_email)
-                                    st.rerun()
-                            
-                            if is_available:
-                                if lesson['video_url']:
-                                    video_id = extract_youtube_id(lesson['video_url'])
-                                    if video_id:
-                                        st.markdown('<div class="video-container">', unsafe_allow_html=True)
-                                        st.video(f"https://youtu.be/{video_id}")
-                                        log_video_view(st.session_state.user_email, course['id'], lesson_number)
-                                        st.markdown('</div>', unsafe_allow_html=True)
-                                
-                                if lesson['pdf_url']:
-                                    st.markdown(f"[📄 Material Complementar]({lesson['pdf_url']})")
-                                
-                                if lesson_number not in completed_lessons:
-                                    show_quiz(course['id'], lesson_number)
-                            else:
-                                st.info("ℹ️ Complete a aula anterior para desbloquear esta aula.")
-                            st.markdown('</div>', unsafe_allow_html=True)
-                    else:
-                        st.info("ℹ️ Ainda não há aulas disponíveis neste curso.")
-                    st.markdown('</div>', unsafe_allow_html=True)
+                    show_lesson_navigator(course['id'], lessons)
                 else:
-                    st.warning("⚠️ Você ainda não tem acesso a nenhum curso")
-        
+                    st.info("ℹ️ Ainda não há aulas disponíveis neste curso.")
+                st.markdown('</div>', unsafe_allow_html=True)
+            else:
+                st.warning("⚠️ Você ainda não tem acesso a nenhum curso")
+    
+        except (RerunException, StopException):
+            raise
         except Exception as e:
             st.error(f"Erro ao carregar cursos: {str(e)}")
 
     elif menu == "Meu Progresso":
         st.header("📊 Meu Progresso")
         try:
-            conn = get_db_connection()
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            with get_db_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
                 cur.execute("""
-                    SELECT c.name, sp.current_lesson, sp.completed_lessons,
-                           (SELECT COUNT(*) FROM lessons l WHERE l.course_id = c.id) as total_lessons
-                    FROM courses c
-                    JOIN student_progress sp ON c.id = sp.course_id
+                    SELECT c.name,
+                           LEAST(sp.completed_count, cs.total_lessons) AS completed,
+                           COALESCE(cs.total_lessons, 0) AS total_lessons,
+                           COALESCE(100.0 * LEAST(sp.completed_count, cs.total_lessons)
+                                    / NULLIF(cs.total_lessons, 0), 0)::float AS percent,
+                           sp.last_activity
+                    FROM student_progress sp
+                    JOIN courses c ON c.id = sp.course_id
+                    LEFT JOIN course_stats cs ON cs.course_id = sp.course_id
                     WHERE sp.email = %s
+                    ORDER BY c.name
                 """, (st.session_state.user_email,))
                 progress = cur.fetchall()
                 
                 if progress:
                     for course in progress:
                         st.subheader(course['name'])
-                        completed = len(course['completed_lessons']) if course['completed_lessons'] else 0
                         total = course['total_lessons']
+                        completed = course['completed']
                         
                         if total > 0:
-                            progress_pct = (completed / total) * 100
+                            progress_pct = course['percent']
                             st.progress(progress_pct / 100)
+                            if course['last_activity']:
+                                st.caption(f"Última atividade: {course['last_activity'].strftime('%d/%m/%Y %H:%M')}")
                             
                             col1, col2, col3 = st.columns(3)
                             with col1:
@@ -895,37 +3420,14 @@ def show_student_dashboard():
     elif menu == "Avaliações":
         st.header("💬 Avaliações dos Cursos")
         try:
-            conn = get_db_connection()
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("""
-                    SELECT c.name as course_name,
-                           f.*, u.email as student_email,
-                           TO_CHAR(f.created_at, 'DD/MM/YYYY HH24:MI') as formatted_date
-                    FROM lesson_feedback f
-                    JOIN courses c ON f.course_id = c.id
-                    JOIN users u ON f.email = u.email
-                    WHERE f.lesson_number = 0
-                        AND c.id = ANY(%s)
-                    ORDER BY f.created_at DESC
-                """, (st.session_state.permissions,))
-                feedbacks = cur.fetchall()
-                
-                if feedbacks:
-                    for feedback in feedbacks:
-                        st.markdown(f"""
-                        <div class="feedback-text">
-                            <strong>{feedback['course_name']}</strong><br>
-                            <em>{feedback['student_email']}</em> • {feedback['formatted_date']}<br>
-                            {feedback['feedback_text']}
-                        </div>
-                        """, unsafe_allow_html=True)
-                else:
-                    st.info("ℹ️ Nenhuma avaliação disponível ainda.")
+            show_feedback_feed("student", sorted(get_entitlements()), show_course=True)
+        except (RerunException, StopException):
+            raise
         except Exception as e:
             st.error(f"Erro ao carregar avaliações: {str(e)}")
     
     elif menu == "Sair":
-        manage_session(st.session_state.user_email, 'delete')
+        manage_session(st.session_state.user_email, 'delete', st.session_state.get('session_id'))
         st.session_state.logged_in = False
         st.rerun()
 
@@ -934,8 +3436,23 @@ def main():
         st.session_state.logged_in = False
     if 'user_email' not in st.session_state:
         st.session_state.user_email = None
-    if 'permissions' not in st.session_state:
-        st.session_state.permissions = None
+    if 'entitlements' not in st.session_state:
+        st.session_state.entitlements = None
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = None
+
+    try:
+        ensure_schema()
+        get_metrics_refresher()
+        get_session_tracker()
+        get_catalog_sync()
+    except OfflineMigrationsPending as e:
+        logger.error("App parado até aplicar migrações: %s", e)
+        st.markdown('<h1 class="big-font">🎓 Justificações Acadêmicas - Cursos Online</h1>', unsafe_allow_html=True)
+        st.warning("🛠️ Sistema em manutenção. Estamos atualizando o banco de dados; tente novamente em alguns minutos.")
+        st.stop()
+    except Exception as e:
+        st.error(f"Erro ao preparar o banco de dados: {str(e)}")
 
     if not st.session_state.logged_in:
         st.markdown('<h1 class="big-font">🎓 Justificações Acadêmicas - Cursos Online</h1>', unsafe_allow_html=True)
@@ -969,11 +3486,12 @@ def main():
 
         if st.button("🔐 Entrar"):
             if email and senha:
-                success, permissions = verify_login(email, senha)
+                success, entitlements, session_id = verify_login(email, senha, get_client_ip())
                 if success:
                     st.session_state.logged_in = True
                     st.session_state.user_email = email
-                    st.session_state.permissions = permissions
+                    st.session_state.entitlements = entitlements
+                    st.session_state.session_id = session_id
                     st.success("✅ Login realizado com sucesso!")
                     st.rerun()
                 else:
@@ -982,22 +3500,30 @@ def main():
                 st.warning("⚠️ Por favor, preencha todos os campos")
     else:
         try:
-            if 'admin' in st.session_state.permissions:
+            if 'admin' in get_entitlements():
                 show_admin_dashboard()
             else:
                 show_student_dashboard()
+        except (RerunException, StopException):
+            raise
         except Exception as e:
             st.error("Erro no sistema. Por favor, faça login novamente.")
-            manage_session(st.session_state.user_email, 'delete')
+            manage_session(st.session_state.user_email, 'delete', st.session_state.get('session_id'))
             st.session_state.clear()
             st.rerun()
 
 if __name__ == "__main__":
+    profiler = get_query_profiler()
+    profiler.begin_rerun()
     try:
         main()
+    except (RerunException, StopException):
+        raise
     except Exception as e:
         st.error(f"Erro crítico no sistema: {str(e)}")
         if 'user_email' in st.session_state:
-            manage_session(st.session_state.user_email, 'delete')
+            manage_session(st.session_state.user_email, 'delete', st.session_state.get('session_id'))
         st.session_state.clear()
-        st.rerun()
\ No newline at end of file
+        st.rerun()
+    finally:
+        st.session_state.rerun_profile = profiler.end_rerun()
@@ -0,0 +1,1836 @@
+import argparse
+import csv
+import io
+import json
+import random
+import re
+import statistics
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+import psycopg2
+import psycopg2.extensions
+from psycopg2.extras import RealDictCursor, execute_values
+
+import PLT
+import metrics
+import migrations
+import videos
+
+
+class Row(dict):
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return list(self.values())[key]
+        return super().__getitem__(key)
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.statements = 0
+            self.connections = 0
+            self.commits = 0
+            self.fingerprints = Counter()
+
+    def statement(self, query):
+        if isinstance(query, bytes):
+            query = query.decode('utf-8', 'replace')
+        fingerprint = ' '.join(query.split())[:80]
+        self.local.statements = self.thread_statements() + 1
+        with self.lock:
+            self.statements += 1
+            self.fingerprints[fingerprint] += 1
+
+    def thread_statements(self):
+        return getattr(self.local, 'statements', 0)
+
+    def connection(self):
+        with self.lock:
+            self.connections += 1
+
+    def commit(self):
+        with self.lock:
+            self.commits += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'statements': self.statements,
+                'connections': self.connections,
+                'commits': self.commits,
+            }
+
+
+STATS = Stats()
+
+
+class StandInCursor:
+    def __init__(self, connection, dict_rows):
+        self.connection = connection
+        self.dict_rows = dict_rows
+        self.rows = []
+        self.rowcount = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        pass
+
+    def mogrify(self, template, args):
+        if isinstance(template, bytes):
+            template = template.decode()
+        return (template % tuple(repr(a) for a in args)).encode()
+
+    def execute(self, query, params=None):
+        STATS.statement(query)
+        if self.connection.latency:
+            time.sleep(self.connection.latency)
+        if isinstance(query, bytes):
+            query = query.decode('utf-8', 'replace')
+        rows = self.connection.fixture.respond(query, params)
+        self.rows = [Row(r) if self.dict_rows else tuple(r.values()) for r in rows]
+        self.rowcount = len(self.rows)
+
+    def executemany(self, query, params_list):
+        for params in params_list:
+            self.execute(query, params)
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+
+class StandInConnection:
+    encoding = 'UTF8'
+
+    def __init__(self, fixture, latency):
+        self.fixture = fixture
+        self.latency = latency
+        self.closed = 0
+        STATS.connection()
+
+    def cursor(self, cursor_factory=None):
+        return StandInCursor(self, cursor_factory is not None)
+
+    def get_transaction_status(self):
+        return psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def commit(self):
+        STATS.commit()
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+_counting_cursors = {}
+
+
+def counting_cursor(base):
+    if base not in _counting_cursors:
+        def execute(self, query, vars=None):
+            STATS.statement(query)
+            return base.execute(self, query, vars)
+        _counting_cursors[base] = type(f'Counting{base.__name__}', (base,), {'execute': execute})
+    return _counting_cursors[base]
+
+
+class CountingConnection(psycopg2.extensions.connection):
+    def cursor(self, *args, **kwargs):
+        base = kwargs.pop('cursor_factory', None) or psycopg2.extensions.cursor
+        return super().cursor(*args, cursor_factory=counting_cursor(base), **kwargs)
+
+    def commit(self):
+        STATS.commit()
+        return super().commit()
+
+
+class Fixture:
+    def __init__(self, course_id='bench101', lessons=30, questions=5, likes=3, email='estudante1@email.com'):
+        self.course_id = course_id
+        self.lessons = lessons
+        self.questions = questions
+        self.likes = likes
+        self.email = email
+        self.current_lesson = max(1, lessons // 2)
+        self.password_hash = PLT.hash_password('senha', 'pbkdf2_sha256', 1000)
+        self.routes = [
+            (r'AS has_access', lambda params: [{'has_access': True, 'current_lesson': self.current_lesson}]),
+            (r'AS liked_lessons', self.user_progress),
+            (r'SELECT permissions\s+FROM users', self.permissions),
+            (r'FROM student_progress', self.progress),
+            (r'SELECT password, permissions', self.login),
+            (r'WITH accepted AS', lambda params: [{'session_id': 1}]),
+            (r'WITH removed AS', lambda params: [{'liked': True, 'total_likes': self.likes + 1}]),
+            (r'as has_liked', lambda params: [{'total_likes': self.likes, 'has_liked': False}]),
+            (r'quiz_count\s+FROM lessons', self.lesson_rows),
+            (r'DELETE FROM quiz', lambda params: []),
+            (r'catalog_version', lambda params: [{'version': 1}]),
+            (r'FROM quiz', self.quiz),
+        ]
+        self.routes = [(re.compile(pattern, re.I | re.S), handler) for pattern, handler in self.routes]
+
+    def respond(self, query, params):
+        for pattern, handler in self.routes:
+            if pattern.search(query):
+                return handler(params)
+        return []
+
+    def quiz_rows(self):
+        return [
+            {'question_number': n, 'question': f'Pergunta {n}', 'answer': f'resposta {n}'}
+            for n in range(1, self.questions + 1)
+        ]
+
+    def completed(self):
+        return list(range(1, self.current_lesson))
+
+    def user_progress(self, params):
+        return [{
+            'permissions': [self.course_id],
+            'current_lesson': self.current_lesson,
+            'completed_lessons': self.completed(),
+            'like_counts': {str(n): self.likes for n in range(1, self.lessons + 1)},
+            'liked_lessons': [],
+        }]
+
+    def login(self, params):
+        return [{
+            'password': self.password_hash,
+            'permissions': [self.course_id],
+            'permissions_version': 0,
+        }]
+
+    def permissions(self, params):
+        return [{'permissions': [self.course_id]}]
+
+    def progress(self, params):
+        return [{
+            'current_lesson': self.current_lesson,
+            'completed_count': len(self.completed()),
+            'completed_lessons': self.completed(),
+        }]
+
+    def quiz(self, params):
+        return self.quiz_rows()
+
+    def lesson_row(self, n):
+        return {
+            'course_id': self.course_id,
+            'lesson_number': n,
+            'video_url': f'https://youtu.be/abcdefghi{n:02d}',
+            'pdf_url': None,
+        }
+
+    def lesson_rows(self, params):
+        return [
+            dict(self.lesson_row(n), video_id=f'abcdefghi{n:02d}', video_title=None, video_duration=None,
+                 quiz_count=self.questions)
+            for n in range(1, self.lessons + 1)
+        ]
+
+
+def install_singletons(pool):
+    writer = PLT.WriteBehindWriter(pool.connection, PLT.WRITE_BEHIND_STATEMENTS)
+    catalog = PLT.CatalogCache()
+    hasher = PLT.BoundedExecutor(max_workers=2, max_pending=1000, timeout=60)
+    limiter = PLT.LoginRateLimiter(pool.connection).start()
+    tracker = PLT.SessionTracker(pool.connection)
+    registry = PLT.AccessRegistry(pool.connection)
+    sync = PLT.CatalogSync(pool.connection, catalog)
+    PLT.get_pool = lambda: pool
+    PLT.get_session_tracker = lambda: tracker
+    PLT.get_access_registry = lambda: registry
+    PLT.get_login_rate_limiter = lambda: limiter
+    PLT.get_event_writer = lambda: writer
+    PLT.get_catalog_cache = lambda: catalog
+    PLT.get_catalog_sync = lambda: sync
+    PLT.get_hash_executor = lambda: hasher
+    PLT.get_password_hash_config = lambda: {'scheme': 'scrypt', 'cost': PLT.PASSWORD_HASH_DEFAULT_COST['scrypt']}
+    PLT.get_video_metadata_provider = lambda: ('static', videos.static_video_metadata)
+    return pool
+
+
+def set_password_policy(scheme, cost, workers):
+    hasher = PLT.BoundedExecutor(max_workers=workers, max_pending=1000, timeout=60)
+    PLT.get_hash_executor = lambda: hasher
+    PLT.get_password_hash_config = lambda: {'scheme': scheme, 'cost': cost}
+
+
+def install_standin(fixture, latency=0.0, maxconn=10):
+    pool = PLT.ConnectionPool(
+        lambda: StandInConnection(fixture, latency),
+        minconn=1, maxconn=maxconn, timeout=30,
+    )
+    return install_singletons(pool)
+
+
+def install_postgres(dsn, maxconn=10):
+    def connect():
+        STATS.connection()
+        return psycopg2.connect(dsn, connection_factory=CountingConnection)
+
+    pool = PLT.ConnectionPool(connect, minconn=1, maxconn=maxconn, timeout=30)
+    return install_singletons(pool)
+
+
+def install(args, fixture, maxconn=10):
+    if args.dsn:
+        return install_postgres(args.dsn, maxconn=maxconn)
+    return install_standin(fixture, latency=args.latency / 1000, maxconn=maxconn)
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    if not ordered:
+        return {'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'mean': 0.0}
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+    return {
+        'p50': pick(0.50),
+        'p95': pick(0.95),
+        'p99': pick(0.99),
+        'mean': statistics.fmean(ordered),
+    }
+
+
+def checkouts(pool):
+    stats = pool.stats()
+    return stats['hits'] + stats['misses']
+
+
+def measure(fn, repeat, pool):
+    STATS.reset()
+    before = checkouts(pool)
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    result = STATS.snapshot()
+    result['checkouts'] = checkouts(pool) - before
+    for key in ('statements', 'connections', 'commits', 'checkouts'):
+        result[f'{key}_per_run'] = result[key] / repeat
+    result.update({k: v * 1000 for k, v in percentiles(samples).items()})
+    return result
+
+
+LEGACY_LESSONS_SQL = """
+    SELECT l.*,
+           (SELECT COUNT(*) FROM quiz q
+            WHERE q.course_id = l.course_id
+            AND q.lesson_number = l.lesson_number) as quiz_count
+    FROM lessons l
+    WHERE l.course_id = %s
+    ORDER BY l.lesson_number
+"""
+
+LEGACY_HEARTBEAT_SQL = """
+    UPDATE active_sessions
+    SET last_activity = NOW()
+    WHERE email = %s
+"""
+
+
+LEGACY_VIDEO_ACCESS_SQL = """
+    SELECT %s = ANY(u.permissions) AS has_access, sp.current_lesson
+    FROM users u
+    LEFT JOIN student_progress sp
+        ON sp.email = u.email AND sp.course_id = %s
+    WHERE u.email = %s
+"""
+
+
+def execute_query(query, params=None, fetch=False):
+    with PLT.get_db_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(query, params)
+        result = cur.fetchall() if fetch else None
+        conn.commit()
+        return result
+
+
+def get_lesson_likes(course_id, lesson_number, email):
+    with PLT.get_db_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("""
+            SELECT COALESCE((
+                       SELECT total_likes FROM lesson_like_counts
+                       WHERE course_id = %s AND lesson_number = %s
+                   ), 0) as total_likes,
+                   EXISTS(
+                       SELECT 1 FROM lesson_likes
+                       WHERE course_id = %s
+                       AND lesson_number = %s
+                       AND email = %s
+                   ) as has_liked
+        """, (course_id, lesson_number, course_id, lesson_number, email))
+        row = cur.fetchone()
+        return row['total_likes'], row['has_liked']
+
+
+def get_student_progress(email, course_id):
+    with PLT.get_db_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("""
+            SELECT sp.current_lesson, sp.completed_count,
+                   ARRAY(
+                       SELECT lesson_number FROM lesson_completions c
+                       WHERE c.email = sp.email AND c.course_id = sp.course_id
+                       ORDER BY lesson_number
+                   ) AS completed_lessons
+            FROM student_progress sp
+            WHERE sp.email = %s AND sp.course_id = %s
+        """, (email, course_id))
+        return cur.fetchone()
+
+
+def legacy_video_access(email, course_id, lesson_number):
+    user = (execute_query(LEGACY_VIDEO_ACCESS_SQL, (course_id, course_id, email), fetch=True) or [None])[0]
+    if not user or not user['has_access']:
+        return False
+    if user['current_lesson'] is None:
+        return lesson_number == 1
+    return lesson_number <= user['current_lesson']
+
+
+def legacy_course_page(email, course_id):
+    execute_query(LEGACY_HEARTBEAT_SQL, (email,))
+    progress = get_student_progress(email, course_id)
+    completed_lessons = progress['completed_lessons'] if progress else []
+    lessons = execute_query(LEGACY_LESSONS_SQL, (course_id,), fetch=True) or []
+    for lesson in lessons:
+        lesson_number = lesson['lesson_number']
+        is_available = legacy_video_access(email, course_id, lesson_number)
+        get_lesson_likes(course_id, lesson_number, email)
+        if is_available:
+            if lesson['video_url'] and PLT.extract_youtube_id(lesson['video_url']):
+                PLT.log_video_view(email, course_id, lesson_number)
+            if lesson_number not in completed_lessons:
+                PLT.get_quiz(course_id, lesson_number)
+
+
+def batched_course_page(email, course_id):
+    PLT.manage_session(email, 'update', 1)
+    page = PLT.load_course_page(email, course_id, frozenset([course_id]))
+    lesson = page['lessons'][page['current_lesson'] - 1]
+    if lesson['video_id']:
+        PLT.log_video_view(email, course_id, lesson['lesson_number'])
+    PLT.get_quiz(course_id, lesson['lesson_number'])
+    if lesson['lesson_number'] < len(page['lessons']):
+        PLT.get_quiz(course_id, lesson['lesson_number'] + 1)
+
+
+def bench_course_page(args):
+    fixture = Fixture(course_id=args.course, lessons=args.lessons, email=args.email)
+    pool = install(args, fixture)
+    return {
+        'lessons': args.lessons,
+        'legacy': measure(lambda: legacy_course_page(args.email, args.course), args.repeat, pool),
+        'batched': measure(lambda: batched_course_page(args.email, args.course), args.repeat, pool),
+    }
+
+
+def bench_lesson_render(args):
+    fixture = Fixture(course_id=args.course, lessons=args.lessons, questions=args.questions)
+    pool = install(args, fixture)
+    email = fixture.email
+    entitlements = frozenset([args.course])
+    if args.dsn:
+        email = 'bench-render@email.com'
+        student = [(email, 'senha')]
+        seed_load_course(args.course, args.lessons, args.questions)
+        seed_storm_students(student, args.course, fixture.password_hash)
+        clear_load_students(student, args.course)
+        PLT.update_student_progress(email, args.course, args.lessons - 1)
+    PLT.st.session_state.user_email = email
+    lesson_number = max(1, args.lessons // 2)
+
+    def full_rerun():
+        PLT.toggle_like(args.course, lesson_number, email)
+        page = PLT.load_course_page(email, args.course, entitlements)
+        for lesson in page['lessons']:
+            if lesson['is_available']:
+                PLT.extract_youtube_id(lesson['video_url'])
+        return page
+
+    page = PLT.load_course_page(email, args.course, entitlements)
+    lesson = page['lessons'][lesson_number - 1]
+    report = {
+        'lessons': args.lessons,
+        'full_rerun': measure(full_rerun, args.repeat, pool),
+        'fragment_rerun': measure(lambda: PLT.toggle_lesson_like(args.course, lesson), args.repeat, pool),
+        'failures': [],
+    }
+    if args.dsn:
+        if (lesson['total_likes'], lesson['user_liked']) != get_lesson_likes(args.course, lesson_number, email):
+            report['failures'].append("curtida mantida no fragmento diverge do banco")
+        clear_load_students(student, args.course)
+    return report
+
+
+def bench_like_toggles(args):
+    if not args.dsn:
+        raise SystemExit("like-toggles precisa de --dsn: a consistência é verificada no Postgres")
+    install(args, None, maxconn=args.threads)
+    emails = [f'bench{n}@email.com' for n in range(args.users)]
+
+    def cleanup(cur):
+        cur.execute("DELETE FROM lesson_likes WHERE email = ANY(%s)", (emails,))
+        migrations.rebuild_like_counts(cur)
+
+    with PLT.get_db_connection() as conn, conn.cursor() as cur:
+        PLT.migrate(conn)
+        cleanup(cur)
+        conn.commit()
+    samples = []
+    lock = threading.Lock()
+
+    def worker(seed):
+        for n in range(args.toggles):
+            email = emails[(seed * 7 + n) % len(emails)]
+            started = time.perf_counter()
+            PLT.toggle_like(args.course, args.lesson, email)
+            with lock:
+                samples.append(time.perf_counter() - started)
+
+    STATS.reset()
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with PLT.get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT (SELECT COUNT(*) FROM lesson_likes
+                    WHERE course_id = %s AND lesson_number = %s),
+                   (SELECT total_likes FROM lesson_like_counts
+                    WHERE course_id = %s AND lesson_number = %s)
+        """, (args.course, args.lesson, args.course, args.lesson))
+        actual, counter = cur.fetchone()
+        cleanup(cur)
+        conn.commit()
+
+    report = {
+        'toggles': len(samples),
+        'throughput_per_s': len(samples) / elapsed,
+        'statements_per_toggle': STATS.snapshot()['statements'] / max(1, len(samples)),
+        'likes_rows': actual,
+        'counter': counter,
+        'consistent': actual == counter,
+        'failures': [] if actual == counter else [f"contador {counter} difere de COUNT(*) {actual}"],
+    }
+    report.update({k: v * 1000 for k, v in percentiles(samples).items()})
+    return report
+
+
+def storm_students(count):
+    return [(f'storm{n}@email.com', 'senha') for n in range(count)]
+
+
+def seed_storm_students(students, course_id, password_hash):
+    with PLT.get_db_connection() as conn, conn.cursor() as cur:
+        cur.executemany("""
+            INSERT INTO users (email, password, permissions)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (email) DO UPDATE SET password = EXCLUDED.password
+        """, [(email, password_hash, [course_id]) for email, _ in students])
+        conn.commit()
+
+
+def clear_storm_sessions(students):
+    with PLT.get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM active_sessions WHERE email = ANY(%s)", ([email for email, _ in students],))
+        cur.execute("DELETE FROM login_logs WHERE email = ANY(%s)", ([email for email, _ in students],))
+        conn.commit()
+
+
+def run_concurrently(jobs, threads):
+    samples = []
+    failures = []
+    lock = threading.Lock()
+    pending = list(jobs)
+
+    def worker():
+        while True:
+            with lock:
+                if not pending:
+                    return
+                job = pending.pop()
+            started = time.perf_counter()
+            ok = job()
+            elapsed = time.perf_counter() - started
+            with lock:
+                samples.append(elapsed)
+                if not ok:
+                    failures.append(elapsed)
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return samples, len(failures), time.perf_counter() - started
+
+
+def bench_login_storm(args):
+    fixture = Fixture(course_id=args.course)
+    pool = install(args, fixture, maxconn=args.pool_size)
+    cost = args.hash_cost or PLT.PASSWORD_HASH_DEFAULT_COST[args.hash_scheme]
+    set_password_policy(args.hash_scheme, cost, args.hash_workers)
+    fixture.password_hash = PLT.hash_password('senha', args.hash_scheme, cost)
+    students = storm_students(args.students)
+    if args.dsn:
+        seed_storm_students(students, args.course, fixture.password_hash)
+        clear_storm_sessions(students)
+
+    def login(email, password):
+        return lambda: PLT.verify_login(email, password)[0]
+
+    STATS.reset()
+    before = checkouts(pool)
+    samples, failures, elapsed = run_concurrently(
+        [login(email, password) for email, password in students], args.threads
+    )
+    report = {
+        'logins': len(samples),
+        'failed': failures,
+        'threads': args.threads,
+        'pool_size': args.pool_size,
+        'hash': f'{args.hash_scheme}:{cost} x{args.hash_workers}',
+        'throughput_per_s': len(samples) / elapsed,
+        'statements_per_login': STATS.snapshot()['statements'] / max(1, len(samples)),
+        'checkouts_per_login': (checkouts(pool) - before) / max(1, len(samples)),
+        'pool': pool.stats(),
+    }
+    report.update({k: v * 1000 for k, v in percentiles(samples).items()})
+    if args.dsn:
+        clear_storm_sessions(students)
+    return report
+
+
+def bench_hashing(args):
+    costs = args.costs or [PLT.PASSWORD_HASH_DEFAULT_COST[args.scheme]]
+    report = {}
+    for cost in costs:
+        stored = PLT.hash_password('senha', args.scheme, cost)
+        single = []
+        for _ in range(args.count):
+            started = time.perf_counter()
+            PLT.verify_password('senha', stored)
+            single.append(time.perf_counter() - started)
+
+        executor = PLT.BoundedExecutor(max_workers=args.workers, max_pending=args.count, timeout=600)
+        jobs = [lambda: executor.run(PLT.verify_password, 'senha', stored) for _ in range(args.count * args.workers)]
+        samples, _, elapsed = run_concurrently(jobs, args.workers * 4)
+        executor.shutdown()
+
+        report[f'{args.scheme}:{cost}'] = {
+            'ms_per_hash': statistics.fmean(single) * 1000,
+            'hashes_per_s_1_thread': 1 / statistics.fmean(single),
+            f'logins_per_s_{args.workers}_workers': len(samples) / elapsed,
+            'login_p99_ms': percentiles(samples)['p99'] * 1000,
+        }
+    return report
+
+
+GRADING_ANSWERS = ['função', 'São Paulo', 'ação e reação', 'Python|py', '3,14 ~ 0,01', '42', '10 | dez']
+GRADING_RESPONSES = ['funcao', 'FUNÇÃO', 'sao paulo', '  acao   e\treacao ', 'PY', 'pyton', '3.14159', '3,16',
+                     '42.0', ' 42 ', 'Dez', '10,0', 'coracao!', '', 'não sei']
+
+
+def grading_key(questions):
+    return PLT.AnswerKey([
+        {'question_number': n, 'question': f'Pergunta {n}', 'answer': answer}
+        for n, answer in enumerate(questions, 1)
+    ])
+
+
+def legacy_grade(questions, responses):
+    return [response.strip().lower() == q['answer'].lower() for q, response in zip(questions, responses)]
+
+
+def grade_batch(key, submissions):
+    columns = []
+    for index, (_, texts, numbers, _) in enumerate(key.questions):
+        seen = {}
+        column = []
+        for responses in submissions:
+            response = responses[index] if index < len(responses) else ''
+            if response not in seen:
+                seen[response] = key._matches(texts, numbers, PLT.normalize_answer(response))
+            column.append(seen[response])
+        columns.append(column)
+    return [list(row) for row in zip(*columns)] if columns else [[] for _ in submissions]
+
+
+def bench_grading(args):
+    rng = random.Random(args.seed)
+    answers = [GRADING_ANSWERS[n % len(GRADING_ANSWERS)] for n in range(args.questions)]
+    submissions = [
+        [rng.choice(GRADING_RESPONSES) for _ in range(args.questions)]
+        for _ in range(args.submissions)
+    ]
+    key = grading_key(answers)
+    questions = [{'answer': answer} for answer in answers]
+
+    started = time.perf_counter()
+    for responses in submissions:
+        legacy_grade(questions, responses)
+    legacy = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for responses in submissions:
+        key.grade(responses)
+    single_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    grade_batch(key, submissions)
+    batch_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        grading_key(answers)
+    compile_elapsed = (time.perf_counter() - started) / args.repeat
+
+    return {
+        'submissions': args.submissions,
+        'questions': args.questions,
+        'compile_key_us': compile_elapsed * 1e6,
+        'us_per_submission': {
+            'legacy_lower_eq': legacy / args.submissions * 1e6,
+            'answer_key_grade': single_elapsed / args.submissions * 1e6,
+            'answer_key_batch': batch_elapsed / args.submissions * 1e6,
+        },
+    }
+
+
+def question_stats_total(course_id, lesson_number):
+    with PLT.get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT COALESCE(SUM(attempts), 0), COALESCE(SUM(correct), 0)
+            FROM quiz_question_stats
+            WHERE course_id = %s AND lesson_number = %s
+        """, (course_id, lesson_number))
+        return cur.fetchone()
+
+
+def bench_quiz_classroom(args):
+    fixture = Fixture(course_id=args.course, questions=args.questions)
+    pool = install(args, fixture)
+    writer = PLT.WriteBehindWriter(pool.connection, PLT.WRITE_BEHIND_STATEMENTS,
+                                   batch_size=args.batch_size, flush_interval=args.flush_interval)
+    PLT.get_event_writer = lambda: writer
+    if args.dsn:
+        with PLT.get_db_connection() as conn:
+            PLT.migrate(conn)
+        before = question_stats_total(args.course, args.lesson)
+
+    questions = fixture.quiz_rows()
+    key = PLT.AnswerKey(questions)
+    rng = random.Random(args.seed)
+    submissions = [
+        [q['answer'] if rng.random() < 0.7 else 'não sei' for q in questions]
+        for _ in range(args.students)
+    ]
+    expected_correct = sum(sum(row) for row in grade_batch(key, submissions))
+
+    def submit(n, responses):
+        def job():
+            results = key.grade(responses)
+            PLT.record_quiz_attempt(f'aluno{n}@email.com', args.course, args.lesson, key, results)
+            return True
+        return job
+
+    STATS.reset()
+    samples, failures, elapsed = run_concurrently(
+        [submit(n, responses) for n, responses in enumerate(submissions)], args.threads
+    )
+    started = time.perf_counter()
+    writer.close()
+    drain = time.perf_counter() - started
+    stats = writer.stats()
+
+    report = {
+        'students': args.students,
+        'questions': args.questions,
+        'threads': args.threads,
+        'submissions_per_s': len(samples) / elapsed,
+        'drain_ms': drain * 1000,
+        'statements': STATS.snapshot()['statements'],
+        'writer': {k: stats[k] for k in ('written', 'batches', 'dropped', 'errors')},
+    }
+    report.update({f'submit_{k}_ms': v * 1000 for k, v in percentiles(samples).items()})
+    if args.dsn:
+        attempts, correct = question_stats_total(args.course, args.lesson)
+        report['stats_consistent'] = (
+            attempts - before[0] == args.students * args.questions
+            and correct - before[1] == expected_correct
+        )
+    return report
+
+
+def quiz_import_csv(course_id, lessons, questions, revision=0):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(['course_id', 'lesson_number', 'question_number', 'question', 'answer'])
+    for n in range(questions):
+        lesson_number = n % lessons + 1
+        question_number = n // lessons + 1
+        answer = f'resposta {question_number} r{revision}' if revision and n % 10 == 0 else f'resposta {question_number}'
+        writer.writerow([course_id, lesson_number, question_number, f'Pergunta {question_number}', answer])
+    return out.getvalue().encode('utf-8')
+
+
+def legacy_save_quiz(course_id, lesson_number, questions):
+    with PLT.get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            DELETE FROM quiz
+            WHERE course_id = %s AND lesson_number = %s
+        """, (course_id, lesson_number))
+        for i, question in enumerate(questions, 1):
+            cur.execute("""
+                INSERT INTO quiz (course_id, lesson_number, question_number, question, answer)
+                VALUES (%s, %s, %s, %s, %s)
+            """, (course_id, lesson_number, i, question['question'], question['answer']))
+        conn.commit()
+
+
+def timed(fn):
+    STATS.reset()
+    started = time.perf_counter()
+    result = fn()
+    return {
+        'ms': (time.perf_counter() - started) * 1000,
+        'statements': STATS.snapshot()['statements'],
+        'result': result,
+    }
+
+
+def bench_quiz_import(args):
+    install(args, Fixture(course_id=args.course))
+    if args.dsn:
+        with PLT.get_db_connection() as conn:
+            PLT.migrate(conn)
+    data = quiz_import_csv(args.course, args.lessons, args.questions)
+    revised = quiz_import_csv(args.course, args.lessons, args.questions, revision=1)
+    quizzes = PLT.parse_quiz_file('quiz.csv', data)
+
+    def legacy():
+        for (course_id, lesson_number), questions in quizzes.items():
+            legacy_save_quiz(course_id, lesson_number, questions)
+
+    report = {
+        'questions': args.questions,
+        'lessons': args.lessons,
+        'parse_ms': timed(lambda: PLT.parse_quiz_file('quiz.csv', data))['ms'],
+        'legacy_loop': timed(legacy),
+        'bulk_first_import': timed(lambda: PLT.import_quizzes('quiz.csv', data)),
+        'bulk_reimport_same': timed(lambda: PLT.import_quizzes('quiz.csv', data)),
+        'bulk_reimport_10pct_changed': timed(lambda: PLT.import_quizzes('quiz.csv', revised)),
+    }
+    for value in report.values():
+        if isinstance(value, dict) and isinstance(value['result'], dict):
+            value.update(value.pop('result'))
+        elif isinstance(value, dict):
+            value.pop('result')
+    return report
+
+
+LEGACY_FEEDBACK_SQL = """
+    SELECT f.*, u.email as user_email,
+           TO_CHAR(f.created_at, 'DD/MM/YYYY HH24:MI') as formatted_date
+    FROM lesson_feedback f
+    JOIN users u ON f.email = u.email
+    WHERE f.course_id = %s AND f.lesson_number = 0
+    ORDER BY f.created_at DESC
+"""
+
+
+def bench_feedback_feed(args):
+    if not args.dsn:
+        raise SystemExit("feedback-feed precisa de --dsn: mede o plano real sobre lesson_feedback")
+    install(args, None)
+    with PLT.get_db_connection() as conn, conn.cursor() as cur:
+        PLT.migrate(conn)
+        cur.execute("DELETE FROM lesson_feedback WHERE feedback_text LIKE 'bench-feed %%'")
+        cur.execute("""
+            INSERT INTO lesson_feedback (course_id, lesson_number, email, feedback_text, created_at)
+            SELECT %s, 0, 'estudante1@email.com', 'bench-feed ' || n,
+                   NOW() - (n %% 100000) * INTERVAL '1 minute'
+            FROM generate_series(1, %s) n
+        """, (args.course, args.rows))
+        cur.execute("ANALYZE lesson_feedback")
+        conn.commit()
+
+    def legacy():
+        with PLT.get_db_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(LEGACY_FEEDBACK_SQL, (args.course,))
+            return len(cur.fetchall())
+
+    def first_page():
+        return len(PLT.get_course_feedback([args.course], limit=args.page_size)[0])
+
+    def walk():
+        cursor, fetched = None, 0
+        for _ in range(args.pages):
+            rows, cursor = PLT.get_course_feedback([args.course], cursor, args.page_size)
+            fetched += len(rows)
+            if cursor is None:
+                break
+        return fetched
+
+    report = {'feedback_rows': args.rows, 'page_size': args.page_size}
+    for name, fn in (('legacy_full_fetch', legacy), ('first_page', first_page), (f'walk_{args.pages}_pages', walk)):
+        samples = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            fetched = fn()
+            samples.append(time.perf_counter() - started)
+        report[name] = {'rows_fetched': fetched, 'ms': statistics.median(samples) * 1000}
+
+    with PLT.get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM lesson_feedback WHERE feedback_text LIKE 'bench-feed %%'")
+        conn.commit()
+    return report
+
+
+SEARCH_WORDS = (
+    "aula professor exercício explicação conteúdo vídeo material prática exemplo dúvida "
+    "python banco dados consulta função variável projeto prova revisão ritmo áudio"
+).split()
+
+SEARCH_ADJECTIVES = "clara confusa rápida lenta excelente difícil ótima boa cansativa útil".split()
+
+
+def bench_search(args):
+    if not args.dsn:
+        raise SystemExit("search precisa de --dsn: mede o índice GIN real sobre lesson_feedback")
+    install(args, None)
+    rng = random.Random(17)
+    vocabulary = [
+        ''.join(rng.choice('bcdfglmnprstv') + rng.choice('aeiou') for _ in range(rng.randint(2, 4)))
+        for _ in range(args.vocabulary)
+    ]
+    texts = [
+        ' '.join(
+            f"{rng.choice(SEARCH_WORDS)} {rng.choice(SEARCH_ADJECTIVES)} {rng.choice(vocabulary)}"
+            for _ in range(rng.randint(3, 8))
+        )
+        for _ in range(args.rows)
+    ]
+    markers = {n: f"marcador{n} pipoca" for n in range(0, args.rows, max(1, args.rows // 10))}
+    for n, marker in markers.items():
+        texts[n] = f"{texts[n]} {marker}"
+    with PLT.get_db_connection() as conn, conn.cursor() as cur:
+        PLT.migrate(conn)
+        cur.execute("DELETE FROM lesson_feedback WHERE email = 'bench-search@email.com'")
+        execute_values(cur, """
+            INSERT INTO lesson_feedback (course_id, lesson_number, email, feedback_text)
+            VALUES %s
+        """, [(args.course, 0, 'bench-search@email.com', text) for text in texts], page_size=5000)
+        cur.execute("ANALYZE lesson_feedback")
+        conn.commit()
+
+    index = PLT.InvertedIndex()
+    started = time.perf_counter()
+    for n, text in enumerate(texts):
+        index.add(n, [(text, 1.0)], {'n': n})
+    index_build = time.perf_counter() - started
+
+    queries = {
+        'typical': [f"{rng.choice(SEARCH_WORDS)} {rng.choice(vocabulary)}" for _ in range(args.queries)],
+        'broad': [f"{rng.choice(SEARCH_WORDS)} {rng.choice(SEARCH_ADJECTIVES)}" for _ in range(args.queries)],
+    }
+    report = {'feedback_rows': args.rows, 'queries': args.queries, 'target_p99_ms': args.target_ms}
+    for name, fn in (
+        ('postgres_fts', lambda q: PLT.search(q, kinds=('feedback',), limit=args.page_size)),
+        ('inverted_index', lambda q: index.search(q, limit=args.page_size)),
+    ):
+        report[name] = {}
+        for kind, batch in queries.items():
+            samples = []
+            for query in batch:
+                started = time.perf_counter()
+                fn(query)
+                samples.append(time.perf_counter() - started)
+            stats = percentiles(samples)
+            report[name][f'{kind}_p50_ms'] = stats['p50'] * 1000
+            report[name][f'{kind}_p99_ms'] = stats['p99'] * 1000
+    report['inverted_index']['build_s'] = index_build
+
+    failures = []
+    for n, marker in markers.items():
+        found = [r for r in PLT.search(marker, kinds=('feedback',)) if r['email'] == 'bench-search@email.com']
+        if len(found) != 1 or [r['n'] for r in index.search(marker)] != [n]:
+            failures.append(marker)
+    if report['postgres_fts']['typical_p99_ms'] > args.target_ms:
+        failures.append(f"postgres_fts p99 acima de {args.target_ms} ms")
+    report['failures'] = failures
+
+    with PLT.get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute("DELETE FROM lesson_feedback WHERE email = 'bench-search@email.com'")
+        conn.commit()
+    return report
+
+
+LEGACY_LOGIN_METRICS_SQL = """
+    SELECT date_trunc('hour', attempt_time) AS bucket,
+           COUNT(*) FILTER (WHERE success) AS successes,
+           COUNT(*) FILTER (WHERE NOT success) AS failures
+    FROM login_logs
+    WHERE attempt_time >= NOW() - make_interval(hours => %s)
+    GROUP BY 1
+    ORDER BY 1
+"""
+
+LEGACY_VIEW_METRICS_SQL = """
+    SELECT lesson_number, COUNT(*) AS views, COUNT(DISTINCT email) AS viewers
+    FROM video_views
+    WHERE course_id = %s
+    GROUP BY lesson_number
+    ORDER BY lesson_number
+"""
+
+
+def bench_monitoring(args):
+    if not args.dsn:
+        raise SystemExit("monitoring precisa de --dsn: mede as tabelas agregadas reais")
+    install(args, None)
+    hours = args.days * 24
+
+    def seed(cur, rows):
+        cur.execute("""
+            INSERT INTO login_logs (email, success, ip_address, attempt_time)
+            SELECT 'bench-mon' || (n %% %(students)s) || '@email.com', n %% 10 <> 0, '10.0.0.1',
+                   NOW() - INTERVAL '10 minutes' - random() * make_interval(days => %(days)s)
+            FROM generate_series(1, %(rows)s) n
+        """, {'students': args.students, 'days': args.days, 'rows': rows})
+        cur.execute("""
+            INSERT INTO video_views (email, course_id, lesson_number, view_time)
+            SELECT 'bench-mon' || (n %% %(students)s) || '@email.com', %(course)s,
+                   1 + floor(%(lessons)s * random() ^ 2)::int,
+                   NOW() - INTERVAL '10 minutes' - random() * make_interval(days => %(days)s)
+            FROM generate_series(1, %(rows)s) n
+        """, {'students': args.students, 'days': args.days, 'rows': rows,
+              'course': args.course, 'lessons': args.lessons})
+
+    def cleanup():
+        with PLT.get_db_connection() as conn, conn.cursor() as cur:
+            cur.execute("DELETE FROM login_logs WHERE email LIKE 'bench-mon%%'")
+            cur.execute("DELETE FROM video_views WHERE email LIKE 'bench-mon%%'")
+            conn.commit()
+
+    def timed(fn):
+        samples = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - started)
+        return statistics.median(samples) * 1000
+
+    def legacy(sql, params):
+        with PLT.get_db_connection() as conn, conn.cursor() as cur:
+            cur.execute(sql, params)
+            return cur.fetchall()
+
+    with PLT.get_db_connection() as conn:
+        PLT.migrate(conn)
+    cleanup()
+    report = {'failures': []}
+    seeded = 0
+    for size in sorted(args.sizes):
+        with PLT.get_db_connection() as conn, conn.cursor() as cur:
+            seed(cur, size - seeded)
+            cur.execute("ANALYZE login_logs")
+            cur.execute("ANALYZE video_views")
+            conn.commit()
+        seeded = size
+
+        started = time.perf_counter()
+        with PLT.get_db_connection() as conn:
+            metrics.reset_metrics(conn)
+            while not metrics.refresh_metrics(conn, settle_delay=0, max_window=timedelta(days=args.days + 1))['caught_up']:
+                pass
+        rebuild = time.perf_counter() - started
+
+        with PLT.get_db_connection() as conn, conn.cursor() as cur:
+            cur.execute("""
+                SELECT (SELECT COUNT(*) FROM login_logs) = (SELECT SUM(successes + failures) FROM metrics_login_hourly),
+                       (SELECT COUNT(*) FROM video_views) = (SELECT SUM(views) FROM metrics_video_views_hourly),
+                       (SELECT COUNT(DISTINCT (course_id, lesson_number, email)) FROM video_views)
+                           = (SELECT SUM(viewers) FROM metrics_lesson_reach)
+            """)
+            if not all(cur.fetchone()):
+                report['failures'].append(f"agregados divergem dos eventos com {size} linhas")
+
+        report[f'{size}_rows'] = {
+            'rebuild_s': rebuild,
+            'sessions_ms': timed(lambda: PLT.get_session_metrics(hours)),
+            'logins_ms': timed(lambda: PLT.get_login_metrics(hours)),
+            'lesson_views_ms': timed(lambda: PLT.get_lesson_view_metrics(args.course, hours)),
+            'dropoff_ms': timed(lambda: PLT.get_course_dropoff(args.course, hours)),
+            'legacy_logins_ms': timed(lambda: legacy(LEGACY_LOGIN_METRICS_SQL, (hours,))),
+            'legacy_lesson_views_ms': timed(lambda: legacy(LEGACY_VIEW_METRICS_SQL, (args.course,))),
+        }
+
+    cleanup()
+    with PLT.get_db_connection() as conn:
+        metrics.reset_metrics(conn)
+        while not metrics.refresh_metrics(conn, settle_delay=0, max_window=timedelta(days=3650))['caught_up']:
+            pass
+    return report
+
+
+LEGACY_STUDENTS_SQL = """
+    SELECT email, permissions
+    FROM users
+    WHERE email LIKE 'estudante%%@email.com'
+    ORDER BY email
+"""
+
+
+def bench_course_access(args):
+    if not args.dsn:
+        raise SystemExit("course-access precisa de --dsn: mede UPDATE em lote sobre users")
+    install(args, None)
+    emails = [f'bench-access{n:06d}@email.com' for n in range(args.students)]
+
+    def cleanup(cur):
+        cur.execute("DELETE FROM users WHERE email LIKE 'bench-access%%'")
+
+    with PLT.get_db_connection() as conn, conn.cursor() as cur:
+        PLT.migrate(conn)
+        cleanup(cur)
+        execute_values(cur, "INSERT INTO users (email, password, permissions) VALUES %s", [
+            (email, 'x', ['curso-a'] if n % 2 else []) for n, email in enumerate(emails)
+        ], page_size=5000)
+        cur.execute("ANALYZE users")
+        conn.commit()
+
+    def holders(course_id):
+        with PLT.get_db_connection() as conn, conn.cursor() as cur:
+            cur.execute("""
+                SELECT COUNT(*) FILTER (WHERE %s = ANY(permissions)),
+                       COUNT(*) FILTER (WHERE 'curso-a' = ANY(permissions))
+                FROM users WHERE email LIKE 'bench-access%%'
+            """, (course_id,))
+            return cur.fetchone()
+
+    def legacy_grant():
+        with PLT.get_db_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute("SELECT email, permissions FROM users WHERE email LIKE 'bench-access%%'")
+            for user in cur.fetchall():
+                if args.course not in user['permissions']:
+                    cur.execute("UPDATE users SET permissions = %s WHERE email = %s",
+                                (user['permissions'] + [args.course], user['email']))
+                    conn.commit()
+
+    report = {'students': args.students, 'failures': []}
+    started = time.perf_counter()
+    legacy_grant()
+    report['legacy_grant_s'] = time.perf_counter() - started
+    PLT.update_course_access([args.course], 'revoke', pattern='bench-access*')
+
+    started = time.perf_counter()
+    result = PLT.update_course_access([args.course], 'grant', emails=emails)
+    report['bulk_grant_csv_s'] = time.perf_counter() - started
+    if result['updated'] != args.students or holders(args.course) != (args.students, args.students // 2):
+        report['failures'].append("concessão por lista não alcançou todos os alunos")
+
+    started = time.perf_counter()
+    result = PLT.update_course_access([args.course], 'revoke', pattern='bench-access*')
+    report['bulk_revoke_pattern_s'] = time.perf_counter() - started
+    if result['updated'] != args.students or holders(args.course) != (0, args.students // 2):
+        report['failures'].append("revogação por padrão deixou acessos ou removeu outros cursos")
+
+    observer = PLT.AccessRegistry(PLT.get_pool().connection, poll_interval=3600)
+    observer.poll()
+    edited = emails[:min(len(emails), 40)]
+    done = threading.Event()
+
+    def edit(worker):
+        for n in range(args.repeat):
+            email = edited[(worker * 7 + n) % len(edited)]
+            PLT.set_student_courses(email, [args.course] if n % 2 else [])
+
+    def poll():
+        while not done.is_set():
+            observer.poll()
+
+    poller = threading.Thread(target=poll)
+    poller.start()
+    workers = [threading.Thread(target=edit, args=(worker,)) for worker in range(8)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    done.set()
+    poller.join()
+    observer.poll()
+    with PLT.get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute("SELECT email, permissions_version FROM users WHERE email = ANY(%s)", (edited,))
+        missed = [email for email, version in cur.fetchall() if observer.version(email) != version]
+    report['registry_polls'] = observer.stats()['polls']
+    if missed:
+        report['failures'].append(f"{len(missed)} alunos com permissões alteradas que o poll não viu")
+
+    samples = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        PLT.search_students('bench-access0042', None, 20)
+        samples.append(time.perf_counter() - started)
+    report['picker_page_ms'] = statistics.median(samples) * 1000
+    with PLT.get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute(LEGACY_STUDENTS_SQL.replace('estudante', 'bench-access'))
+        started = time.perf_counter()
+        cur.execute(LEGACY_STUDENTS_SQL.replace('estudante', 'bench-access'))
+        report['legacy_picker_rows'] = len(cur.fetchall())
+        report['legacy_picker_ms'] = (time.perf_counter() - started) * 1000
+        cleanup(cur)
+        conn.commit()
+    return report
+
+
+LOAD_PAGES = (
+    ('meus_cursos', 30),
+    ('aula', 30),
+    ('curtir', 10),
+    ('quiz', 15),
+    ('meu_progresso', 10),
+    ('avaliacoes', 5),
+)
+
+
+def seed_load_course(course_id, lessons, questions):
+    with PLT.get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO courses (id, name, topics) VALUES (%s, %s, 'benchmark')
+            ON CONFLICT (id) DO NOTHING
+        """, (course_id, f'Curso {course_id}'))
+        conn.commit()
+    for n in range(1, lessons + 1):
+        PLT.save_lesson(course_id, n, f'https://youtu.be/abcdefghi{n:02d}', None)
+    PLT.save_quizzes({
+        (course_id, n): [{'question': f'Pergunta {q}', 'answer': f'resposta {q}'} for q in range(1, questions + 1)]
+        for n in range(1, lessons + 1)
+    })
+
+
+def clear_load_students(students, course_id):
+    emails = [email for email, _ in students]
+    with PLT.get_db_connection() as conn, conn.cursor() as cur:
+        for table in ('lesson_likes', 'lesson_completions', 'student_progress', 'quiz_attempts'):
+            cur.execute(f"DELETE FROM {table} WHERE email = ANY(%s) AND course_id = %s", (emails, course_id))
+        cur.execute("DELETE FROM video_views WHERE email = ANY(%s)", (emails,))
+        migrations.rebuild_like_counts(cur)
+        conn.commit()
+
+
+def bench_load(args):
+    fixture = Fixture(course_id=args.course, lessons=args.lessons, questions=args.questions)
+    pool = install(args, fixture, maxconn=args.pool_size)
+    set_password_policy('pbkdf2_sha256', 1000, 2)
+    fixture.password_hash = PLT.hash_password('senha', 'pbkdf2_sha256', 1000)
+    students = [(f'load{n}@email.com', 'senha') for n in range(args.students)]
+    if args.dsn:
+        with PLT.get_db_connection() as conn:
+            PLT.migrate(conn)
+        seed_load_course(args.course, args.lessons, args.questions)
+        seed_storm_students(students, args.course, fixture.password_hash)
+        clear_storm_sessions(students)
+        clear_load_students(students, args.course)
+
+    pages = [name for name, _ in LOAD_PAGES]
+    weights = [weight for _, weight in LOAD_PAGES]
+    samples = {name: [] for name in ['login'] + pages}
+    statements = {name: 0 for name in samples}
+    errors = Counter()
+    lock = threading.Lock()
+
+    def render(name, fn):
+        before = STATS.thread_statements()
+        started = time.perf_counter()
+        try:
+            ok = fn() is not False
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - started
+        with lock:
+            samples[name].append(elapsed)
+            statements[name] += STATS.thread_statements() - before
+            if not ok:
+                errors[name] += 1
+        if args.think_time:
+            time.sleep(rng_think.uniform(0, 2 * args.think_time / 1000))
+
+    rng_think = random.Random(args.seed)
+
+    def student(n, email, password):
+        rng = random.Random(args.seed + n)
+        state = {'lesson': 1, 'entitlements': frozenset([args.course])}
+
+        def login():
+            success, entitlements, _ = PLT.verify_login(email, password)
+            state['entitlements'] = entitlements['courses'] if success else frozenset()
+            return success
+
+        def meus_cursos():
+            page = PLT.load_course_page(email, args.course, state['entitlements'])
+            state['lesson'] = min(page['current_lesson'], len(page['lessons']))
+            PLT.log_video_view(email, args.course, state['lesson'])
+            PLT.get_quiz(args.course, state['lesson'])
+
+        def aula():
+            lesson = rng.randint(1, state['lesson'])
+            get_lesson_likes(args.course, lesson, email)
+            PLT.get_quiz(args.course, lesson)
+            PLT.log_video_view(email, args.course, lesson)
+
+        def curtir():
+            return PLT.toggle_like(args.course, rng.randint(1, state['lesson']), email) is not None
+
+        def quiz():
+            lesson = state['lesson']
+            key = PLT.get_answer_key(args.course, lesson)
+            responses = [key.display(i) if rng.random() < 0.8 else 'não sei' for i in range(len(key))]
+            results = key.grade(responses)
+            PLT.record_quiz_attempt(email, args.course, lesson, key, results)
+            if all(results):
+                PLT.update_student_progress(email, args.course, lesson)
+                state['lesson'] = min(args.lessons, lesson + 1)
+
+        def meu_progresso():
+            get_student_progress(email, args.course)
+
+        def avaliacoes():
+            PLT.get_course_feedback(sorted(state['entitlements']), limit=20)
+
+        flows = {
+            'meus_cursos': meus_cursos, 'aula': aula, 'curtir': curtir,
+            'quiz': quiz, 'meu_progresso': meu_progresso, 'avaliacoes': avaliacoes,
+        }
+
+        def job():
+            render('login', login)
+            for name in rng.choices(pages, weights, k=args.pages):
+                render(name, flows[name])
+            return True
+        return job
+
+    STATS.reset()
+    writer = PLT.get_event_writer()
+    started = time.perf_counter()
+    run_concurrently([student(n, email, password) for n, (email, password) in enumerate(students)], args.threads)
+    writer.flush()
+    elapsed = time.perf_counter() - started
+
+    total = sum(len(values) for values in samples.values())
+    report = {
+        'mode': 'postgres' if args.dsn else f'stand-in ({args.latency} ms/statement)',
+        'students': args.students,
+        'threads': args.threads,
+        'pages_per_student': args.pages,
+        'pool_size': args.pool_size,
+        'elapsed_s': elapsed,
+        'pages_per_s': total / elapsed,
+        'statements_per_page': STATS.snapshot()['statements'] / max(1, total),
+        'connections_opened': STATS.snapshot()['connections'],
+    }
+    everything = [sample for values in samples.values() for sample in values]
+    report['all_pages'] = {f'{k}_ms': v * 1000 for k, v in percentiles(everything).items()}
+    for name, values in samples.items():
+        if not values:
+            continue
+        report[f'page_{name}'] = {
+            'count': len(values),
+            'errors': errors[name],
+            'statements_per_page': statements[name] / len(values),
+        }
+        report[f'page_{name}'].update({f'{k}_ms': v * 1000 for k, v in percentiles(values).items()})
+    report['pool'] = pool.stats()
+    report['writer'] = {k: v for k, v in writer.stats().items() if k in ('written', 'batches', 'dropped', 'errors')}
+    report['failures'] = [f'{name}: {count} erros' for name, count in sorted(errors.items())]
+    if args.dsn:
+        clear_storm_sessions(students)
+        clear_load_students(students, args.course)
+    return report
+
+
+LEGACY_ATTEMPTS_SQL = """
+    SELECT COUNT(*) as failed_attempts
+    FROM login_logs
+    WHERE (email = %s OR ip_address = %s)
+    AND success = false
+    AND attempt_time > NOW() - INTERVAL '15 minutes'
+"""
+
+
+def bench_heartbeats(args):
+    pool = install(args, Fixture(course_id='bench101'))
+    tracker = PLT.SessionTracker(pool.connection, heartbeat_interval=3600)
+    reruns = [(n % args.students, f'hb{n % args.students}@email.com') for n in range(args.students * args.reruns)]
+    flushes = max(1, int(args.minutes * 60 / args.interval))
+
+    STATS.reset()
+    started = time.perf_counter()
+    for _, email in reruns:
+        execute_query(LEGACY_HEARTBEAT_SQL, (email,))
+    legacy_elapsed = time.perf_counter() - started
+    legacy_statements = STATS.snapshot()['statements']
+
+    STATS.reset()
+    started = time.perf_counter()
+    chunk = max(1, len(reruns) // flushes)
+    for start in range(0, len(reruns), chunk):
+        for session_id, _ in reruns[start:start + chunk]:
+            tracker.touch(session_id + 1)
+        tracker.flush()
+    tracker_elapsed = time.perf_counter() - started
+    tracker_statements = STATS.snapshot()['statements']
+    tracker.close()
+
+    return {
+        'students': args.students,
+        'reruns_per_student': args.reruns,
+        'heartbeat_interval_s': args.interval,
+        'legacy': {'statements': legacy_statements, 'ms_total': legacy_elapsed * 1000},
+        'tracker': {
+            'statements': tracker_statements,
+            'ms_total': tracker_elapsed * 1000,
+            'sessions_written': tracker.stats()['sessions_written'],
+        },
+        'write_reduction': legacy_statements / max(1, tracker_statements),
+    }
+
+
+def bench_catalog_sync(args):
+    if not args.dsn:
+        raise SystemExit("catalog-sync precisa de --dsn: a versão do catálogo é compartilhada pelo Postgres")
+    pool = install(args, Fixture())
+    replicas = []
+    for _ in range(args.replicas):
+        cache = PLT.CatalogCache()
+        replicas.append((cache, PLT.CatalogSync(pool.connection, cache, poll_interval=3600).start()))
+    report = {'replicas': args.replicas, 'failures': []}
+
+    for cache, _ in replicas:
+        cache.get(('courses',), lambda: 'antigo')
+    writer_cache, writer_sync = replicas[0]
+    writer_cache.invalidate('courses')
+    writer_sync.bump()
+    if writer_cache.get(('courses',), lambda: 'novo') != 'novo':
+        report['failures'].append("réplica que editou continuou com o catálogo antigo")
+
+    started = time.perf_counter()
+    for _, sync in replicas[1:]:
+        sync.poll()
+    report['ms_per_poll'] = (time.perf_counter() - started) * 1000 / max(1, len(replicas) - 1)
+    stale = sum(1 for cache, _ in replicas[1:] if cache.get(('courses',), lambda: 'novo') != 'novo')
+    if stale:
+        report['failures'].append(f"{stale} réplica(s) continuaram com o catálogo antigo após o poll")
+
+    writer_sync.poll()
+    report['writer_cleared_by_own_bump'] = writer_sync.stats()['changes']
+    if writer_sync.stats()['changes']:
+        report['failures'].append("a réplica que editou limpou o próprio cache ao ver a sua versão")
+    for _, sync in replicas:
+        sync.close()
+    return report
+
+
+def time_checks(check, keys, count):
+    started = time.perf_counter()
+    for n in range(count):
+        email, ip_address = keys[n % len(keys)]
+        check(email, ip_address)
+    return (time.perf_counter() - started) / count
+
+
+def bench_rate_limit(args):
+    report = {}
+    probe = [(f'probe{n}@email.com', f'10.1.{n % 250}.{n % 200}') for n in range(1000)]
+    for size in args.sizes:
+        limiter = PLT.LoginRateLimiter(None)
+        now = time.time()
+        for n in range(size):
+            limiter.record_failure(f'user{n % (size // 3 + 1)}@email.com', f'10.0.{n % 250}.{n % 199}',
+                                   now - (n % 800))
+        report[f'{size}_failures'] = {
+            'tracked_keys': limiter.stats()['tracked_keys'],
+            'us_per_check': time_checks(limiter.is_blocked, probe, args.checks) * 1e6,
+        }
+
+    if args.dsn:
+        install(args, None)
+        with PLT.get_db_connection() as conn, conn.cursor() as cur:
+            if args.seed_rows:
+                cur.execute("""
+                    INSERT INTO login_logs (email, success, ip_address, attempt_time)
+                    SELECT 'ratelimit-bench-' || (n %% 5000) || '@email.com', n %% 3 = 0,
+                           '10.9.' || (n %% 250) || '.' || (n %% 199),
+                           NOW() - (n %% 86400) * INTERVAL '1 second'
+                    FROM generate_series(1, %s) n
+                """, (args.seed_rows,))
+                conn.commit()
+            cur.execute("SELECT COUNT(*) FROM login_logs")
+            table_rows = cur.fetchone()[0]
+
+        def legacy(email, ip_address):
+            with PLT.get_db_connection() as conn, conn.cursor() as cur:
+                cur.execute(LEGACY_ATTEMPTS_SQL, (email, ip_address))
+                return cur.fetchone()[0]
+
+        limiter = PLT.LoginRateLimiter(PLT.get_pool().connection)
+        started = time.perf_counter()
+        limiter.reconcile()
+        reconcile_ms = (time.perf_counter() - started) * 1000
+        report['postgres'] = {
+            'login_logs_rows': table_rows,
+            'legacy_query_us_per_check': time_checks(legacy, probe, min(args.checks, 200)) * 1e6,
+            'limiter_us_per_check': time_checks(limiter.is_blocked, probe, args.checks) * 1e6,
+            'reconcile_ms': reconcile_ms,
+            'tracked_keys': limiter.stats()['tracked_keys'],
+        }
+    return report
+
+
+def bench_profiler(args):
+    queries = [sql for _, sql in migrations.extract_queries(PLT.__file__)]
+    report = {'queries': len(queries), 'failures': []}
+    fingerprints = {PLT.query_fingerprint(sql) for sql in queries}
+    ids = {PLT.hashlib.md5(fingerprint.encode()).hexdigest()[:12] for fingerprint in fingerprints}
+    report['fingerprints'] = len(fingerprints)
+    if len(ids) != len(fingerprints):
+        report['failures'].append("colisão de ids de consulta")
+    if any(re.search(r"'[^']*'|%s|%\(\w+\)s", fingerprint) for fingerprint in fingerprints):
+        report['failures'].append("fingerprint manteve literal ou placeholder")
+
+    template = "INSERT INTO video_views (email, course_id, lesson_number, view_time) VALUES %s"
+    batches = set()
+    for size in (1, 2, 100):
+        values = ','.join(f"('aluno{n}@email.com', 'curso', {n}, '2024-01-01')" for n in range(size))
+        batches.add(PLT.query_fingerprint(template.replace('%s', values).encode()))
+    if len(batches) != 1:
+        report['failures'].append(f"execute_values gerou {len(batches)} fingerprints para o mesmo INSERT")
+
+    profiler = PLT.QueryProfiler(window=60, slow_threshold=3600)
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        for sql in queries:
+            profiler.record(sql, None, 0.002, 1)
+    report['record_us'] = (time.perf_counter() - started) / (args.repeat * len(queries)) * 1e6
+    text = profiler.metrics_text()
+    counts = re.findall(r'plt_db_query_seconds_count\{[^}]*\} (\d+)', text)
+    if sum(int(count) for count in counts) != args.repeat * len(queries):
+        report['failures'].append("contagem do histograma não bate com as consultas registradas")
+    started = time.perf_counter()
+    profiler.window_stats()
+    report['window_stats_ms'] = (time.perf_counter() - started) * 1000
+
+    if args.dsn:
+        profiler = PLT.QueryProfiler(window=60, slow_threshold=3600)
+        plain = psycopg2.connect(args.dsn)
+        profiled = psycopg2.connect(args.dsn, connection_factory=PLT.ProfiledConnection)
+        profiled.profiler = profiler
+        for name, conn in (('plain', plain), ('profiled', profiled)):
+            with conn.cursor() as cur:
+                samples = []
+                for _ in range(args.statements):
+                    started = time.perf_counter()
+                    cur.execute("SELECT %s", (1,))
+                    cur.fetchone()
+                    samples.append(time.perf_counter() - started)
+            report[f'{name}_statement_us'] = statistics.median(samples) * 1e6
+            conn.close()
+        report['overhead_us'] = report['profiled_statement_us'] - report['plain_statement_us']
+
+        pool = PLT.ConnectionPool(lambda: PLT.connect_profiled({'dsn': args.dsn}, profiler), minconn=1, maxconn=2, timeout=30)
+        install_singletons(pool)
+        profiler.begin_rerun()
+        PLT.search_students('estudante', None, 20)
+        run = profiler.end_rerun()
+        pool.closeall()
+        functions = {entry['function'] for entry in run['entries']}
+        report['attributed_to'] = ', '.join(sorted(functions))
+        if functions != {'search_students'}:
+            report['failures'].append("consulta não atribuída à função chamadora")
+    return report
+
+
+def bench_videos(args):
+    urls = [
+        f'https://www.youtube.com/watch?v=abcdefghi{n % 100:02d}&t={n}s' if n % 2 else f'https://youtu.be/abcdefghi{n % 100:02d}'
+        for n in range(args.lessons)
+    ]
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        for url in urls:
+            PLT.extract_youtube_id(url)
+    report = {
+        'lessons': args.lessons,
+        'render_parse_us_per_lesson': (time.perf_counter() - started) / (args.repeat * len(urls)) * 1e6,
+        'failures': [],
+    }
+    if not args.dsn:
+        return report
+
+    install(args, None)
+    invalid_urls = {n for n in range(args.lessons) if n % args.invalid_every == 0}
+
+    def cleanup(cur):
+        cur.execute("DELETE FROM lessons WHERE course_id = %s", (args.course,))
+        cur.execute("DELETE FROM video_metadata WHERE video_id LIKE 'bv%%'")
+        cur.execute("DELETE FROM courses WHERE id = %s", (args.course,))
+
+    with PLT.get_db_connection() as conn, conn.cursor() as cur:
+        PLT.migrate(conn)
+        cleanup(cur)
+        cur.execute("INSERT INTO courses (id, name, topics) VALUES (%s, %s, 'benchmark')",
+                    (args.course, f'Curso {args.course}'))
+        execute_values(cur, "INSERT INTO lessons (course_id, lesson_number, video_url) VALUES %s", [
+            (args.course, n + 1, f'https://exemplo.com/aula{n}' if n in invalid_urls else f'https://youtu.be/bv{n:09d}')
+            for n in range(args.lessons)
+        ], page_size=5000)
+        conn.commit()
+
+        started = time.perf_counter()
+        updated, invalid = videos.backfill_video_ids(cur)
+        conn.commit()
+        report['backfill_ids_s'] = time.perf_counter() - started
+        ours = [item for item in invalid if item[0] == args.course]
+        report['invalid_reported'] = len(ours)
+        if len(ours) != len(invalid_urls) or updated < args.lessons - len(invalid_urls):
+            report['failures'].append("backfill não separou URLs válidas e inválidas")
+        cur.execute("""
+            SELECT COUNT(*) FROM lessons
+            WHERE course_id = %s AND video_id IS DISTINCT FROM
+                  CASE WHEN video_url LIKE 'https://youtu.be/%%' THEN substr(video_url, 18) END
+        """, (args.course,))
+        if cur.fetchone()[0]:
+            report['failures'].append("video_id gravado difere do id da URL")
+
+    def backfill_fetch(video_ids):
+        if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            report['failures'].append("backfill chamou o provedor com uma transação aberta")
+        return videos.static_video_metadata([video_id for video_id in video_ids if video_id.startswith('bv')])
+
+    def save_fetch(video_ids):
+        if PLT.get_pool().stats()['in_use']:
+            report['failures'].append("save_lesson chamou o provedor segurando uma conexão do pool")
+        return videos.static_video_metadata(video_ids)
+
+    started = time.perf_counter()
+    with PLT.get_db_connection() as conn:
+        stored, missing = videos.backfill_video_metadata(conn, 'static', backfill_fetch, args.batch_size)
+    report['backfill_metadata_s'] = time.perf_counter() - started
+    report['metadata_stored'] = stored
+
+    PLT.get_video_metadata_provider = lambda: ('static', save_fetch)
+    if PLT.save_lesson(args.course, 1, 'https://exemplo.com/nao-e-youtube', None):
+        report['failures'].append("save_lesson aceitou URL inválida")
+    PLT.save_lesson(args.course, 1, 'https://www.youtube.com/watch?v=bvnovo00001', None)
+    page = PLT.load_course_page('bench-videos@email.com', args.course, frozenset([args.course]))
+    if page['lessons'][0]['video_id'] != 'bvnovo00001':
+        report['failures'].append("id do vídeo não foi gravado em save_lesson")
+    with PLT.get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT COUNT(*) FROM lessons l
+            LEFT JOIN video_metadata m ON m.video_id = l.video_id
+            WHERE l.course_id = %s AND l.video_id IS NOT NULL AND m.video_id IS NULL
+        """, (args.course,))
+        if cur.fetchone()[0]:
+            report['failures'].append("aulas com vídeo sem metadados após o backfill")
+        cleanup(cur)
+        conn.commit()
+    PLT.invalidate_course(args.course)
+    return report
+
+
+def print_report(name, report):
+    print(f'== {name}')
+    for key, value in report.items():
+        if isinstance(value, dict):
+            print(f'  {key}:')
+            for k, v in value.items():
+                print(f'    {k:<22} {v:.2f}' if isinstance(v, float) else f'    {k:<22} {v}')
+        elif isinstance(value, float):
+            print(f'  {key:<24} {value:.2f}')
+        else:
+            print(f'  {key:<24} {value}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks da camada de dados do PLT.py")
+    parser.add_argument('--dsn', help="Postgres real (padrão: conexão simulada que conta statements)")
+    parser.add_argument('--latency', type=float, default=1.0, help="latência simulada por statement (ms)")
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--json', action='store_true', help="imprime o resultado em JSON")
+    parser.add_argument('--output', help="grava o resultado em JSON neste arquivo (para comparar versões)")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    course_page = sub.add_parser('course-page', help="Meus Cursos: caminho antigo (N+1) vs load_course_page")
+    course_page.add_argument('--lessons', type=int, default=30)
+    course_page.add_argument('--course', default='bench101')
+    course_page.add_argument('--email', default='estudante1@email.com')
+    course_page.set_defaults(func=bench_course_page)
+
+    lesson_render = sub.add_parser('lesson-render', help="curtir uma aula: rerun da página inteira vs rerun só do fragmento da aula")
+    lesson_render.add_argument('--lessons', type=int, default=50)
+    lesson_render.add_argument('--questions', type=int, default=5)
+    lesson_render.add_argument('--course', default='bench-render')
+    lesson_render.set_defaults(func=bench_lesson_render)
+
+    like_toggles = sub.add_parser('like-toggles', help="toggle_like concorrente; confere contador vs COUNT(*)")
+    like_toggles.add_argument('--threads', type=int, default=8)
+    like_toggles.add_argument('--toggles', type=int, default=200, help="toggles por thread")
+    like_toggles.add_argument('--users', type=int, default=5, help="emails distintos (poucos = mais disputa)")
+    like_toggles.add_argument('--course', default='bench101')
+    like_toggles.add_argument('--lesson', type=int, default=1)
+    like_toggles.set_defaults(func=bench_like_toggles)
+
+    login_storm = sub.add_parser('login-storm', help="N logins simultâneos em verify_login; p50/p99")
+    login_storm.add_argument('--students', type=int, default=500)
+    login_storm.add_argument('--threads', type=int, default=32)
+    login_storm.add_argument('--pool-size', type=int, default=10)
+    login_storm.add_argument('--course', default='bench101')
+    login_storm.add_argument('--hash-scheme', default='scrypt', choices=sorted(PLT.PASSWORD_HASH_DEFAULT_COST))
+    login_storm.add_argument('--hash-cost', type=int)
+    login_storm.add_argument('--hash-workers', type=int, default=2)
+    login_storm.set_defaults(func=bench_login_storm)
+
+    hashing = sub.add_parser('hashing', help="vazão do hash de senha por custo (para escolher PASSWORD_HASH_COST)")
+    hashing.add_argument('--scheme', default='scrypt', choices=sorted(PLT.PASSWORD_HASH_DEFAULT_COST))
+    hashing.add_argument('--costs', type=int, nargs='+', help="scrypt: log2(N); pbkdf2_sha256: iterações")
+    hashing.add_argument('--workers', type=int, default=2)
+    hashing.add_argument('--count', type=int, default=20)
+    hashing.set_defaults(func=bench_hashing)
+
+    rate_limit = sub.add_parser('rate-limit', help="custo do check de tentativas vs volume de falhas/login_logs")
+    rate_limit.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 1000000])
+    rate_limit.add_argument('--checks', type=int, default=100000)
+    rate_limit.add_argument('--seed-rows', type=int, default=0, help="com --dsn: insere N linhas sintéticas em login_logs")
+    rate_limit.set_defaults(func=bench_rate_limit)
+
+    grading = sub.add_parser('grading', help="custo por submissão do AnswerKey (unitário vs lote) e da compilação da chave")
+    grading.add_argument('--submissions', type=int, default=5000)
+    grading.add_argument('--questions', type=int, default=10)
+    grading.add_argument('--seed', type=int, default=13)
+    grading.set_defaults(func=bench_grading)
+
+    classroom = sub.add_parser('quiz-classroom', help="turma inteira enviando o quiz ao mesmo tempo")
+    classroom.add_argument('--students', type=int, default=300)
+    classroom.add_argument('--questions', type=int, default=5)
+    classroom.add_argument('--threads', type=int, default=32)
+    classroom.add_argument('--course', default='bench101')
+    classroom.add_argument('--lesson', type=int, default=1)
+    classroom.add_argument('--batch-size', type=int, default=500)
+    classroom.add_argument('--flush-interval', type=float, default=2.0)
+    classroom.add_argument('--seed', type=int, default=14)
+    classroom.set_defaults(func=bench_quiz_classroom)
+
+    quiz_import = sub.add_parser('quiz-import', help="importação em lote de quizzes vs DELETE + INSERT por questão")
+    quiz_import.add_argument('--questions', type=int, default=1000)
+    quiz_import.add_argument('--lessons', type=int, default=30, help="aulas existentes no curso (1..N)")
+    quiz_import.add_argument('--course', default='bench101')
+    quiz_import.set_defaults(func=bench_quiz_import)
+
+    feedback_feed = sub.add_parser('feedback-feed', help="avaliações: busca completa antiga vs páginas por (created_at, id)")
+    feedback_feed.add_argument('--rows', type=int, default=50000)
+    feedback_feed.add_argument('--page-size', type=int, default=20)
+    feedback_feed.add_argument('--pages', type=int, default=10)
+    feedback_feed.add_argument('--course', default='bench101')
+    feedback_feed.set_defaults(func=bench_feedback_feed)
+
+    search = sub.add_parser('search', help="busca textual: p50/p99 do índice GIN vs índice invertido em memória")
+    search.add_argument('--rows', type=int, default=100000)
+    search.add_argument('--queries', type=int, default=200)
+    search.add_argument('--vocabulary', type=int, default=5000, help="termos raros além das palavras comuns")
+    search.add_argument('--page-size', type=int, default=20)
+    search.add_argument('--target-ms', type=float, default=50)
+    search.add_argument('--course', default='bench101')
+    search.set_defaults(func=bench_search)
+
+    monitoring = sub.add_parser('monitoring', help="painéis do monitoramento (agregados) vs consultas sobre os logs brutos")
+    monitoring.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    monitoring.add_argument('--days', type=int, default=30)
+    monitoring.add_argument('--students', type=int, default=2000)
+    monitoring.add_argument('--lessons', type=int, default=30)
+    monitoring.add_argument('--course', default='bench101')
+    monitoring.set_defaults(func=bench_monitoring)
+
+    course_access = sub.add_parser('course-access', help="conceder/revogar curso para uma turma: UPDATE por aluno vs em lote")
+    course_access.add_argument('--students', type=int, default=5000)
+    course_access.add_argument('--course', default='bench101')
+    course_access.set_defaults(func=bench_course_access)
+
+    load = sub.add_parser('load', help="N alunos simultâneos navegando (login, aulas, quiz, curtidas, progresso, avaliações)")
+    load.add_argument('--students', type=int, default=100)
+    load.add_argument('--threads', type=int, default=16, help="alunos navegando ao mesmo tempo")
+    load.add_argument('--pages', type=int, default=20, help="páginas por aluno após o login")
+    load.add_argument('--think-time', type=float, default=0, help="pausa média entre páginas (ms)")
+    load.add_argument('--pool-size', type=int, default=10)
+    load.add_argument('--lessons', type=int, default=10)
+    load.add_argument('--questions', type=int, default=5)
+    load.add_argument('--course', default='bench-load')
+    load.add_argument('--seed', type=int, default=21)
+    load.set_defaults(func=bench_load)
+
+    profiler = sub.add_parser('profiler', help="fingerprints das consultas do PLT.py e custo do QueryProfiler por statement")
+    profiler.add_argument('--statements', type=int, default=2000, help="statements por conexão na medição de overhead (--dsn)")
+    profiler.set_defaults(func=bench_profiler)
+
+    video_links = sub.add_parser('videos', help="custo do parse do link por aula renderizada; backfill de id e metadados (--dsn)")
+    video_links.add_argument('--lessons', type=int, default=10000)
+    video_links.add_argument('--invalid-every', type=int, default=50, help="uma URL inválida a cada N aulas")
+    video_links.add_argument('--batch-size', type=int, default=500)
+    video_links.add_argument('--course', default='bench-videos')
+    video_links.set_defaults(func=bench_videos)
+
+    catalog_sync = sub.add_parser('catalog-sync', help="edição em uma réplica invalida o cache de catálogo das outras (--dsn)")
+    catalog_sync.add_argument('--replicas', type=int, default=4)
+    catalog_sync.set_defaults(func=bench_catalog_sync)
+
+    heartbeats = sub.add_parser('heartbeats', help="UPDATE por rerun vs SessionTracker (heartbeats agrupados)")
+    heartbeats.add_argument('--students', type=int, default=200)
+    heartbeats.add_argument('--reruns', type=int, default=50, help="reruns por aluno no período")
+    heartbeats.add_argument('--minutes', type=float, default=30)
+    heartbeats.add_argument('--interval', type=float, default=60, help="SESSION_HEARTBEAT_INTERVAL simulado (s)")
+    heartbeats.set_defaults(func=bench_heartbeats)
+
+    args = parser.parse_args()
+    report = args.func(args)
+    if args.json:
+        print(json.dumps({args.command: report}, indent=2, default=str))
+    else:
+        print_report(args.command, report)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({args.command: report}, output, indent=2, sort_keys=True, default=str)
+    if report.get('failures'):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
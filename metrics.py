@@ -0,0 +1,157 @@
+import argparse
+import sys
+from datetime import timedelta
+
+import psycopg2
+
+from migrations import PARTITIONED_TABLES
+
+METRICS_LOCK_KEY = 7319004212
+
+METRICS_ROLLUPS = {
+    'login_logs': """
+        INSERT INTO metrics_login_hourly (bucket, successes, failures)
+        SELECT date_trunc('hour', attempt_time),
+               COUNT(*) FILTER (WHERE success),
+               COUNT(*) FILTER (WHERE NOT success)
+        FROM login_logs
+        WHERE attempt_time >= %(start)s AND attempt_time < %(end)s
+        GROUP BY 1
+        ON CONFLICT (bucket) DO UPDATE
+        SET successes = metrics_login_hourly.successes + EXCLUDED.successes,
+            failures = metrics_login_hourly.failures + EXCLUDED.failures
+    """,
+    'video_views': """
+        WITH views AS (
+            SELECT email, course_id, lesson_number, view_time
+            FROM video_views
+            WHERE view_time >= %(start)s AND view_time < %(end)s
+        ),
+        hourly AS (
+            INSERT INTO metrics_video_views_hourly (course_id, bucket, lesson_number, views)
+            SELECT course_id, date_trunc('hour', view_time), lesson_number, COUNT(*)
+            FROM views
+            GROUP BY 1, 2, 3
+            ON CONFLICT (course_id, bucket, lesson_number) DO UPDATE
+            SET views = metrics_video_views_hourly.views + EXCLUDED.views
+        ),
+        reached AS (
+            INSERT INTO metrics_lesson_viewers (course_id, lesson_number, email, first_view)
+            SELECT course_id, lesson_number, email, MIN(view_time)
+            FROM views
+            GROUP BY 1, 2, 3
+            ON CONFLICT (course_id, lesson_number, email) DO NOTHING
+            RETURNING course_id, lesson_number, first_view
+        ),
+        daily AS (
+            INSERT INTO metrics_lesson_reach_daily (course_id, bucket, lesson_number, viewers)
+            SELECT course_id, date_trunc('day', first_view), lesson_number, COUNT(*)
+            FROM reached
+            GROUP BY 1, 2, 3
+            ON CONFLICT (course_id, bucket, lesson_number) DO UPDATE
+            SET viewers = metrics_lesson_reach_daily.viewers + EXCLUDED.viewers
+        )
+        INSERT INTO metrics_lesson_reach (course_id, lesson_number, viewers)
+        SELECT course_id, lesson_number, COUNT(*)
+        FROM reached
+        GROUP BY 1, 2
+        ON CONFLICT (course_id, lesson_number) DO UPDATE
+        SET viewers = metrics_lesson_reach.viewers + EXCLUDED.viewers
+    """,
+}
+
+
+def refresh_metrics(conn, settle_delay=300, max_window=timedelta(days=1), session_timeout=1800):
+    report = {}
+    with conn.cursor() as cur:
+        try:
+            cur.execute("SELECT pg_try_advisory_xact_lock(%s)", (METRICS_LOCK_KEY,))
+            if not cur.fetchone()[0]:
+                conn.rollback()
+                return None
+            cur.execute("SELECT NOW() - make_interval(secs => %s)", (settle_delay,))
+            horizon = cur.fetchone()[0]
+            caught_up = True
+            for source, column in PARTITIONED_TABLES.items():
+                cur.execute(
+                    "SELECT processed_until FROM metrics_watermarks WHERE source = %s FOR UPDATE",
+                    (source,)
+                )
+                start = cur.fetchone()[0]
+                if start is None:
+                    cur.execute(f"SELECT MIN({column}) FROM {source}")
+                    start = cur.fetchone()[0] or horizon
+                end = min(start + max_window, horizon)
+                if end > start:
+                    cur.execute(METRICS_ROLLUPS[source], {'start': start, 'end': end})
+                    cur.execute("""
+                        UPDATE metrics_watermarks
+                        SET processed_until = %s, updated_at = NOW()
+                        WHERE source = %s
+                    """, (end, source))
+                report[source] = max(start, end)
+                caught_up = caught_up and end >= horizon
+            cur.execute("""
+                INSERT INTO metrics_sessions_hourly
+                    (bucket, samples, total_sessions, peak_sessions, peak_users, last_sessions, last_users)
+                SELECT date_trunc('hour', NOW()), 1, COUNT(*), COUNT(*), COUNT(DISTINCT email),
+                       COUNT(*), COUNT(DISTINCT email)
+                FROM active_sessions
+                WHERE last_activity > NOW() - make_interval(secs => %s)
+                ON CONFLICT (bucket) DO UPDATE
+                SET samples = metrics_sessions_hourly.samples + 1,
+                    total_sessions = metrics_sessions_hourly.total_sessions + EXCLUDED.total_sessions,
+                    peak_sessions = GREATEST(metrics_sessions_hourly.peak_sessions, EXCLUDED.peak_sessions),
+                    peak_users = GREATEST(metrics_sessions_hourly.peak_users, EXCLUDED.peak_users),
+                    last_sessions = EXCLUDED.last_sessions,
+                    last_users = EXCLUDED.last_users
+            """, (session_timeout,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    report['caught_up'] = caught_up
+    return report
+
+
+def reset_metrics(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (METRICS_LOCK_KEY,))
+        cur.execute("""
+            TRUNCATE metrics_login_hourly, metrics_video_views_hourly, metrics_lesson_viewers,
+                     metrics_lesson_reach, metrics_lesson_reach_daily
+        """)
+        cur.execute("UPDATE metrics_watermarks SET processed_until = NULL, updated_at = NOW()")
+    conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agregados do monitoramento do PLT.py")
+    parser.add_argument('--dsn', required=True)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    refresh = sub.add_parser('refresh', help="agrega login_logs e video_views nas tabelas do monitoramento até alcançar o presente")
+    refresh.add_argument('--settle-delay', type=float, default=300, help="segundos de atraso para eventos ainda em trânsito")
+    refresh.add_argument('--window-hours', type=float, default=24, help="janela máxima processada por transação")
+    refresh.add_argument('--rebuild', action='store_true', help="apaga os agregados e reprocessa desde o início")
+
+    args = parser.parse_args()
+    conn = psycopg2.connect(args.dsn)
+    try:
+        if args.command == 'refresh':
+            if args.rebuild:
+                reset_metrics(conn)
+            while True:
+                report = refresh_metrics(conn, args.settle_delay, timedelta(hours=args.window_hours))
+                if report is None:
+                    print("Outra instância está agregando as métricas")
+                    sys.exit(1)
+                print(f"login_logs até {report['login_logs']}, video_views até {report['video_views']}")
+                if report['caught_up']:
+                    break
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,847 @@
+import argparse
+import ast
+import json
+import re
+import sys
+from datetime import datetime, timezone
+
+import psycopg2
+
+from videos import backfill_video_ids
+
+MIGRATION_LOCK_KEY = 7319004211
+PERMISSIONS_LOCK_KEY = 7319004213
+
+PARTITIONED_TABLES = {
+    'login_logs': 'attempt_time',
+    'video_views': 'view_time',
+}
+
+
+def create_base_tables(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            email TEXT PRIMARY KEY,
+            password TEXT NOT NULL,
+            permissions TEXT[] NOT NULL DEFAULT '{}',
+            last_login TIMESTAMPTZ
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS courses (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            topics TEXT
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS lessons (
+            course_id TEXT NOT NULL REFERENCES courses(id) ON DELETE CASCADE,
+            lesson_number INTEGER NOT NULL,
+            video_url TEXT,
+            pdf_url TEXT,
+            PRIMARY KEY (course_id, lesson_number)
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS quiz (
+            id SERIAL PRIMARY KEY,
+            course_id TEXT NOT NULL,
+            lesson_number INTEGER NOT NULL,
+            question_number INTEGER NOT NULL,
+            question TEXT NOT NULL,
+            answer TEXT NOT NULL
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS student_progress (
+            email TEXT NOT NULL,
+            course_id TEXT NOT NULL,
+            completed_lessons INTEGER[] NOT NULL DEFAULT '{}',
+            current_lesson INTEGER NOT NULL DEFAULT 1,
+            PRIMARY KEY (email, course_id)
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS active_sessions (
+            session_id SERIAL PRIMARY KEY,
+            email TEXT NOT NULL,
+            last_activity TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS login_logs (
+            id BIGSERIAL,
+            email TEXT,
+            success BOOLEAN NOT NULL,
+            ip_address TEXT,
+            attempt_time TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS lesson_likes (
+            id SERIAL PRIMARY KEY,
+            course_id TEXT NOT NULL,
+            lesson_number INTEGER NOT NULL,
+            email TEXT NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS lesson_feedback (
+            id SERIAL PRIMARY KEY,
+            course_id TEXT NOT NULL,
+            lesson_number INTEGER NOT NULL DEFAULT 0,
+            email TEXT NOT NULL,
+            feedback_text TEXT NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS video_views (
+            id BIGSERIAL,
+            email TEXT NOT NULL,
+            course_id TEXT NOT NULL,
+            lesson_number INTEGER NOT NULL,
+            view_time TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+    """)
+    cur.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS last_login TIMESTAMPTZ")
+    cur.execute("ALTER TABLE lesson_likes ADD COLUMN IF NOT EXISTS created_at TIMESTAMPTZ DEFAULT NOW()")
+    cur.execute("ALTER TABLE lesson_feedback ADD COLUMN IF NOT EXISTS created_at TIMESTAMPTZ DEFAULT NOW()")
+
+
+def create_like_counters(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS lesson_like_counts (
+            course_id TEXT NOT NULL,
+            lesson_number INTEGER NOT NULL,
+            total_likes INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (course_id, lesson_number)
+        )
+    """)
+    cur.execute("LOCK TABLE lesson_likes IN SHARE ROW EXCLUSIVE MODE")
+    cur.execute("""
+        DELETE FROM lesson_likes a
+        USING lesson_likes b
+        WHERE a.course_id = b.course_id
+        AND a.lesson_number = b.lesson_number
+        AND a.email = b.email
+        AND a.ctid > b.ctid
+    """)
+    cur.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS lesson_likes_lesson_email_key
+        ON lesson_likes (course_id, lesson_number, email)
+    """)
+    rebuild_like_counts(cur)
+
+
+def rebuild_like_counts(cur):
+    cur.execute("""
+        INSERT INTO lesson_like_counts (course_id, lesson_number, total_likes)
+        SELECT course_id, lesson_number, COUNT(*)
+        FROM lesson_likes
+        GROUP BY course_id, lesson_number
+        ON CONFLICT (course_id, lesson_number) DO UPDATE
+        SET total_likes = EXCLUDED.total_likes
+    """)
+    cur.execute("""
+        UPDATE lesson_like_counts c
+        SET total_likes = 0
+        WHERE total_likes <> 0
+        AND NOT EXISTS (
+            SELECT 1 FROM lesson_likes l
+            WHERE l.course_id = c.course_id
+            AND l.lesson_number = c.lesson_number
+        )
+    """)
+
+
+def month_start(value, offset=0):
+    months = value.year * 12 + value.month - 1 + offset
+    return datetime(months // 12, months % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_name(table, start):
+    return f'{table}_y{start.year:04d}m{start.month:02d}'
+
+
+def is_partitioned(cur, table):
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+    row = cur.fetchone()
+    return bool(row) and row[0] == 'p'
+
+
+def create_month_partition(cur, table, column, start):
+    name = partition_name(table, start)
+    cur.execute("SELECT to_regclass(%s)", (name,))
+    if cur.fetchone()[0]:
+        return False
+    end = month_start(start, 1)
+    cur.execute(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS)")
+    cur.execute(f"""
+        WITH moved AS (
+            DELETE FROM {table}_default
+            WHERE {column} >= %s AND {column} < %s
+            RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved
+    """, (start, end))
+    cur.execute(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)", (start, end))
+    return True
+
+
+def partition_by_month(cur, table, column, months_ahead=3):
+    if is_partitioned(cur, table):
+        return
+    legacy = f'{table}_unpartitioned'
+    cur.execute(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE")
+    cur.execute(f"ALTER TABLE {table} RENAME TO {legacy}")
+    cur.execute(f"""
+        CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS)
+        PARTITION BY RANGE ({column})
+    """)
+    cur.execute("""
+        SELECT a.attname, pg_get_serial_sequence(%s, a.attname)
+        FROM pg_attribute a
+        WHERE a.attrelid = %s::regclass AND a.attnum > 0 AND NOT a.attisdropped
+    """, (legacy, legacy))
+    for column_name, sequence in cur.fetchall():
+        if sequence:
+            cur.execute(f"ALTER SEQUENCE {sequence} OWNED BY {table}.{column_name}")
+    cur.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+
+    cur.execute(f"SELECT MIN({column}) FROM {legacy}")
+    oldest = cur.fetchone()[0]
+    now = datetime.now(timezone.utc)
+    start = month_start(oldest or now)
+    while start <= month_start(now, months_ahead):
+        create_month_partition(cur, table, column, start)
+        start = month_start(start, 1)
+    cur.execute(f"INSERT INTO {table} SELECT * FROM {legacy}")
+    cur.execute(f"DROP TABLE {legacy}")
+
+
+def partition_event_tables(cur):
+    for table, column in PARTITIONED_TABLES.items():
+        partition_by_month(cur, table, column)
+
+
+def create_indexes(cur):
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS login_logs_failed_email_idx
+        ON login_logs (email, attempt_time) WHERE success = false
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS login_logs_failed_ip_idx
+        ON login_logs (ip_address, attempt_time) WHERE success = false
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS login_logs_failed_time_idx
+        ON login_logs (attempt_time) WHERE success = false
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS active_sessions_email_idx
+        ON active_sessions (email, last_activity)
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS active_sessions_last_activity_idx
+        ON active_sessions (last_activity)
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS quiz_lesson_idx
+        ON quiz (course_id, lesson_number, question_number)
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS lesson_feedback_lesson_idx
+        ON lesson_feedback (course_id, lesson_number, created_at DESC)
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS lesson_feedback_created_idx
+        ON lesson_feedback (created_at DESC)
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS video_views_lesson_idx
+        ON video_views (course_id, lesson_number, view_time)
+    """)
+    cur.execute("ANALYZE")
+
+
+def create_lesson_completions(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS lesson_completions (
+            email TEXT NOT NULL,
+            course_id TEXT NOT NULL,
+            lesson_number INTEGER NOT NULL,
+            completed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (email, course_id, lesson_number)
+        )
+    """)
+    cur.execute("""
+        ALTER TABLE student_progress
+        ADD COLUMN IF NOT EXISTS completed_count INTEGER NOT NULL DEFAULT 0
+    """)
+    cur.execute("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'student_progress' AND column_name = 'completed_lessons'
+    """)
+    if cur.fetchone():
+        cur.execute("LOCK TABLE student_progress IN SHARE ROW EXCLUSIVE MODE")
+        cur.execute("""
+            INSERT INTO lesson_completions (email, course_id, lesson_number)
+            SELECT DISTINCT sp.email, sp.course_id, done.lesson_number
+            FROM student_progress sp, unnest(sp.completed_lessons) AS done(lesson_number)
+            WHERE done.lesson_number IS NOT NULL
+            ON CONFLICT DO NOTHING
+        """)
+        cur.execute("ALTER TABLE student_progress DROP COLUMN completed_lessons")
+    cur.execute("""
+        UPDATE student_progress sp
+        SET completed_count = (
+            SELECT COUNT(*) FROM lesson_completions c
+            WHERE c.email = sp.email AND c.course_id = sp.course_id
+        )
+    """)
+
+
+def create_progress_rollups(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS course_stats (
+            course_id TEXT PRIMARY KEY REFERENCES courses(id) ON DELETE CASCADE,
+            total_lessons INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+    """)
+    cur.execute("ALTER TABLE student_progress ADD COLUMN IF NOT EXISTS last_activity TIMESTAMPTZ")
+    rebuild_progress_rollups(cur)
+
+
+def rebuild_progress_rollups(cur):
+    cur.execute("""
+        INSERT INTO course_stats (course_id, total_lessons)
+        SELECT c.id, COUNT(l.lesson_number)
+        FROM courses c
+        LEFT JOIN lessons l ON l.course_id = c.id
+        GROUP BY c.id
+        ON CONFLICT (course_id) DO UPDATE
+        SET total_lessons = EXCLUDED.total_lessons,
+            updated_at = NOW()
+    """)
+    courses = cur.rowcount
+    cur.execute("""
+        UPDATE student_progress sp
+        SET completed_count = done.completed,
+            last_activity = GREATEST(sp.last_activity, done.last_completed)
+        FROM (
+            SELECT p.email, p.course_id,
+                   COUNT(l.lesson_number) AS completed,
+                   MAX(c.completed_at) AS last_completed
+            FROM student_progress p
+            LEFT JOIN lesson_completions c
+                ON c.email = p.email AND c.course_id = p.course_id
+            LEFT JOIN lessons l
+                ON l.course_id = c.course_id AND l.lesson_number = c.lesson_number
+            GROUP BY p.email, p.course_id
+        ) done
+        WHERE sp.email = done.email AND sp.course_id = done.course_id
+    """)
+    return courses, cur.rowcount
+
+
+def create_quiz_attempts(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS quiz_attempts (
+            id BIGSERIAL PRIMARY KEY,
+            email TEXT NOT NULL,
+            course_id TEXT NOT NULL,
+            lesson_number INTEGER NOT NULL,
+            question_numbers INTEGER[] NOT NULL,
+            results BOOLEAN[] NOT NULL,
+            correct_count INTEGER NOT NULL,
+            passed BOOLEAN NOT NULL,
+            attempted_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS quiz_attempts_lesson_idx
+        ON quiz_attempts (course_id, lesson_number, attempted_at)
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS quiz_attempts_email_idx
+        ON quiz_attempts (email, course_id, lesson_number)
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS quiz_question_stats (
+            course_id TEXT NOT NULL,
+            lesson_number INTEGER NOT NULL,
+            question_number INTEGER NOT NULL,
+            attempts BIGINT NOT NULL DEFAULT 0,
+            correct BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (course_id, lesson_number, question_number)
+        )
+    """)
+
+
+def create_quiz_question_key(cur):
+    cur.execute("LOCK TABLE quiz IN SHARE ROW EXCLUSIVE MODE")
+    cur.execute("""
+        DELETE FROM quiz a
+        USING quiz b
+        WHERE a.course_id = b.course_id
+        AND a.lesson_number = b.lesson_number
+        AND a.question_number = b.question_number
+        AND a.ctid < b.ctid
+    """)
+    cur.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS quiz_lesson_question_key
+        ON quiz (course_id, lesson_number, question_number)
+    """)
+    cur.execute("DROP INDEX IF EXISTS quiz_lesson_idx")
+
+
+def create_feedback_keyset_indexes(cur):
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS lesson_feedback_course_page_idx
+        ON lesson_feedback (course_id, lesson_number, created_at DESC, id DESC)
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS lesson_feedback_page_idx
+        ON lesson_feedback (created_at DESC, id DESC) WHERE lesson_number = 0
+    """)
+    cur.execute("DROP INDEX IF EXISTS lesson_feedback_lesson_idx")
+    cur.execute("DROP INDEX IF EXISTS lesson_feedback_created_idx")
+
+
+def create_search_vectors(cur):
+    cur.execute("""
+        ALTER TABLE courses ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('portuguese', coalesce(name, '')), 'A') ||
+            setweight(to_tsvector('portuguese', coalesce(topics, '')), 'B')
+        ) STORED
+    """)
+    cur.execute("""
+        ALTER TABLE quiz ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (to_tsvector('portuguese', coalesce(question, ''))) STORED
+    """)
+    cur.execute("""
+        ALTER TABLE lesson_feedback ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (to_tsvector('portuguese', coalesce(feedback_text, ''))) STORED
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS courses_search_idx ON courses USING GIN (search_vector)")
+    cur.execute("CREATE INDEX IF NOT EXISTS quiz_search_idx ON quiz USING GIN (search_vector)")
+    cur.execute("CREATE INDEX IF NOT EXISTS lesson_feedback_search_idx ON lesson_feedback USING GIN (search_vector)")
+
+
+def create_metrics_rollups(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS metrics_watermarks (
+            source TEXT PRIMARY KEY,
+            processed_until TIMESTAMPTZ,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS metrics_sessions_hourly (
+            bucket TIMESTAMPTZ PRIMARY KEY,
+            samples INTEGER NOT NULL DEFAULT 0,
+            total_sessions BIGINT NOT NULL DEFAULT 0,
+            peak_sessions INTEGER NOT NULL DEFAULT 0,
+            peak_users INTEGER NOT NULL DEFAULT 0,
+            last_sessions INTEGER NOT NULL DEFAULT 0,
+            last_users INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS metrics_login_hourly (
+            bucket TIMESTAMPTZ PRIMARY KEY,
+            successes BIGINT NOT NULL DEFAULT 0,
+            failures BIGINT NOT NULL DEFAULT 0
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS metrics_video_views_hourly (
+            course_id TEXT NOT NULL,
+            bucket TIMESTAMPTZ NOT NULL,
+            lesson_number INTEGER NOT NULL,
+            views BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (course_id, bucket, lesson_number)
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS metrics_lesson_viewers (
+            course_id TEXT NOT NULL,
+            lesson_number INTEGER NOT NULL,
+            email TEXT NOT NULL,
+            first_view TIMESTAMPTZ NOT NULL,
+            PRIMARY KEY (course_id, lesson_number, email)
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS metrics_lesson_reach (
+            course_id TEXT NOT NULL,
+            lesson_number INTEGER NOT NULL,
+            viewers BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (course_id, lesson_number)
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS metrics_lesson_reach_daily (
+            course_id TEXT NOT NULL,
+            bucket TIMESTAMPTZ NOT NULL,
+            lesson_number INTEGER NOT NULL,
+            viewers BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (course_id, bucket, lesson_number)
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS login_logs_time_idx ON login_logs (attempt_time)")
+    cur.execute("CREATE INDEX IF NOT EXISTS video_views_time_idx ON video_views (view_time)")
+    cur.execute("""
+        INSERT INTO metrics_watermarks (source)
+        VALUES ('login_logs'), ('video_views')
+        ON CONFLICT (source) DO NOTHING
+    """)
+
+
+def create_user_access_indexes(cur):
+    cur.execute("UPDATE users SET permissions = '{}' WHERE permissions IS NULL")
+    cur.execute("ALTER TABLE users ALTER COLUMN permissions SET DEFAULT '{}', ALTER COLUMN permissions SET NOT NULL")
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS users_email_lower_idx
+        ON users ((lower(email) COLLATE "C"))
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS users_permissions_idx ON users USING GIN (permissions)")
+
+
+def create_permissions_version(cur):
+    cur.execute("CREATE SEQUENCE IF NOT EXISTS users_permissions_version_seq")
+    cur.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS permissions_version BIGINT NOT NULL DEFAULT 0")
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS users_permissions_version_idx
+        ON users (permissions_version)
+    """)
+
+
+def create_video_metadata(cur):
+    cur.execute("ALTER TABLE lessons ADD COLUMN IF NOT EXISTS video_id TEXT")
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS video_metadata (
+            video_id TEXT PRIMARY KEY,
+            provider TEXT NOT NULL,
+            title TEXT,
+            thumbnail_url TEXT,
+            duration_seconds INTEGER,
+            available BOOLEAN NOT NULL DEFAULT TRUE,
+            fetched_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+    """)
+    backfill_video_ids(cur)
+
+
+def create_catalog_version(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS catalog_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version BIGINT NOT NULL DEFAULT 0
+        )
+    """)
+    cur.execute("INSERT INTO catalog_version (id, version) VALUES (1, 0) ON CONFLICT (id) DO NOTHING")
+
+
+MIGRATIONS = [
+    (1, 'tabelas base', create_base_tables),
+    (2, 'contadores de curtidas', create_like_counters),
+    (3, 'particionamento mensal de login_logs e video_views', partition_event_tables),
+    (4, 'índices das consultas frequentes', create_indexes),
+    (5, 'conclusões por aula em lesson_completions', create_lesson_completions),
+    (6, 'totais de progresso por aluno e curso', create_progress_rollups),
+    (7, 'tentativas de quiz e dificuldade por questão', create_quiz_attempts),
+    (8, 'chave única das questões do quiz', create_quiz_question_key),
+    (9, 'índices de paginação das avaliações', create_feedback_keyset_indexes),
+    (10, 'busca textual em cursos, aulas e avaliações', create_search_vectors),
+    (11, 'métricas agregadas do monitoramento', create_metrics_rollups),
+    (12, 'índices de busca de alunos e de permissões', create_user_access_indexes),
+    (13, 'versão das permissões de cada usuário', create_permissions_version),
+    (14, 'id do vídeo normalizado e metadados dos vídeos', create_video_metadata),
+    (15, 'versão do catálogo compartilhada entre processos', create_catalog_version),
+]
+
+
+OFFLINE_MIGRATIONS = {
+    2: ('lesson_likes',),
+    3: ('login_logs', 'video_views'),
+    5: ('student_progress',),
+    6: ('student_progress',),
+    8: ('quiz',),
+    10: ('courses', 'quiz', 'lesson_feedback'),
+    12: ('users',),
+    14: ('lessons',),
+}
+
+
+class OfflineMigrationsPending(RuntimeError):
+    pass
+
+
+def applied_versions(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+    """)
+    cur.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cur.fetchall()}
+
+
+def large_tables(cur, tables, max_rows):
+    large = []
+    for table in tables:
+        cur.execute("SELECT to_regclass(%s)", (table,))
+        if cur.fetchone()[0] is None:
+            continue
+        cur.execute(f"SELECT COUNT(*) FROM (SELECT 1 FROM {table} LIMIT %s) t", (max_rows,))
+        if cur.fetchone()[0] >= max_rows:
+            large.append(table)
+    return large
+
+
+def migrate(conn, target=None, max_online_rows=None):
+    applied = []
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+        try:
+            done = applied_versions(cur)
+            conn.commit()
+            if max_online_rows is not None:
+                pending = [
+                    version for version, _, _ in MIGRATIONS
+                    if version not in done and (target is None or version <= target)
+                ]
+                heavy = {
+                    version: large_tables(cur, OFFLINE_MIGRATIONS[version], max_online_rows)
+                    for version in pending if version in OFFLINE_MIGRATIONS
+                }
+                conn.commit()
+                heavy = {version: tables for version, tables in heavy.items() if tables}
+                if heavy:
+                    raise OfflineMigrationsPending(
+                        f"Migrações {sorted(heavy)} reescrevem tabelas com {max_online_rows} linhas ou mais "
+                        f"({', '.join(sorted({t for tables in heavy.values() for t in tables}))}); "
+                        "rode `python migrations.py --dsn ... migrate` fora do horário de uso"
+                    )
+            for version, name, apply in MIGRATIONS:
+                if version in done or (target is not None and version > target):
+                    continue
+                apply(cur)
+                cur.execute(
+                    "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                    (version, name)
+                )
+                conn.commit()
+                applied.append(version)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+            conn.commit()
+    return applied
+
+
+def maintain_partitions(conn, retention=None, months_ahead=3):
+    retention = retention or {}
+    created, dropped = [], []
+    now = datetime.now(timezone.utc)
+    with conn.cursor() as cur:
+        for table, column in PARTITIONED_TABLES.items():
+            if not is_partitioned(cur, table):
+                continue
+            for offset in range(months_ahead + 1):
+                start = month_start(now, offset)
+                if create_month_partition(cur, table, column, start):
+                    created.append(partition_name(table, start))
+
+            months = retention.get(table)
+            if not months:
+                continue
+            cutoff = partition_name(table, month_start(now, -months))
+            cur.execute("""
+                SELECT c.relname
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = %s::regclass
+                AND c.relname ~ %s
+                ORDER BY c.relname
+            """, (table, f'^{table}_y[0-9]{{4}}m[0-9]{{2}}$'))
+            for (name,) in cur.fetchall():
+                if name < cutoff:
+                    cur.execute(f"DROP TABLE {name}")
+                    dropped.append(name)
+        conn.commit()
+    return created, dropped
+
+
+SQL_START = re.compile(r'^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\s')
+NAMED_PARAM = re.compile(r'%\((\w+)\)s')
+FORMAT_FIELD = re.compile(r'\{\w+\}')
+
+
+def scan_queries(path):
+    with open(path, encoding='utf-8') as source:
+        tree = ast.parse(source.read(), filename=path)
+    static, dynamic, nested = [], [], set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.JoinedStr):
+            nested.update(id(child) for child in ast.walk(node) if child is not node)
+            template = ''.join(
+                value.value if isinstance(value, ast.Constant) else '{...}' for value in node.values
+            )
+            if SQL_START.match(template):
+                dynamic.append((node.lineno, template))
+    for node in ast.walk(tree):
+        if (isinstance(node, ast.Constant) and isinstance(node.value, str) and id(node) not in nested
+                and SQL_START.match(node.value)):
+            (dynamic if FORMAT_FIELD.search(node.value) else static).append((node.lineno, node.value))
+    return sorted(static), sorted(dynamic)
+
+
+def extract_queries(path):
+    return scan_queries(path)[0]
+
+
+def extract_dynamic_queries(path):
+    return scan_queries(path)[1]
+
+
+def to_prepared(sql):
+    names = {}
+
+    def named(match):
+        names.setdefault(match.group(1), len(names) + 1)
+        return f'${names[match.group(1)]}'
+
+    sql = NAMED_PARAM.sub(named, sql)
+    count = len(names)
+    parts = sql.split('%s')
+    sql = parts[0]
+    for part in parts[1:]:
+        count += 1
+        sql += f'${count}' + part
+    return sql.replace('%%', '%'), count
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+def explain_query(cur, sql):
+    prepared, count = to_prepared(sql)
+    cur.execute("SAVEPOINT explain_query")
+    try:
+        cur.execute(f"PREPARE explain_target AS {prepared}")
+        args = f"({', '.join(['NULL'] * count)})" if count else ''
+        cur.execute(f"EXPLAIN (FORMAT JSON) EXECUTE explain_target{args}")
+        plan = cur.fetchone()[0][0]['Plan']
+        cur.execute("DEALLOCATE explain_target")
+        cur.execute("RELEASE SAVEPOINT explain_query")
+    except psycopg2.Error:
+        cur.execute("ROLLBACK TO SAVEPOINT explain_query")
+        raise
+    return plan
+
+
+def explain_all(conn, path):
+    report = []
+    with conn.cursor() as cur:
+        cur.execute("SET plan_cache_mode = force_generic_plan")
+        cur.execute("SET enable_seqscan = off")
+        for lineno, sql in extract_dynamic_queries(path):
+            report.append({'line': lineno, 'sql': ' '.join(sql.split())[:90], 'status': 'unchecked',
+                           'detail': 'SQL montado no código'})
+        for lineno, sql in extract_queries(path):
+            summary = ' '.join(sql.split())[:90]
+            if re.search(r'VALUES\s+%s', sql):
+                report.append({'line': lineno, 'sql': summary, 'status': 'skipped', 'detail': 'execute_values'})
+                continue
+            try:
+                plan = explain_query(cur, sql)
+            except psycopg2.Error as e:
+                report.append({'line': lineno, 'sql': summary, 'status': 'error',
+                               'detail': str(e).strip().splitlines()[0]})
+                continue
+            scans = [node for node in plan_nodes(plan) if node['Node Type'] == 'Seq Scan']
+            filtered = sorted({node['Relation Name'] for node in scans if 'Filter' in node})
+            full = sorted({node['Relation Name'] for node in scans if 'Filter' not in node})
+            if filtered:
+                status, detail = 'seq_scan', ', '.join(filtered)
+            elif full:
+                status, detail = 'full_read', ', '.join(full)
+            else:
+                status, detail = 'ok', ''
+            report.append({'line': lineno, 'sql': summary, 'status': status, 'detail': detail,
+                           'cost': plan['Total Cost']})
+    conn.rollback()
+    return sorted(report, key=lambda item: item['line'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrações do banco de dados do PLT.py")
+    parser.add_argument('--dsn', required=True)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    upgrade = sub.add_parser('migrate', help="aplica as migrações pendentes")
+    upgrade.add_argument('--target', type=int)
+    sub.add_parser('status', help="lista as migrações aplicadas e pendentes")
+
+    maintain = sub.add_parser('maintain', help="cria partições futuras e remove as fora da retenção")
+    maintain.add_argument('--login-logs-months', type=int, default=12)
+    maintain.add_argument('--video-views-months', type=int, default=24)
+
+    sub.add_parser('backfill-progress', help="recalcula course_stats e o progresso de cada aluno a partir das conclusões")
+
+    explain = sub.add_parser('explain', help="EXPLAIN de cada consulta do PLT.py; aponta Seq Scan com filtro")
+    explain.add_argument('--file', default='PLT.py')
+    explain.add_argument('--json', action='store_true')
+
+    args = parser.parse_args()
+    conn = psycopg2.connect(args.dsn)
+    try:
+        if args.command == 'migrate':
+            applied = migrate(conn, args.target)
+            print(f"Aplicadas: {applied}" if applied else "Nada a aplicar")
+        elif args.command == 'status':
+            with conn.cursor() as cur:
+                done = applied_versions(cur)
+            conn.commit()
+            for version, name, _ in MIGRATIONS:
+                print(f"{version:>4} {'aplicada' if version in done else 'pendente':<9} {name}")
+        elif args.command == 'maintain':
+            created, dropped = maintain_partitions(conn, {
+                'login_logs': args.login_logs_months,
+                'video_views': args.video_views_months,
+            })
+            print(f"Criadas: {created}\nRemovidas: {dropped}")
+        elif args.command == 'backfill-progress':
+            with conn.cursor() as cur:
+                courses, students = rebuild_progress_rollups(cur)
+            conn.commit()
+            print(f"Cursos: {courses}\nProgresso de alunos: {students}")
+        elif args.command == 'explain':
+            report = explain_all(conn, args.file)
+            if args.json:
+                print(json.dumps(report, indent=2))
+            else:
+                for item in report:
+                    print(f"{item['status']:<9} PLT.py:{item['line']:<5} {item['detail']:<28} {item['sql']}")
+            if any(item['status'] == 'seq_scan' for item in report):
+                sys.exit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+import os
+import sys
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import PLT  # noqa: E402
+import migrations  # noqa: E402
+
+
+@contextmanager
+def temporary_database(suffix):
+    server = os.environ.get('PLT_TEST_DSN', 'postgresql://postgres@localhost/postgres')
+    try:
+        admin = psycopg2.connect(server)
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"Postgres indisponível em PLT_TEST_DSN: {e}")
+    admin.autocommit = True
+    name = f'plt_test_{os.getpid()}_{suffix}'
+    with admin.cursor() as cur:
+        cur.execute(f"CREATE DATABASE {name} ENCODING 'UTF8' TEMPLATE template0")
+    try:
+        yield psycopg2.extensions.make_dsn(server, dbname=name)
+    finally:
+        with admin.cursor() as cur:
+            cur.execute(f"DROP DATABASE IF EXISTS {name} WITH (FORCE)")
+        admin.close()
+
+
+@pytest.fixture(scope='session')
+def database():
+    with temporary_database('app') as dsn:
+        conn = psycopg2.connect(dsn)
+        migrations.migrate(conn)
+        conn.close()
+        yield dsn
+
+
+@pytest.fixture
+def empty_database():
+    with temporary_database('empty') as dsn:
+        conn = psycopg2.connect(dsn)
+        yield conn
+        conn.close()
+
+
+@pytest.fixture
+def pool(database, monkeypatch):
+    pool = PLT.ConnectionPool(lambda: psycopg2.connect(database), minconn=1, maxconn=8, timeout=30)
+    monkeypatch.setattr(PLT, 'get_pool', lambda: pool)
+    yield pool
+    pool.closeall()
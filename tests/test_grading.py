@@ -0,0 +1,71 @@
+import pytest
+
+import PLT
+
+
+def grade(answer, response):
+    key = PLT.AnswerKey([{'question_number': 1, 'question': 'Pergunta', 'answer': answer}])
+    return key.grade([response])[0]
+
+
+@pytest.mark.parametrize('answer, response', [
+    ('função', 'funcao'),
+    ('Função', 'FUNÇÃO'),
+    ('funcao', 'função'),
+    ('ação e reação', '  acao   e\treacao '),
+    ('São Paulo', 'sao paulo'),
+    ('ﬁm', 'fim'),
+])
+def test_accents_case_and_spacing_are_folded(answer, response):
+    assert grade(answer, response)
+
+
+@pytest.mark.parametrize('answer, response, expected', [
+    ('Python|py', 'PY', True),
+    ('Python|py', 'python', True),
+    ('Python|py', 'pyton', False),
+    ('10 | dez', 'Dez', True),
+    ('10 | dez', '10,0', True),
+    ('10 | dez', 'onze', False),
+])
+def test_alternatives(answer, response, expected):
+    assert grade(answer, response) is expected
+
+
+@pytest.mark.parametrize('answer, response, expected', [
+    ('3,14 ~ 0,01', '3.14159', True),
+    ('3,14 ~ 0,01', '3,13', True),
+    ('3,14 ~ 0,01', '3,16', False),
+    ('3.14±0.01', '3,135', True),
+    ('3.14 +/- 0.01', '3.2', False),
+    ('42', '42.0', True),
+    ('42', ' 42 ', True),
+    ('42', '42,5', False),
+    ('-7', '-7', True),
+    ('-7', '7', False),
+    ('42', '42 ~ 100', False),
+])
+def test_numeric_tolerance(answer, response, expected):
+    assert grade(answer, response) is expected
+
+
+@pytest.mark.parametrize('answer, response', [
+    ('coração', 'coracao!'),
+    ('resposta', ''),
+    ('resposta', None),
+    ('1/2', '0.5'),
+    ('', ''),
+    ('Python', 'Java'),
+])
+def test_wrong_answers(answer, response):
+    assert not grade(answer, response)
+
+
+def test_key_grades_each_question_and_shows_the_first_alternative():
+    key = PLT.AnswerKey([
+        {'question_number': 1, 'question': 'Linguagem?', 'answer': ' Python | py '},
+        {'question_number': 2, 'question': 'Pi?', 'answer': '3,14 ~ 0,01'},
+    ])
+    assert len(key) == 2
+    assert key.display(0) == 'Python'
+    assert key.grade(['py', '3.1']) == [True, False]
@@ -0,0 +1,41 @@
+import threading
+
+import PLT
+
+
+def like_totals(course_id, lesson_number):
+    with PLT.get_db_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT (SELECT COUNT(*) FROM lesson_likes
+                    WHERE course_id = %s AND lesson_number = %s),
+                   (SELECT total_likes FROM lesson_like_counts
+                    WHERE course_id = %s AND lesson_number = %s)
+        """, (course_id, lesson_number, course_id, lesson_number))
+        return cur.fetchone()
+
+
+def test_toggle_like_updates_counter(pool):
+    assert PLT.toggle_like('likes-a', 1, 'a@email.com') == (True, 1)
+    assert PLT.toggle_like('likes-a', 1, 'b@email.com') == (True, 2)
+    assert PLT.toggle_like('likes-a', 1, 'a@email.com') == (False, 1)
+    assert like_totals('likes-a', 1) == (1, 1)
+
+
+def test_concurrent_toggles_keep_counter_equal_to_likes(pool):
+    emails = [f'concorrente{n}@email.com' for n in range(5)]
+    errors = []
+
+    def worker(seed):
+        for n in range(100):
+            if PLT.toggle_like('likes-b', 1, emails[(seed * 7 + n) % len(emails)]) is None:
+                errors.append(seed)
+
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    actual, counter = like_totals('likes-b', 1)
+    assert counter == actual
@@ -0,0 +1,42 @@
+import psycopg2
+import pytest
+
+import migrations
+
+
+def test_app_refuses_heavy_migrations_on_large_tables(empty_database):
+    conn = empty_database
+    assert migrations.migrate(conn, target=2) == [1, 2]
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO login_logs (email, success, ip_address)
+            SELECT 'aluno' || g || '@email.com', false, '10.0.0.1'
+            FROM generate_series(1, 50) g
+        """)
+    conn.commit()
+
+    with pytest.raises(migrations.OfflineMigrationsPending, match='login_logs'):
+        migrations.migrate(conn, max_online_rows=50)
+    with conn.cursor() as cur:
+        assert migrations.applied_versions(cur) == {1, 2}
+    conn.commit()
+
+    applied = migrations.migrate(conn, max_online_rows=51)
+    assert applied[0] == 3 and applied[-1] == migrations.MIGRATIONS[-1][0]
+
+
+def test_legacy_users_get_permissions_default_and_not_null(empty_database):
+    conn = empty_database
+    with conn.cursor() as cur:
+        cur.execute("CREATE TABLE users (email TEXT PRIMARY KEY, password TEXT NOT NULL, permissions TEXT[])")
+        cur.execute("INSERT INTO users (email, password) VALUES ('antigo@email.com', 'x')")
+    conn.commit()
+
+    migrations.migrate(conn)
+    with conn.cursor() as cur:
+        cur.execute("INSERT INTO users (email, password) VALUES ('novo@email.com', 'x')")
+        cur.execute("SELECT email, permissions FROM users ORDER BY email")
+        assert cur.fetchall() == [('antigo@email.com', []), ('novo@email.com', [])]
+        with pytest.raises(psycopg2.errors.NotNullViolation):
+            cur.execute("INSERT INTO users (email, password, permissions) VALUES ('nulo@email.com', 'x', NULL)")
+    conn.rollback()
@@ -0,0 +1,110 @@
+import re
+import threading
+
+import pytest
+
+import PLT
+
+
+SAMPLE_LINE = re.compile(r'^[a-z_]+(\{[a-z_]+="[^"]*"(,[a-z_]+="[^"]*")*\})? -?[0-9.]+$')
+
+
+@pytest.mark.parametrize('first, second', [
+    ("SELECT * FROM users WHERE email = 'a@email.com'",
+     "SELECT * FROM users WHERE email = 'o''neil@email.com'"),
+    ("SELECT * FROM lessons WHERE course_id = %s AND lesson_number = %s",
+     "SELECT * FROM lessons WHERE course_id = %(course)s AND lesson_number = 12"),
+    ("SELECT * FROM quiz WHERE lesson_number = ANY(ARRAY[1, 2, 3])",
+     "SELECT * FROM quiz WHERE lesson_number = ANY(ARRAY[7])"),
+    ("INSERT INTO video_views (email, lesson_number) VALUES ('a', 1)",
+     "INSERT INTO video_views (email, lesson_number) VALUES ('a', 1), ('b', 2),\n  ('c', 3)"),
+    (b"SELECT 1.5,  42\n FROM courses", "SELECT 7, 0.25 FROM courses"),
+])
+def test_literals_map_to_one_fingerprint(first, second):
+    assert PLT.query_fingerprint(first) == PLT.query_fingerprint(second)
+
+
+def test_fingerprint_keeps_statement_shape():
+    assert PLT.query_fingerprint(
+        "INSERT INTO t (a, b) VALUES (%s, 'x'), (2, now()) ON CONFLICT (a) DO NOTHING"
+    ) == "INSERT INTO t (a, b) VALUES (...) ON CONFLICT (a) DO NOTHING"
+    assert PLT.query_fingerprint("SELECT * FROM users WHERE email = %s") != \
+        PLT.query_fingerprint("SELECT * FROM courses WHERE id = %s")
+
+
+def test_rerun_totals_cover_only_the_current_rerun():
+    profiler = PLT.QueryProfiler(slow_threshold=10)
+    profiler.record("SELECT 1", None, 0.5, 1)
+    assert profiler.end_rerun() is None
+
+    profiler.begin_rerun()
+    profiler.record("SELECT * FROM users WHERE email = %s", ('a@email.com',), 0.002, 1)
+    profiler.record("SELECT * FROM users WHERE email = %s", ('b@email.com',), 0.003, 0)
+    other = threading.Thread(target=profiler.record, args=("SELECT 2", None, 1.0, 1))
+    other.start()
+    other.join()
+    profiler.record("UPDATE users SET last_login = now() WHERE email = %s", ('a@email.com',), 0.005, 1)
+    summary = profiler.end_rerun('show_courses')
+
+    assert summary['label'] == 'show_courses'
+    assert summary['statements'] == 3
+    assert summary['db_ms'] == pytest.approx(10.0)
+    assert summary['elapsed_ms'] >= 0
+    assert [entry['rows'] for entry in summary['entries']] == [1, 0, 1]
+    assert len({entry['query'] for entry in summary['entries']}) == 2
+    assert profiler.end_rerun() is None
+    assert [run['statements'] for run in profiler.recent_reruns()] == [3]
+
+
+def test_rerun_attributes_statements_to_app_functions(database, monkeypatch):
+    profiler = PLT.QueryProfiler(slow_threshold=10)
+    pool = PLT.ConnectionPool(lambda: PLT.connect_profiled({'dsn': database}, profiler), minconn=1, maxconn=2, timeout=30)
+    monkeypatch.setattr(PLT, 'get_pool', lambda: pool)
+    try:
+        profiler.begin_rerun()
+        assert PLT.toggle_like('profiler', 1, 'a@email.com') == (True, 1)
+        summary = profiler.end_rerun()
+    finally:
+        pool.closeall()
+    assert summary['statements'] >= 1
+    assert {entry['function'] for entry in summary['entries']} == {'toggle_like'}
+    assert summary['db_ms'] == pytest.approx(sum(entry['ms'] for entry in summary['entries']))
+    assert any(run['statements'] == summary['statements'] for run in profiler.recent_reruns())
+
+
+def test_metrics_text_is_prometheus_exposition():
+    profiler = PLT.QueryProfiler(slow_threshold=10)
+    for duration, rows in ((0.003, 1), (0.02, 4), (3.0, 0)):
+        profiler.record("SELECT * FROM lessons WHERE course_id = %s", ('py101',), duration, rows)
+    profiler.register_gauges('plt_db_pool', lambda: {'open': 2, 'in_use': 1, 'healthy': True})
+    profiler.register_gauges('plt_broken', lambda: 1 / 0)
+
+    text = profiler.metrics_text()
+    lines = text.splitlines()
+    assert text.endswith("\n")
+    assert "# TYPE plt_db_query_seconds histogram" in lines
+    assert "# TYPE plt_db_query_rows_total counter" in lines
+    assert any(line.startswith("# HELP plt_db_query_seconds ") for line in lines)
+    for line in lines:
+        assert line.startswith('#') or SAMPLE_LINE.match(line), line
+
+    samples = dict(line.rsplit(' ', 1) for line in lines if not line.startswith('#'))
+    query_id = next(iter(profiler._statements))
+    labels = f'query="{query_id}",function="-",page="-"'
+    buckets = [float(samples[f'plt_db_query_seconds_bucket{{{labels},le="{bound}"}}'])
+               for bound in PLT.QUERY_HISTOGRAM_BUCKETS]
+    assert buckets == sorted(buckets)
+    assert buckets[PLT.QUERY_HISTOGRAM_BUCKETS.index(0.001)] == 0
+    assert buckets[PLT.QUERY_HISTOGRAM_BUCKETS.index(0.005)] == 1
+    assert buckets[PLT.QUERY_HISTOGRAM_BUCKETS.index(0.025)] == 2
+    assert buckets[-1] == 2
+    assert samples[f'plt_db_query_seconds_bucket{{{labels},le="+Inf"}}'] == '3'
+    assert samples[f'plt_db_query_seconds_count{{{labels}}}'] == '3'
+    assert float(samples[f'plt_db_query_seconds_sum{{{labels}}}']) == pytest.approx(3.023)
+    assert samples[f'plt_db_query_rows_total{{{labels}}}'] == '5'
+    assert f"# query {query_id}: SELECT * FROM lessons WHERE course_id = ?" in lines
+
+    assert samples['plt_db_pool_open'] == '2'
+    assert samples['plt_db_pool_in_use'] == '1'
+    assert "# TYPE plt_db_pool_open gauge" in lines
+    assert not any('healthy' in line or 'plt_broken' in line for line in lines)
@@ -0,0 +1,61 @@
+import time
+from contextlib import contextmanager, nullcontext
+
+import PLT
+
+
+class LoginLogs:
+    def __init__(self, rows):
+        self.rows = rows
+
+    @contextmanager
+    def connection(self):
+        yield self
+
+    def cursor(self):
+        return nullcontext(self)
+
+    def execute(self, sql, params):
+        start, window, cutoff = params
+        self.result = [row for row in self.rows if start - window < row[2] <= cutoff]
+
+    def fetchall(self):
+        return self.result
+
+
+def test_reconcile_does_not_count_an_attempt_twice():
+    now = time.time()
+    logs = LoginLogs([('aluno@email.com', '10.0.0.1', now - 10)])
+    limiter = PLT.LoginRateLimiter(logs.connection, max_attempts=5)
+    limiter.record_failure('aluno@email.com', '10.0.0.1', now - 10)
+    limiter.record_failure('aluno@email.com', '10.0.0.1', now + 5)
+    logs.rows.append(('aluno@email.com', '10.0.0.1', now + 5))
+
+    limiter.reconcile()
+
+    assert limiter.failures('aluno@email.com', '10.0.0.1') == 2
+
+
+def test_reconcile_loads_attempts_from_other_replicas():
+    now = time.time()
+    logs = LoginLogs([('aluno@email.com', '10.0.0.1', now - n) for n in range(1, 6)])
+    limiter = PLT.LoginRateLimiter(logs.connection, max_attempts=5)
+    limiter.reconcile()
+    assert limiter.is_blocked('Aluno@Email.com')
+    assert not limiter.is_blocked('outro@email.com')
+
+
+def test_ip_key_blocks_across_accounts():
+    limiter = PLT.LoginRateLimiter(LoginLogs([]).connection, max_attempts=3)
+    for n in range(3):
+        limiter.record_failure(f'conta{n}@email.com', '10.0.0.9')
+    assert limiter.is_blocked('nova@email.com', '10.0.0.9')
+    assert not limiter.is_blocked('nova@email.com', '10.0.0.10')
+    assert not limiter.is_blocked('nova@email.com', 'unknown')
+
+
+def test_client_ip_uses_the_address_added_by_the_proxy():
+    headers = {'X-Forwarded-For': '1.2.3.4, 10.0.0.7', 'X-Real-Ip': '10.0.0.8'}
+    assert PLT.client_ip(headers, 'X-Forwarded-For') == '10.0.0.7'
+    assert PLT.client_ip(headers, 'X-Real-Ip') == '10.0.0.8'
+    assert PLT.client_ip({}, 'X-Forwarded-For') == 'unknown'
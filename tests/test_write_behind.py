@@ -0,0 +1,83 @@
+from contextlib import contextmanager, nullcontext
+
+import pytest
+
+import PLT
+
+
+class FlakyDatabase:
+    def __init__(self, failures):
+        self.failures = dict(failures)
+        self.rows = {}
+
+    @contextmanager
+    def connection(self):
+        yield self
+
+    def cursor(self):
+        return nullcontext(self)
+
+    def commit(self):
+        pass
+
+    def execute_values(self, cur, table, rows, page_size=None):
+        if self.failures.get(table, 0):
+            self.failures[table] -= 1
+            raise RuntimeError(f"falha em {table}")
+        self.rows.setdefault(table, []).extend(rows)
+
+
+@pytest.fixture
+def database(monkeypatch):
+    def make(failures):
+        db = FlakyDatabase(failures)
+        monkeypatch.setattr(PLT, 'execute_values', db.execute_values)
+        writer = PLT.WriteBehindWriter(db.connection, {'video_views': 'video_views', 'quiz_attempts': 'quiz_attempts'},
+                                       flush_interval=3600, max_attempts=3)
+        return db, writer
+    return make
+
+
+def test_failed_table_does_not_drop_the_other(database):
+    db, writer = database({'video_views': 1})
+    try:
+        for n in range(3):
+            writer.submit('video_views', (n,))
+            writer.submit('quiz_attempts', (n,))
+        writer.flush()
+        assert db.rows == {'quiz_attempts': [(0,), (1,), (2,)]}
+        assert writer.stats()['pending'] == 3
+
+        writer.flush()
+        assert db.rows['video_views'] == [(0,), (1,), (2,)]
+        stats = writer.stats()
+        assert stats['written'] == 6
+        assert stats['retried'] == 3
+        assert stats['dropped'] == 0
+    finally:
+        writer.close(timeout=1)
+
+
+def test_events_are_dropped_per_table_after_max_attempts(database):
+    db, writer = database({'video_views': 100})
+    try:
+        writer.submit('video_views', (1,))
+        writer.submit('video_views', (2,))
+        writer.submit('quiz_attempts', (1,))
+        for _ in range(writer.max_attempts):
+            writer.flush()
+        stats = writer.stats()
+        assert stats['pending'] == 0
+        assert stats['dropped_by_table'] == {'video_views': 2}
+        assert stats['errors'] == writer.max_attempts
+        assert db.rows == {'quiz_attempts': [(1,)]}
+    finally:
+        writer.close(timeout=1)
+
+
+def test_close_retries_before_dropping(database):
+    db, writer = database({'video_views': 2})
+    writer.submit('video_views', (1,))
+    writer.close(timeout=1)
+    assert db.rows == {'video_views': [(1,)]}
+    assert writer.stats()['dropped'] == 0
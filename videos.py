@@ -0,0 +1,220 @@
+import argparse
+import json
+import re
+import sys
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+YOUTUBE_ID = re.compile(
+    r'(?:https?:\/\/)?(?:www\.)?(?:youtube\.com\/(?:[^\/\n\s]+\/\S+\/|(?:v|e(?:mbed)?)\/|\S*?[?&]v=)|youtu\.be\/)([a-zA-Z0-9_-]{11})'
+)
+ISO_DURATION = re.compile(r'^P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$')
+
+
+def extract_youtube_id(url):
+    if not url:
+        return None
+    match = YOUTUBE_ID.search(url)
+    return match.group(1) if match else None
+
+
+def backfill_video_ids(cur, batch_size=500):
+    updated, invalid, after = 0, [], ('', 0)
+    while True:
+        cur.execute("""
+            SELECT course_id, lesson_number, video_url
+            FROM lessons
+            WHERE video_id IS NULL AND COALESCE(video_url, '') <> ''
+            AND (course_id, lesson_number) > (%s, %s)
+            ORDER BY course_id, lesson_number
+            LIMIT %s
+        """, (*after, batch_size))
+        rows = cur.fetchall()
+        if not rows:
+            return updated, invalid
+        parsed = []
+        for course_id, lesson_number, video_url in rows:
+            video_id = extract_youtube_id(video_url)
+            if video_id:
+                parsed.append((course_id, lesson_number, video_id))
+            else:
+                invalid.append((course_id, lesson_number, video_url))
+        if parsed:
+            execute_values(cur, """
+                UPDATE lessons l SET video_id = v.video_id
+                FROM (VALUES %s) AS v (course_id, lesson_number, video_id)
+                WHERE l.course_id = v.course_id AND l.lesson_number = v.lesson_number
+            """, parsed)
+        updated += len(parsed)
+        after = rows[-1][:2]
+
+
+def static_video_metadata(video_ids):
+    return {
+        video_id: {
+            'title': None,
+            'thumbnail_url': f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg",
+            'duration_seconds': None,
+            'available': True,
+        }
+        for video_id in video_ids
+    }
+
+
+def oembed_video_metadata(video_ids, timeout=5):
+    metadata = {}
+    for video_id in video_ids:
+        url = "https://www.youtube.com/oembed?" + urlencode({
+            'url': f"https://www.youtube.com/watch?v={video_id}",
+            'format': 'json',
+        })
+        try:
+            with urlopen(url, timeout=timeout) as response:
+                data = json.load(response)
+        except HTTPError as e:
+            if e.code in (400, 401, 403, 404):
+                metadata[video_id] = {'title': None, 'thumbnail_url': None, 'duration_seconds': None, 'available': False}
+            continue
+        except (URLError, OSError, ValueError):
+            continue
+        metadata[video_id] = {
+            'title': data.get('title'),
+            'thumbnail_url': data.get('thumbnail_url'),
+            'duration_seconds': None,
+            'available': True,
+        }
+    return metadata
+
+
+def parse_iso_duration(text):
+    match = ISO_DURATION.match(text or '')
+    if not match:
+        return None
+    days, hours, minutes, seconds = (int(part or 0) for part in match.groups())
+    return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
+
+
+def youtube_api_video_metadata(video_ids, api_key, timeout=10):
+    metadata = {}
+    for start in range(0, len(video_ids), 50):
+        batch = video_ids[start:start + 50]
+        url = "https://www.googleapis.com/youtube/v3/videos?" + urlencode({
+            'part': 'snippet,contentDetails',
+            'id': ','.join(batch),
+            'key': api_key,
+        })
+        try:
+            with urlopen(url, timeout=timeout) as response:
+                items = json.load(response).get('items', [])
+        except (URLError, OSError, ValueError):
+            continue
+        for video_id in batch:
+            metadata[video_id] = {'title': None, 'thumbnail_url': None, 'duration_seconds': None, 'available': False}
+        for item in items:
+            thumbnails = item['snippet'].get('thumbnails', {})
+            metadata[item['id']] = {
+                'title': item['snippet'].get('title'),
+                'thumbnail_url': (thumbnails.get('high') or thumbnails.get('default') or {}).get('url'),
+                'duration_seconds': parse_iso_duration(item.get('contentDetails', {}).get('duration')),
+                'available': True,
+            }
+    return metadata
+
+
+VIDEO_METADATA_PROVIDERS = {
+    'static': lambda options: static_video_metadata,
+    'oembed': lambda options: lambda video_ids: oembed_video_metadata(video_ids, options.get('timeout', 5)),
+    'youtube': lambda options: lambda video_ids: youtube_api_video_metadata(video_ids, options['api_key'], options.get('timeout', 10)),
+}
+
+
+def video_metadata_provider(name, **options):
+    if name not in VIDEO_METADATA_PROVIDERS:
+        raise ValueError(f"Provedor de metadados desconhecido: {name}")
+    return VIDEO_METADATA_PROVIDERS[name](options)
+
+
+def store_video_metadata(cur, provider, metadata):
+    if not metadata:
+        return 0
+    execute_values(cur, """
+        INSERT INTO video_metadata (video_id, provider, title, thumbnail_url, duration_seconds, available)
+        VALUES %s
+        ON CONFLICT (video_id) DO UPDATE
+        SET provider = EXCLUDED.provider,
+            title = EXCLUDED.title,
+            thumbnail_url = EXCLUDED.thumbnail_url,
+            duration_seconds = EXCLUDED.duration_seconds,
+            available = EXCLUDED.available,
+            fetched_at = NOW()
+    """, [
+        (video_id, provider, item['title'], item['thumbnail_url'], item['duration_seconds'], item['available'])
+        for video_id, item in metadata.items()
+    ])
+    return len(metadata)
+
+
+def backfill_video_metadata(conn, name, fetch, batch_size=50, refresh=False):
+    stored, missing, after = 0, 0, ''
+    while True:
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                SELECT DISTINCT l.video_id
+                FROM lessons l
+                LEFT JOIN video_metadata m ON m.video_id = l.video_id
+                WHERE l.video_id > %s
+                {'' if refresh else 'AND m.video_id IS NULL'}
+                ORDER BY l.video_id
+                LIMIT %s
+            """, (after, batch_size))
+            video_ids = [row[0] for row in cur.fetchall()]
+        conn.commit()
+        if not video_ids:
+            return stored, missing
+        metadata = fetch(video_ids)
+        with conn.cursor() as cur:
+            stored += store_video_metadata(cur, name, metadata)
+        conn.commit()
+        missing += len(video_ids) - len(metadata)
+        after = video_ids[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ids e metadados dos vídeos das aulas do PLT.py")
+    parser.add_argument('--dsn', required=True)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    backfill = sub.add_parser('backfill', help="extrai o id do vídeo das aulas e busca os metadados; aponta URLs inválidas")
+    backfill.add_argument('--provider', choices=sorted(VIDEO_METADATA_PROVIDERS) + ['none'], default='oembed')
+    backfill.add_argument('--api-key', help="chave da YouTube Data API (provedor youtube)")
+    backfill.add_argument('--batch-size', type=int, default=50)
+    backfill.add_argument('--refresh', action='store_true', help="busca de novo os metadados já gravados")
+
+    args = parser.parse_args()
+    conn = psycopg2.connect(args.dsn)
+    try:
+        if args.command == 'backfill':
+            if args.provider == 'youtube' and not args.api_key:
+                parser.error("o provedor youtube precisa de --api-key")
+            with conn.cursor() as cur:
+                updated, invalid = backfill_video_ids(cur)
+            conn.commit()
+            print(f"Aulas com id extraído: {updated}")
+            for course_id, lesson_number, video_url in invalid:
+                print(f"inválida {course_id} aula {lesson_number}: {video_url}")
+            if args.provider != 'none':
+                fetch = video_metadata_provider(args.provider, api_key=args.api_key)
+                stored, missing = backfill_video_metadata(conn, args.provider, fetch, args.batch_size, args.refresh)
+                print(f"Metadados gravados: {stored}\nSem resposta do provedor: {missing}")
+            if invalid:
+                sys.exit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()